@@ -0,0 +1,82 @@
+#! /usr/bin/env python
+"""
+Inserting rows one execute at a time compared to insertMany with ids
+and insertMany streamed. A loopback responder plays the pubsubsql server
+and answers every insert that is not streamed.
+
+usage: python benchmarks/benchinsert.py [rows] [maxInFlight]
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+import json
+import socket
+import struct
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from pubsubsql import Client
+
+def respond(listener):
+    sock, _ = listener.accept()
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    reader = sock.makefile("rb")
+    nextId = 0
+    try:
+        while True:
+            header = reader.read(8)
+            if len(header) < 8:
+                raise EOFError()
+            sizeB, requestId = struct.unpack(">II", header)
+            command = reader.read(sizeB)
+            if command.startswith(b"stream "):
+                continue
+            nextId += 1
+            response = json.dumps({"status": "ok", "action": "insert", "rows": 1, "fromrow": 1, "torow": 1,
+                                   "columns": ["id"], "data": [[str(nextId)]]}).encode("utf-8")
+            sock.sendall(struct.pack(">II", len(response), requestId) + response)
+    except (EOFError, socket.error):
+        sock.close()
+
+def generateRows(rows):
+    for row in range(rows):
+        yield (row, "name {}".format(row), row * 0.5)
+
+def insertExecute(client, rows, maxInFlight):
+    for row in generateRows(rows):
+        client.execute("insert into T (col1, col2, col3) values ({}, '{}', {})".format(*row))
+    return rows
+
+def insertManyIds(client, rows, maxInFlight):
+    return len(client.insertMany("T", ["col1", "col2", "col3"], generateRows(rows), maxInFlight))
+
+def insertManyStream(client, rows, maxInFlight):
+    return client.insertMany("T", ["col1", "col2", "col3"], generateRows(rows), maxInFlight, False)
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    maxInFlight = int(sys.argv[2]) if len(sys.argv) > 2 else 128
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.bind(("127.0.0.1", 0))
+    listener.listen(1)
+    thread = threading.Thread(target=respond, args=(listener,))
+    thread.daemon = True
+    thread.start()
+    client = Client()
+    client.connect("127.0.0.1:{}".format(listener.getsockname()[1]))
+    print("{:,} rows, {} inserts in flight".format(rows, maxInFlight))
+    for name, insert in [("execute", insertExecute), ("insertMany", insertManyIds), ("insertMany stream", insertManyStream)]:
+        start = time.time()
+        inserted = insert(client, rows, maxInFlight)
+        elapsed = time.time() - start
+        assert inserted == rows
+        print("{:<18} {:>8.3f} sec {:>12,.0f} rows/sec".format(name, elapsed, rows / elapsed))
+    client.disconnect()
+    listener.close()
+
+if __name__ == "__main__":
+    main()
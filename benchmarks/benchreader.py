@@ -0,0 +1,63 @@
+#! /usr/bin/env python
+"""
+Frames/sec of pubsubsql.net.helper.Helper reading small pubsub frames
+from a local loopback sender, with and without the read-ahead buffer.
+
+usage: python benchmarks/benchreader.py [frames]
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+import json
+import socket
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from pubsubsql.net.header import Header as NetHeader
+from pubsubsql.net.helper import Helper as NetHelper
+
+def buildFrames(frames):
+    message = json.dumps({"status": "ok", "action": "update", "pubsubid": "1",
+                          "rows": 1, "fromrow": 1, "torow": 1,
+                          "columns": ["id", "Price"], "data": [["7", "1234.56"]]}).encode("utf-8")
+    frame = bytes(NetHeader(len(message), 0).getBytes()) + message
+    return frame * frames
+
+def send(listener, data):
+    sender, _ = listener.accept()
+    sender.sendall(data)
+    sender.close()
+
+def run(frames, readBufferSizeB, data):
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.bind(("127.0.0.1", 0))
+    listener.listen(1)
+    thread = threading.Thread(target=send, args=(listener, data))
+    thread.start()
+    helper = NetHelper(readBufferSizeB)
+    helper.open("127.0.0.1", listener.getsockname()[1])
+    start = time.time()
+    for _ in range(frames):
+        helper.readTimeout(0)
+    elapsed = time.time() - start
+    helper.close()
+    thread.join()
+    listener.close()
+    return frames / elapsed
+
+def main():
+    frames = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    data = buildFrames(frames)
+    before = run(frames, 0, data)
+    after = run(frames, 64 * 1024, data)
+    print("frames: {}".format(frames))
+    print("unbuffered (header + message recv):  {:>12,.0f} frames/sec".format(before))
+    print("read-ahead buffer (64 KiB):          {:>12,.0f} frames/sec".format(after))
+    print("speedup: {:.2f}x".format(after / before))
+
+if __name__ == "__main__":
+    main()
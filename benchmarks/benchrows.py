@@ -0,0 +1,101 @@
+#! /usr/bin/env python
+"""
+Reading a 1M cell result set with the nextRow/getValue loop compared to
+fetchAll and iterRows. A loopback responder plays the pubsubsql server and
+answers every command with the same result set split into batches.
+
+usage: python benchmarks/benchrows.py [rows] [columns] [batchrows]
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+import json
+import socket
+import struct
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from pubsubsql import Client
+
+def buildBatches(rows, columns, batchRows):
+    names = ["id"] + ["col{}".format(column) for column in range(1, columns)]
+    batches = []
+    for fromrow in range(1, rows + 1, batchRows):
+        torow = min(rows, fromrow + batchRows - 1)
+        data = [[str(row)] + ["{}:{}".format(row, column) for column in range(1, columns)]
+                for row in range(fromrow, torow + 1)]
+        batches.append(json.dumps({"status": "ok", "action": "select", "rows": rows,
+                                   "fromrow": fromrow, "torow": torow,
+                                   "columns": names, "data": data}).encode("utf-8"))
+    return batches
+
+def recvAll(sock, sizeB):
+    data = b""
+    while len(data) < sizeB:
+        chunk = sock.recv(sizeB - len(data))
+        if not chunk:
+            raise EOFError()
+        data += chunk
+    return data
+
+def respond(listener, batches):
+    sock, _ = listener.accept()
+    try:
+        while True:
+            sizeB, requestId = struct.unpack(">II", recvAll(sock, 8))
+            recvAll(sock, sizeB)
+            for batch in batches:
+                sock.sendall(struct.pack(">II", len(batch), requestId) + batch)
+    except (EOFError, socket.error):
+        sock.close()
+
+def readNextRow(client, columns):
+    cells = 0
+    while client.nextRow():
+        for ordinal in range(columns):
+            client.getValue(ordinal)
+            cells += 1
+    return cells
+
+def readFetchAll(client, columns):
+    cells = 0
+    for row in client.fetchAll():
+        cells += len(row)
+    return cells
+
+def readIterRows(client, columns):
+    cells = 0
+    for row in client.iterRows():
+        for value in row:
+            cells += 1
+    return cells
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    columns = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    batchRows = int(sys.argv[3]) if len(sys.argv) > 3 else 10000
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.bind(("127.0.0.1", 0))
+    listener.listen(1)
+    thread = threading.Thread(target=respond, args=(listener, buildBatches(rows, columns, batchRows)))
+    thread.daemon = True
+    thread.start()
+    client = Client()
+    client.connect("127.0.0.1:{}".format(listener.getsockname()[1]))
+    print("{:,} rows x {} columns = {:,} cells, {:,} rows per batch".format(rows, columns, rows * columns, batchRows))
+    for name, read in [("nextRow/getValue", readNextRow), ("fetchAll", readFetchAll), ("iterRows", readIterRows)]:
+        client.execute("select * from T")
+        start = time.time()
+        cells = read(client, columns)
+        elapsed = time.time() - start
+        assert cells == rows * columns
+        print("{:<18} {:>8.3f} sec {:>14,.0f} cells/sec".format(name, elapsed, cells / elapsed))
+    client.disconnect()
+    listener.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+#! /usr/bin/env python
+"""
+Round trip latency of a status command over TCP loopback, a Unix domain
+socket and an in-process socket pair. The same threaded responder plays
+the pubsubsql server on every transport.
+
+usage: python benchmarks/benchtransport.py [roundTrips]
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+import json
+import shutil
+import socket
+import struct
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from pubsubsql import Client
+from pubsubsql.net.transport import registerInProcess, unregisterInProcess
+
+def respond(sock):
+    reader = sock.makefile("rb")
+    response = json.dumps({"status": "ok", "action": "status"}).encode("utf-8")
+    try:
+        while True:
+            header = reader.read(8)
+            if len(header) < 8:
+                raise EOFError()
+            sizeB, requestId = struct.unpack(">II", header)
+            reader.read(sizeB)
+            sock.sendall(struct.pack(">II", len(response), requestId) + response)
+    except (EOFError, socket.error):
+        sock.close()
+
+def serve(sock):
+    thread = threading.Thread(target=respond, args=(sock,))
+    thread.daemon = True
+    thread.start()
+
+def accept(listener):
+    sock, _ = listener.accept()
+    if listener.family == socket.AF_INET:
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    serve(sock)
+
+def listen(family, address):
+    listener = socket.socket(family, socket.SOCK_STREAM)
+    listener.bind(address)
+    listener.listen(1)
+    thread = threading.Thread(target=accept, args=(listener,))
+    thread.daemon = True
+    thread.start()
+    return listener
+
+def measure(address, roundTrips):
+    client = Client()
+    client.connect(address)
+    for roundTrip in range(min(roundTrips, 1000)):
+        client.execute("status")
+    latencies = []
+    for roundTrip in range(roundTrips):
+        start = time.time()
+        client.execute("status")
+        latencies.append(time.time() - start)
+    client.disconnect()
+    latencies.sort()
+    return latencies
+
+def main():
+    roundTrips = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    directory = tempfile.mkdtemp()
+    tcp = listen(socket.AF_INET, ("127.0.0.1", 0))
+    path = os.path.join(directory, "pubsubsql.sock")
+    unix = listen(socket.AF_UNIX, path)
+    registerInProcess("benchtransport", serve)
+    addresses = [("tcp", "127.0.0.1:{}".format(tcp.getsockname()[1])), ("unix", "unix:" + path),
+                 ("inproc", "inproc:benchtransport")]
+    print("{:,} round trips, latency in usec".format(roundTrips))
+    print("{:<8} {:>8} {:>8} {:>8} {:>12}".format("", "p50", "p99", "mean", "trips/sec"))
+    try:
+        for name, address in addresses:
+            latencies = measure(address, roundTrips)
+            total = sum(latencies)
+            print("{:<8} {:>8.1f} {:>8.1f} {:>8.1f} {:>12,.0f}".format(name, latencies[len(latencies) // 2] * 1e6,
+                  latencies[int(len(latencies) * 0.99)] * 1e6, total / len(latencies) * 1e6, len(latencies) / total))
+    finally:
+        unregisterInProcess("benchtransport")
+        tcp.close()
+        unix.close()
+        shutil.rmtree(directory)
+
+if __name__ == "__main__":
+    main()
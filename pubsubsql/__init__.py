@@ -11,4 +11,14 @@ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
 
 """
  
-from client import Client
+from pubsubsql.client import Client
+from pubsubsql.result import Result
+from pubsubsql.multiplexed import MultiplexedClient
+from pubsubsql.pool import ClientPool
+from pubsubsql.replica import TableReplica
+from pubsubsql.cache import SelectCache
+from pubsubsql.dispatcher import Dispatcher
+from pubsubsql.sharded import ShardedClient
+from pubsubsql.quoting import Quoter
+from pubsubsql.prepared import PreparedCommand
+from pubsubsql.metrics import Metrics
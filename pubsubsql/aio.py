@@ -0,0 +1,219 @@
+#! /usr/bin/env python
+"""
+Copyright (C) 2014 CompleteDB LLC.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the Apache License Version 2.0 http://www.apache.org/licenses.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+
+"""
+
+import asyncio
+import json
+from pubsubsql.net.header import Header as NetHeader
+from pubsubsql.net.transport import parseAddress, TcpTransport, UnixTransport
+from pubsubsql.result import Result
+
+class AsyncClient:
+    """Client for asyncio applications (Python 3.5 or later).
+
+    Any number of coroutines can execute commands concurrently over one
+    connection; responses are matched to their commands by request id.
+    Messages published by the pubsubsql server are delivered by
+    waitForPubSub or by iterating the AsyncClient with async for.
+    """
+
+    def __CONNECTION_TIMEOUT_SEC(self):
+        return 500.0 / 1000
+
+    def __openConnection(self, transport):
+        if isinstance(transport, TcpTransport):
+            return asyncio.open_connection(transport.getHost(), transport.getPort())
+        if isinstance(transport, UnixTransport):
+            return asyncio.open_unix_connection(transport.getPath())
+        # an in-process socket pair is connected right away
+        return asyncio.open_connection(sock=transport.connect(self.__CONNECTION_TIMEOUT_SEC()))
+
+    def __write(self, requestId, message):
+        if not self.isConnected():
+            raise IOError("Not connected")
+        messageBytes = message.encode("utf-8")
+        self.__writer.write(bytes(NetHeader(len(messageBytes), requestId).getBytes()) + messageBytes)
+
+    async def __drain(self):
+        # older asyncio versions do not allow concurrent drain calls
+        async with self.__drainLock:
+            await self.__writer.drain()
+
+    def __loadJson(self, messageBytes):
+        # json only decodes bytes from Python 3.6 on
+        return json.loads(messageBytes.decode("utf-8"))
+
+    async def __dispatch(self, requestId, messageBytes):
+        if not requestId:
+            result = Result(0)
+            result.addBatch(self.__loadJson(messageBytes))
+            await self.__pubsub.put(result)
+            return
+        pending = self.__pending.get(requestId)
+        if pending is None:
+            # batches of a result set nobody waits for anymore
+            return
+        result, future = pending
+        if result.addBatch(self.__loadJson(messageBytes)):
+            del self.__pending[requestId]
+            if not future.done():
+                future.set_result(result)
+
+    async def __readLoop(self):
+        header = NetHeader()
+        error = None
+        try:
+            while True:
+                header.unpackFrom(await self.__reader.readexactly(header.getHeaderSizeB()), 0)
+                messageBytes = await self.__reader.readexactly(header.getMessageSizeB())
+                await self.__dispatch(header.getRequestId(), messageBytes)
+        except (asyncio.CancelledError, asyncio.IncompleteReadError, ConnectionError):
+            # disconnected by the pubsubsql server or by disconnect
+            pass
+        except Exception as e:
+            # such as a response that is not JSON; the pending commands raise it
+            error = e
+        finally:
+            self.__hardDisconnect(error)
+
+    def __hardDisconnect(self, error = None):
+        writer = self.__writer
+        self.__writer = None
+        self.__reader = None
+        if writer is not None:
+            writer.close()
+        pending = self.__pending
+        self.__pending = {}
+        for result, future in pending.values():
+            if not future.done():
+                future.set_exception(error or IOError("Not connected"))
+        self.__wakeUpPubSub()
+
+    def __wakeUpPubSub(self):
+        # consumers waiting for a pubsub message see None once disconnected
+        if self.__pubsub is not None:
+            try:
+                self.__pubsub.put_nowait(None)
+            except asyncio.QueueFull:
+                pass
+
+    async def __getPubSub(self):
+        if self.__pubsub is None:
+            return None
+        if self.__pubsub.empty() and not self.isConnected():
+            return None
+        message = await self.__pubsub.get()
+        if message is None:
+            self.__wakeUpPubSub()
+        return message
+
+    def isConnected(self):
+        """Returns true if the AsyncClient is currently connected to the pubsubsql server."""
+        return self.__writer is not None
+
+    async def connect(self, address):
+        """Connects the AsyncClient to the pubsubsql server.
+
+        Connects the AsyncClient to the pubsubsql server.
+        The address string has the form host:port, unix:path or inproc:name, see Client.connect.
+        """
+        await self.disconnect()
+        transport = parseAddress(address)
+        self.__reader, self.__writer = await asyncio.wait_for(
+            self.__openConnection(transport), self.__CONNECTION_TIMEOUT_SEC())
+        self.__drainLock = asyncio.Lock()
+        self.__pubsub = asyncio.Queue(self.__maxPubSubQueueSize)
+        self.__readTask = asyncio.ensure_future(self.__readLoop())
+
+    async def disconnect(self):
+        """Disconnects the AsyncClient from the pubsubsql server."""
+        if self.isConnected():
+            try:
+                self.__write(0, "close")
+                await self.__drain()
+            except Exception:
+                pass
+        self.__hardDisconnect()
+        if self.__readTask is not None:
+            self.__readTask.cancel()
+            try:
+                await self.__readTask
+            except asyncio.CancelledError:
+                pass
+            self.__readTask = None
+
+    async def execute(self, command):
+        """Executes a command against the pubsubsql server.
+
+        Executes a command against the pubsubsql server and returns its Result
+        once every batch of the result set has been received.
+        Raises ValueError when the pubsubsql server rejects the command.
+        """
+        self.__requestId += 1
+        requestId = self.__requestId
+        future = asyncio.get_event_loop().create_future()
+        self.__write(requestId, command)
+        self.__pending[requestId] = (Result(requestId), future)
+        await self.__drain()
+        result = await future
+        if not result.isOk():
+            raise ValueError(result.getMsg())
+        return result
+
+    async def stream(self, command):
+        """Sends a command to the pubsubsql server.
+
+        Sends a command to the pubsubsql server.
+        The pubsubsql server does not return a response to the AsyncClient.
+        """
+        self.__requestId += 1
+        self.__write(self.__requestId, "stream " + command)
+        await self.__drain()
+
+    async def waitForPubSub(self, timeoutMs):
+        """Waits until the pubsubsql server publishes a message.
+
+        Waits until the pubsubsql server publishes a message for
+        the subscribed AsyncClient or until the timeout interval elapses.
+        Returns the message as a Result or None when timeout interval elapses.
+        """
+        if timeoutMs <= 0:
+            return None
+        try:
+            return await asyncio.wait_for(self.__getPubSub(), float(timeoutMs) / 1000)
+        except asyncio.TimeoutError:
+            return None
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        message = await self.__getPubSub()
+        if message is None:
+            raise StopAsyncIteration
+        return message
+
+    def __init__(self, maxPubSubQueueSize = 0):
+        """Creates an AsyncClient.
+
+        When more than maxPubSubQueueSize published messages are waiting to be consumed
+        the AsyncClient stops reading from the connection until they are.
+        A maxPubSubQueueSize of 0 does not limit the number of waiting messages.
+        """
+        self.__requestId = 1
+        self.__reader = None
+        self.__writer = None
+        self.__readTask = None
+        self.__drainLock = None
+        self.__pubsub = None
+        self.__pending = {}
+        self.__maxPubSubQueueSize = maxPubSubQueueSize
@@ -0,0 +1,254 @@
+#! /usr/bin/env python
+"""
+Copyright (C) 2014 CompleteDB LLC.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the Apache License Version 2.0 http://www.apache.org/licenses.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+
+"""
+
+import collections
+import json
+import threading
+import time
+from pubsubsql.conflate import ConflatingQueue
+from pubsubsql.spill import SpillQueue
+
+class Backlog:
+    """Queue of raw pubsub messages waiting to be consumed, bounded in messages and bytes.
+
+    When a message does not fit, the policy decides what happens:
+    "block" waits until a consumer removes messages, "dropOldest" discards
+    the oldest queued messages, "dropNewest" discards the new message and
+    "conflate" merges queued updates of the same row (see ConflatingQueue)
+    and then discards the oldest messages if that was not enough.
+    "spill" keeps the new message and every message after it in memory-mapped
+    segment files (see SpillQueue) until the messages in memory are consumed,
+    so nothing is lost and the order is kept while memory stays bounded.
+    A limit of 0 does not bound the Backlog.
+    """
+
+    def __POLICIES(self):
+        return ("block", "dropOldest", "dropNewest", "conflate", "spill")
+
+    def __getMemoryCount(self):
+        count = len(self.__queue)
+        if self.__conflated is not None:
+            count += len(self.__conflated)
+        return count
+
+    def __isFull(self, addMessages, addB):
+        # a message always fits into an empty Backlog
+        count = self.__getMemoryCount()
+        if not count:
+            return False
+        if self.__maxMessages and count + addMessages > self.__maxMessages:
+            return True
+        return bool(self.__maxBytes and self.__getSizeB() + addB > self.__maxBytes)
+
+    def __getSizeB(self):
+        sizeB = self.__queuedB
+        if self.__conflated is not None:
+            sizeB += self.__conflated.getSizeB()
+        return sizeB
+
+    def __conflate(self):
+        # messages queued as bytes follow the ones already conflated
+        if self.__conflated is None:
+            self.__conflated = ConflatingQueue(self.__keyColumn)
+        before = len(self)
+        while self.__queue:
+            messageBytes = self.__queue.popleft()
+            self.__queuedB -= len(messageBytes)
+            if bytes is str and not isinstance(messageBytes, str):
+                messageBytes = bytes(messageBytes)
+            self.__conflated.append(json.loads(messageBytes), len(messageBytes))
+        self.__conflatedMessages += max(before - len(self), 0)
+
+    def __dropOldest(self):
+        if self.__conflated is not None and len(self.__conflated):
+            self.__conflated.popleft()
+        else:
+            self.__queuedB -= len(self.__queue.popleft())
+        self.__dropped += 1
+
+    def __updatePeak(self):
+        self.__peakMessages = max(self.__peakMessages, len(self))
+        self.__peakB = max(self.__peakB, self.__getSizeB())
+
+    def append(self, messageBytes):
+        """Queues a raw pubsub message; returns false when the message was dropped."""
+        sizeB = len(messageBytes)
+        with self.__condition:
+            if self.__policy == "spill" and (len(self.__spill) or self.__isFull(1, sizeB)):
+                # once spilled, messages follow the spilled ones to keep the order
+                self.__spill.append(messageBytes)
+                self.__condition.notify_all()
+                return True
+            if self.__isFull(1, sizeB):
+                if self.__policy == "dropNewest":
+                    self.__dropped += 1
+                    return False
+                elif self.__policy == "block":
+                    self.__blocked += 1
+                    start = time.time()
+                    while self.__isFull(1, sizeB) and not self.__closed:
+                        self.__condition.wait()
+                    self.__blockedSec += time.time() - start
+                    if self.__closed:
+                        return False
+                elif self.__policy == "conflate":
+                    self.__queue.append(messageBytes)
+                    self.__queuedB += sizeB
+                    self.__conflate()
+                    while self.__isFull(0, 0) and len(self) > 1:
+                        self.__dropOldest()
+                    self.__updatePeak()
+                    self.__condition.notify_all()
+                    return True
+                while self.__isFull(1, sizeB):
+                    self.__dropOldest()
+            self.__queue.append(messageBytes)
+            self.__queuedB += sizeB
+            self.__updatePeak()
+            self.__condition.notify_all()
+            return True
+
+    def __expand(self):
+        # turns conflated messages back into bytes in front of the Backlog
+        if self.__conflated is None or not len(self.__conflated):
+            return
+        messages = []
+        while len(self.__conflated):
+            messages.append(json.dumps(self.__conflated.popleft()).encode("utf-8"))
+        self.__queue.extendleft(reversed(messages))
+        self.__queuedB += sum(len(messageBytes) for messageBytes in messages)
+
+    def appendleft(self, messageBytes):
+        """Puts a raw pubsub message back in front of the Backlog regardless of the limits."""
+        with self.__condition:
+            self.__expand()
+            self.__queue.appendleft(messageBytes)
+            self.__queuedB += len(messageBytes)
+            self.__updatePeak()
+            self.__condition.notify_all()
+
+    def popleft(self):
+        """Removes and returns the oldest raw pubsub message; raises IndexError when empty."""
+        with self.__condition:
+            if self.__conflated is not None and len(self.__conflated):
+                messageBytes = json.dumps(self.__conflated.popleft()).encode("utf-8")
+            elif self.__queue or not len(self.__spill):
+                messageBytes = self.__queue.popleft()
+                self.__queuedB -= len(messageBytes)
+            else:
+                messageBytes = self.__spill.popleft()
+            self.__condition.notify_all()
+            return messageBytes
+
+    def get(self, timeoutSec = None):
+        """Removes and returns the oldest raw pubsub message, waiting up to timeoutSec for one.
+
+        Returns None when the timeout interval elapses or once the Backlog is closed and empty.
+        """
+        deadline = None
+        if timeoutSec is not None:
+            deadline = time.time() + timeoutSec
+        with self.__condition:
+            while not len(self):
+                if self.__closed:
+                    return None
+                waitSec = None
+                if deadline is not None:
+                    waitSec = deadline - time.time()
+                    if waitSec <= 0:
+                        return None
+                self.__condition.wait(waitSec)
+            return self.popleft()
+
+    def close(self):
+        """Wakes up producers and consumers waiting for the Backlog."""
+        with self.__condition:
+            self.__closed = True
+            self.__condition.notify_all()
+
+    def clear(self):
+        with self.__condition:
+            self.__queue.clear()
+            self.__queuedB = 0
+            if self.__conflated is not None:
+                self.__conflated.clear()
+            self.__spill.clear()
+            self.__condition.notify_all()
+
+    def getSizeB(self):
+        """Returns the size of the messages queued in memory in bytes; conflated messages are estimated."""
+        with self.__condition:
+            return self.__getSizeB()
+
+    def getStats(self):
+        """Returns backlog statistics as a dict.
+
+        messages and bytes measure the Backlog right now; peakMessages and peakBytes are the highest values seen.
+        dropped counts discarded messages, conflated the messages merged away and blocked the appends that waited.
+        messages includes the spilled messages, bytes does not; spillMessages, spillBytes and spillSegments
+        measure the spill files right now and spilled counts the messages written to them.
+        """
+        with self.__condition:
+            spillStats = self.__spill.getStats()
+            return {
+                "policy": self.__policy,
+                "maxMessages": self.__maxMessages,
+                "maxBytes": self.__maxBytes,
+                "messages": len(self),
+                "bytes": self.__getSizeB(),
+                "peakMessages": self.__peakMessages,
+                "peakBytes": self.__peakB,
+                "dropped": self.__dropped,
+                "conflated": self.__conflatedMessages,
+                "blocked": self.__blocked,
+                "blockedSec": self.__blockedSec,
+                "spillMessages": spillStats["messages"],
+                "spillBytes": spillStats["bytes"],
+                "spillSegments": spillStats["segments"],
+                "spilled": spillStats["spilled"],
+            }
+
+    def __len__(self):
+        return self.__getMemoryCount() + len(self.__spill)
+
+    def __init__(self, maxMessages = 0, maxBytes = 0, policy = "dropOldest", keyColumn = "id",
+                 spillDir = None, segmentB = 16 * 1024 * 1024):
+        """Creates a Backlog.
+
+        Creates a Backlog of at most maxMessages messages and maxBytes bytes; see the class for the policies.
+        keyColumn identifies rows for the conflate policy. The spill policy writes segment files
+        of segmentB bytes to spillDir, the temporary directory by default.
+        """
+        if policy not in self.__POLICIES():
+            raise ValueError("Invalid policy", policy)
+        if maxMessages < 0:
+            raise ValueError("Invalid maxMessages", maxMessages)
+        if maxBytes < 0:
+            raise ValueError("Invalid maxBytes", maxBytes)
+        self.__maxMessages = maxMessages
+        self.__maxBytes = maxBytes
+        self.__policy = policy
+        self.__keyColumn = keyColumn
+        self.__condition = threading.Condition()
+        self.__queue = collections.deque()
+        self.__queuedB = 0
+        self.__conflated = None
+        self.__closed = False
+        self.__peakMessages = 0
+        self.__peakB = 0
+        self.__dropped = 0
+        self.__conflatedMessages = 0
+        self.__blocked = 0
+        self.__blockedSec = 0.0
+        # segment files are only created once the Backlog spills
+        self.__spill = SpillQueue(spillDir, segmentB)
@@ -0,0 +1,269 @@
+#! /usr/bin/env python
+"""
+Copyright (C) 2014 CompleteDB LLC.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the Apache License Version 2.0 http://www.apache.org/licenses.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+
+"""
+
+from __future__ import print_function
+
+import argparse
+import json
+import multiprocessing
+import platform
+import sys
+import time
+from pubsubsql.client import Client
+
+def _READY_TIMEOUT_SEC():
+    return 30.0
+
+def _WAIT_MS():
+    return 100
+
+def _getKey(publisher, row):
+    return "{}-{}".format(publisher, row)
+
+def _publish(address, table, publisher, rows, ratePerSec, durationSec, results):
+    # updates the rows of the publisher round robin at ratePerSec, as fast as possible for 0;
+    # every update carries the wall clock time it was sent at so that subscribers in other processes can compare
+    result = {"publisher": publisher, "updates": 0, "elapsedSec": 0.0, "error": None}
+    client = Client()
+    try:
+        client.connect(address)
+        keys = [_getKey(publisher, row) for row in range(rows)]
+        intervalSec = 1.0 / ratePerSec if ratePerSec else 0.0
+        start = time.time()
+        deadline = start + durationSec
+        updates = 0
+        while True:
+            if intervalSec:
+                delaySec = start + updates * intervalSec - time.time()
+                if delaySec > 0:
+                    time.sleep(delaySec)
+            now = time.time()
+            if now >= deadline:
+                break
+            client.execute("update {} set Seq = '{}', Sent = '{:.6f}' where Key = '{}'".format(
+                table, updates, now, keys[updates % len(keys)]))
+            updates += 1
+        result["updates"] = updates
+        result["elapsedSec"] = time.time() - start
+    except Exception as e:
+        result["error"] = str(e)
+    finally:
+        client.disconnect()
+        results.put(("publisher", result))
+
+def _subscribe(address, table, subscriber, where, ready, stop, results):
+    # collects the publish to receive latency of every updated row until stop is set
+    result = {"subscriber": subscriber, "filter": where, "messages": 0, "latenciesSec": [], "error": None}
+    client = Client()
+    try:
+        try:
+            client.connect(address)
+            command = "subscribe * from {}".format(table)
+            if where:
+                command += " where " + where
+            client.execute(command)
+        finally:
+            ready.put(subscriber)
+        latencies = result["latenciesSec"]
+        while not stop.is_set():
+            if not client.waitForPubSub(_WAIT_MS()):
+                continue
+            # the rows published on subscribe and by inserts carry no latency
+            if client.getAction() != "update":
+                continue
+            now = time.time()
+            result["messages"] += 1
+            while client.nextRow():
+                sent = client.getValue("Sent")
+                if sent:
+                    latencies.append(now - float(sent))
+    except Exception as e:
+        result["error"] = str(e)
+    finally:
+        client.disconnect()
+        results.put(("subscriber", result))
+
+def _percentile(values, fraction):
+    # nearest rank of sorted values
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+def summarize(latenciesSec):
+    """Returns count, min, p50, p90, p99, p999, max and mean of latencies in seconds as a dict in microseconds."""
+    values = sorted(latenciesSec)
+    summary = {"count": len(values)}
+    if not values:
+        return summary
+    summary["min"] = values[0] * 1e6
+    for name, fraction in (("p50", 0.5), ("p90", 0.9), ("p99", 0.99), ("p999", 0.999)):
+        summary[name] = _percentile(values, fraction) * 1e6
+    summary["max"] = values[-1] * 1e6
+    summary["mean"] = sum(values) / len(values) * 1e6
+    return summary
+
+def setup(address, table, publishers, rows):
+    """Creates the rows the publishers update; rows left by a previous run are reused."""
+    client = Client()
+    client.connect(address)
+    try:
+        try:
+            client.execute("key {} Key".format(table))
+        except ValueError:
+            # key may have already been defined, so its ok
+            pass
+        for publisher in range(publishers):
+            for row in range(rows):
+                try:
+                    client.execute("insert into {} (Publisher, Key, Seq, Sent) values ('{}', '{}', '0', '')".format(
+                        table, publisher, _getKey(publisher, row)))
+                except ValueError:
+                    pass
+    finally:
+        client.disconnect()
+
+def _getContext():
+    # spawned processes do not inherit the threads of the parent, such as an Emulator's
+    if hasattr(multiprocessing, "get_context"):
+        return multiprocessing.get_context("spawn")
+    return multiprocessing
+
+def _get(results, kind, count, received):
+    while len(received[kind]) < count:
+        receivedKind, result = results.get()
+        received[receivedKind].append(result)
+
+def run(address, publishers = 1, subscribers = 1, ratePerSec = 1000, durationSec = 5.0, rows = 10,
+        filters = None, drainSec = 1.0, table = "Bench"):
+    """Runs publisher processes updating rows at ratePerSec each for durationSec and subscriber processes.
+
+    Subscribers are given filters, where clauses such as "Publisher = '0'", round robin; all rows
+    without filters. Subscribers keep receiving for drainSec after the publishers are done.
+    Returns the report as a dict: throughput, latency as summarize returns it and the results
+    of every process.
+    """
+    filters = filters or [None]
+    setup(address, table, publishers, rows)
+    context = _getContext()
+    ready = context.Queue()
+    results = context.Queue()
+    stop = context.Event()
+    processes = []
+    received = {"publisher": [], "subscriber": []}
+    try:
+        for subscriber in range(subscribers):
+            processes.append(context.Process(target=_subscribe, args=(address, table, subscriber,
+                             filters[subscriber % len(filters)], ready, stop, results)))
+            processes[-1].start()
+        for subscriber in range(subscribers):
+            ready.get(timeout=_READY_TIMEOUT_SEC())
+        for publisher in range(publishers):
+            processes.append(context.Process(target=_publish, args=(address, table, publisher, rows,
+                             ratePerSec, durationSec, results)))
+            processes[-1].start()
+        _get(results, "publisher", publishers, received)
+        time.sleep(drainSec)
+        stop.set()
+        _get(results, "subscriber", subscribers, received)
+    finally:
+        stop.set()
+        for process in processes:
+            process.join(_READY_TIMEOUT_SEC())
+    updates = sum(result["updates"] for result in received["publisher"])
+    elapsedSec = max([result["elapsedSec"] for result in received["publisher"]] + [durationSec])
+    latencies = []
+    subscriberReports = []
+    for result in sorted(received["subscriber"], key=lambda result: result["subscriber"]):
+        latencies.extend(result["latenciesSec"])
+        subscriberReports.append({"subscriber": result["subscriber"], "filter": result["filter"],
+                                  "messages": result["messages"], "error": result["error"],
+                                  "latencyUsec": summarize(result["latenciesSec"])})
+    return {
+        "config": {"address": address, "publishers": publishers, "subscribers": subscribers,
+                   "ratePerSec": ratePerSec, "durationSec": durationSec, "rows": rows,
+                   "filters": filters, "drainSec": drainSec, "table": table},
+        "python": platform.python_version(),
+        "timestamp": time.time(),
+        "updates": updates,
+        "updatesPerSec": updates / elapsedSec,
+        "rowsReceived": len(latencies),
+        "rowsReceivedPerSec": len(latencies) / elapsedSec,
+        "latencyUsec": summarize(latencies),
+        "publishers": sorted(received["publisher"], key=lambda result: result["publisher"]),
+        "subscribers": subscriberReports,
+    }
+
+def _printSummary(report, out):
+    print("{:,} updates at {:,.0f}/sec, {:,} rows received at {:,.0f}/sec".format(report["updates"],
+          report["updatesPerSec"], report["rowsReceived"], report["rowsReceivedPerSec"]), file=out)
+    latency = report["latencyUsec"]
+    if latency["count"]:
+        print("latency usec p50 {:.1f} p90 {:.1f} p99 {:.1f} p999 {:.1f} max {:.1f}".format(latency["p50"],
+              latency["p90"], latency["p99"], latency["p999"], latency["max"]), file=out)
+    for result in report["publishers"] + report["subscribers"]:
+        if result["error"]:
+            print("error: {}".format(result["error"]), file=out)
+
+def _parseArgs(argv):
+    parser = argparse.ArgumentParser(prog="pubsubsql-bench",
+                                     description="End to end publish to receive latency and throughput of pubsubsql.")
+    parser.add_argument("address", nargs="?", default="localhost:7777",
+                        help="host:port, unix:path or inproc:name of the pubsubsql server (default localhost:7777)")
+    parser.add_argument("-p", "--publishers", type=int, default=1, help="publisher processes (default 1)")
+    parser.add_argument("-s", "--subscribers", type=int, default=1, help="subscriber processes (default 1)")
+    parser.add_argument("-r", "--rate", type=float, default=1000,
+                        help="updates per second of every publisher, 0 for as fast as possible (default 1000)")
+    parser.add_argument("-d", "--duration", type=float, default=5.0, help="seconds to publish for (default 5)")
+    parser.add_argument("--rows", type=int, default=10, help="rows updated by every publisher (default 10)")
+    parser.add_argument("-f", "--filter", action="append", dest="filters",
+                        help="where clause of a subscriber, such as \"Publisher = '0'\"; repeat for more, "
+                             "given to the subscribers round robin")
+    parser.add_argument("--drain", type=float, default=1.0,
+                        help="seconds subscribers keep receiving after publishing ends (default 1)")
+    parser.add_argument("--table", default="Bench", help="table to publish to (default Bench)")
+    parser.add_argument("-o", "--output", help="file to write the JSON report to (default stdout)")
+    parser.add_argument("--emulator", action="store_true",
+                        help="run against a pubsubsql emulator started on a free port instead of address")
+    return parser.parse_args(argv)
+
+def main(argv = None):
+    """Runs the benchmark as pubsubsql-bench or python -m pubsubsql.bench; see --help."""
+    if argv is None:
+        argv = sys.argv
+    args = _parseArgs(argv[1:])
+    emulator = None
+    address = args.address
+    if args.emulator:
+        from pubsubsql.emulator import Emulator
+        emulator = Emulator()
+        address = emulator.startThread("localhost:0")
+    try:
+        report = run(address, args.publishers, args.subscribers, args.rate, args.duration, args.rows,
+                     args.filters, args.drain, args.table)
+    finally:
+        if emulator is not None:
+            emulator.stopThread()
+    if args.emulator:
+        report["config"]["address"] = "emulator"
+    _printSummary(report, sys.stderr)
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, "w") as output:
+            output.write(text + "\n")
+    else:
+        print(text)
+    errors = [result for result in report["publishers"] + report["subscribers"] if result["error"]]
+    if errors:
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
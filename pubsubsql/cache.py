@@ -0,0 +1,219 @@
+#! /usr/bin/env python
+"""
+Copyright (C) 2014 CompleteDB LLC.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the Apache License Version 2.0 http://www.apache.org/licenses.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+
+"""
+
+import collections
+import re
+import threading
+from pubsubsql.multiplexed import MultiplexedClient
+
+class SelectCache:
+    """Bounded LRU cache of select responses invalidated by subscriptions.
+
+    Responses are cached by command text. For every table a cached select
+    reads from, the SelectCache subscribes to the table on its own connection;
+    any action published for the table removes the cached responses of the table.
+    A response is only cached when no action was published for its table
+    between sending the select and storing the response. Only selects answered
+    in a single batch are cached. Changes made through a Client using the
+    SelectCache invalidate it right away; changes made by other connections
+    as soon as their pubsub message arrives.
+    """
+
+    __SELECT = re.compile(r"^\s*select\s.*?\bfrom\s+(\w+)", re.IGNORECASE | re.DOTALL)
+    __WRITE = re.compile(r"^\s*(?:insert\s+into|update|delete\s+from|delete|key|tag)\s+(\w+)", re.IGNORECASE)
+
+    def __WAIT_FOR_PUBSUB_MS(self):
+        return 100
+
+    def __invalidateTable(self, tableName):
+        # call with the lock held
+        self.__generations[tableName] = self.__generations.get(tableName, 0) + 1
+        commands = self.__tableCommands.pop(tableName, ())
+        for command in commands:
+            del self.__entries[command]
+        self.__invalidations += len(commands)
+
+    def __invalidateAll(self):
+        # call with the lock held
+        for tableName in list(self.__tableCommands):
+            self.__invalidateTable(tableName)
+        self.__subscriptions.clear()
+
+    def __subscribe(self, tableName):
+        # returns true when changes to the table are published to the SelectCache
+        with self.__lock:
+            if tableName in self.__subscriptions.values():
+                return True
+            client = self.__client
+        if client is None or not client.isConnected():
+            return False
+        with self.__subscribeLock:
+            with self.__lock:
+                if tableName in self.__subscriptions.values():
+                    return True
+            try:
+                result = client.execute("subscribe skip * from {}".format(tableName))
+            except (IOError, ValueError):
+                return False
+            with self.__lock:
+                if self.__client is not client:
+                    return False
+                self.__subscriptions[result.getPubSubId()] = tableName
+                return True
+
+    def __invalidateLoop(self, client):
+        while True:
+            result = client.waitForPubSub(self.__WAIT_FOR_PUBSUB_MS())
+            if result is not None:
+                with self.__lock:
+                    tableName = self.__subscriptions.get(result.getPubSubId())
+                    if tableName is not None:
+                        self.__invalidateTable(tableName)
+            elif not client.isConnected():
+                break
+        # without the subscriptions cached responses can no longer be trusted
+        with self.__lock:
+            if self.__client is client:
+                self.__client = None
+                self.__invalidateAll()
+
+    def isConnected(self):
+        """Returns true while the SelectCache receives changes from the pubsubsql server."""
+        client = self.__client
+        return client is not None and client.isConnected()
+
+    def connect(self, address):
+        """Connects the SelectCache to the pubsubsql server.
+
+        The SelectCache subscribes to tables on its own connection.
+        The address string has the form host:port.
+        """
+        self.disconnect()
+        client = MultiplexedClient()
+        client.connect(address)
+        with self.__lock:
+            self.__client = client
+        self.__thread = threading.Thread(target=self.__invalidateLoop, args=(client,))
+        self.__thread.daemon = True
+        self.__thread.start()
+
+    def disconnect(self):
+        """Disconnects the SelectCache from the pubsubsql server and empties it."""
+        with self.__lock:
+            client = self.__client
+            self.__client = None
+            self.__invalidateAll()
+        if client is not None:
+            client.disconnect()
+        if self.__thread is not None:
+            self.__thread.join()
+            self.__thread = None
+
+    def lookup(self, command):
+        """Returns the cached response to a select command.
+
+        Returns a tuple of the cached response, or None on a miss, and a ticket to pass to store
+        with the response received for the command. The ticket is None when the command is not cached.
+        """
+        match = self.__SELECT.match(command)
+        if match is None:
+            return None, None
+        tableName = match.group(1)
+        with self.__lock:
+            entry = self.__entries.get(command)
+            if entry is not None:
+                # most recently used entries are at the end
+                del self.__entries[command]
+                self.__entries[command] = entry
+                self.__hits += 1
+                return entry[1], None
+            self.__misses += 1
+        if not self.__subscribe(tableName):
+            return None, None
+        with self.__lock:
+            return None, (tableName, self.__generations.get(tableName, 0))
+
+    def store(self, command, ticket, response):
+        """Caches the response to a select command looked up with lookup."""
+        if ticket is None:
+            return
+        tableName, generation = ticket
+        with self.__lock:
+            if self.__client is None or self.__generations.get(tableName, 0) != generation:
+                # the table changed while the select was executed
+                return
+            if command in self.__entries:
+                return
+            self.__entries[command] = (tableName, response)
+            self.__tableCommands.setdefault(tableName, set()).add(command)
+            while len(self.__entries) > self.__maxEntries:
+                evictedCommand, (evictedTable, _) = self.__entries.popitem(last = False)
+                commands = self.__tableCommands[evictedTable]
+                commands.discard(evictedCommand)
+                if not commands:
+                    del self.__tableCommands[evictedTable]
+                self.__evictions += 1
+
+    def invalidate(self, command = None):
+        """Removes the cached responses of the table a command changes.
+
+        Removes the cached responses of the table changed by an insert, update,
+        delete, key or tag command. Without a command the whole SelectCache is emptied.
+        """
+        with self.__lock:
+            if command is None:
+                for tableName in list(self.__tableCommands):
+                    self.__invalidateTable(tableName)
+                return
+            match = self.__WRITE.match(command)
+            if match is not None:
+                self.__invalidateTable(match.group(1))
+
+    def getStats(self):
+        """Returns cache statistics as a dict.
+
+        hitRatio is hits / (hits + misses); invalidations counts responses removed because their table changed.
+        """
+        with self.__lock:
+            lookups = self.__hits + self.__misses
+            hitRatio = 0.0
+            if lookups:
+                hitRatio = float(self.__hits) / lookups
+            return {
+                "maxEntries": self.__maxEntries,
+                "entries": len(self.__entries),
+                "tables": len(self.__subscriptions),
+                "hits": self.__hits,
+                "misses": self.__misses,
+                "hitRatio": hitRatio,
+                "evictions": self.__evictions,
+                "invalidations": self.__invalidations,
+            }
+
+    def __init__(self, maxEntries = 1024):
+        """Creates a SelectCache of at most maxEntries responses."""
+        if maxEntries < 1:
+            raise ValueError("Invalid maxEntries", maxEntries)
+        self.__maxEntries = maxEntries
+        self.__lock = threading.Lock()
+        self.__subscribeLock = threading.Lock()
+        self.__entries = collections.OrderedDict()
+        self.__tableCommands = {}
+        self.__generations = {}
+        self.__subscriptions = {}
+        self.__client = None
+        self.__thread = None
+        self.__hits = 0
+        self.__misses = 0
+        self.__evictions = 0
+        self.__invalidations = 0
@@ -13,8 +13,24 @@ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
 
 import json
 import collections
+import datetime
 from pubsubsql.net.helper import Helper as NetHelper
+from pubsubsql.net.protocol import ProtocolError
+from pubsubsql.net.transport import parseAddress
 from pubsubsql.net.response import Response as ResponseData
+from pubsubsql.result import Result
+from pubsubsql.prefetch import BatchPrefetcher
+from pubsubsql.conflate import ConflatingQueue
+from pubsubsql.backlog import Backlog
+from pubsubsql.quoting import Quoter
+from pubsubsql.prepared import PreparedCommand, BoundCommand
+from pubsubsql.metrics import clock
+
+try:
+    basestring
+except NameError:
+    # python 3
+    basestring = str
 
 class Client:
     """Client."""
@@ -27,37 +43,112 @@ class Client:
     
     def __reset(self):
         self.__rawJson = ""
+        self.__rawMessage = None
         self.__response.reset()
         self.__record = -1
     
     def __hardDisconnect(self):
-        self.__backlog.clear()
+        if self.__metrics is not None:
+            self.__metrics.countHardDisconnect()
         self.__net.close()
+        # closing the connection wakes up the prefetch thread;
+        # it appends to the backlog until it is stopped
+        self.__stopPrefetch()
+        self.__backlog.clear()
+        if self.__conflated is not None:
+            self.__conflated.clear()
+        self.__pending.clear()
         self.__reset()
+
+    def __startPrefetch(self):
+        rows = self.__response.getRows()
+        torow = self.__response.getTorow()
+        if self.__prefetchBatches and rows and torow and torow < rows:
+            self.__prefetcher = BatchPrefetcher(self.__net, self.__requestId, self.__backlog,
+                                                self.__prefetchBatches, self.__prefetchBytes)
+            self.__prefetcher.start()
+
+    def __stopPrefetch(self):
+        # the connection belongs to the prefetch thread until it has read the whole result set
+        if self.__prefetcher is not None:
+            prefetcher = self.__prefetcher
+            self.__prefetcher = None
+            prefetcher.abandon()
+
+    def __abandonResultSet(self):
+        # the rest of a result set not read to the end is dropped without decoding it
+        if self.__requestId not in self.__pending:
+            self.__net.getProtocol().abandon(self.__requestId)
     
-    def __write(self, message):
+    def __write(self, message, response = True):
+        self.__stopPrefetch()
+        self.__abandonResultSet()
         try:
             if self.__net.isClosed():
                 raise IOError("Not connected")
             else:
-                self.__requestId += 1
-                self.__net.writeWithHeader(self.__requestId, message.encode("utf-8"))
+                if isinstance(message, BoundCommand):
+                    message = message.getParts()
+                self.__requestId = self.__net.send(message, response)
         except:
             self.__hardDisconnect()
             raise
                 
-    def __readTimeout(self, timeoutMs):
+    def __writeMany(self, commands, response = True):
+        # all commands go out in a single send; returns the request id of the first one
+        self.__stopPrefetch()
+        self.__abandonResultSet()
+        self.__endProfile()
+        try:
+            if self.__net.isClosed():
+                raise IOError("Not connected")
+            else:
+                firstRequestId = self.__net.sendMany(commands, response)
+                self.__requestId = firstRequestId + len(commands) - 1
+                return firstRequestId
+        except:
+            self.__hardDisconnect()
+            raise
+
+    def __readEvent(self, timeoutMs):
+        # returns the next PubSubMessage, ResponseBatch or ErrorResponse, None when the timeout elapses
+        self.__stopPrefetch()
         try:
             if self.__net.isClosed():
                 raise IOError("Not connected")
             else:
-                return self.__net.readTimeout(float(timeoutMs) / 1000)
+                return self.__net.readEventTimeout(float(timeoutMs) / 1000)
         except:
             self.__hardDisconnect()
             raise
 
-    def __invalidRequestIdError(self):
-        raise Exception("Protocol error invalid request id")
+    def __addPendingBatch(self, event):
+        self.__pending[event.getRequestId()].addBatch(event.getJson())
+
+    def __loadJson(self, messageBytes):
+        # python 2 json only decodes str
+        if bytes is str and not isinstance(messageBytes, str):
+            messageBytes = bytes(messageBytes)
+        metrics = self.__metrics
+        profiler = self.__profiler
+        if profiler is not None:
+            # decoded separately so that the profile tells UTF-8 decoding from parsing
+            start = clock()
+            text = messageBytes.decode("utf-8")
+            decoded = clock()
+            parsedJson = json.loads(text)
+            parsed = clock()
+            profiler.add("decode", decoded - start)
+            profiler.add("json", parsed - decoded)
+            if metrics is not None:
+                metrics.observeDecode(parsed - start)
+            return parsedJson
+        if metrics is None:
+            return json.loads(messageBytes)
+        start = clock()
+        parsedJson = json.loads(messageBytes)
+        metrics.observeDecode(clock() - start)
+        return parsedJson
 
     def __setColumns(self):
         self.__columns.clear()
@@ -67,13 +158,76 @@ class Client:
                 self.__columns[column] = index
 
     def __unmarshallJson(self, messageBytes):
-        self.__rawJson = messageBytes.decode("utf-8")
-        self.__response.setParsedJson(json.loads(self.__rawJson))
+        self.__setResponse(messageBytes, self.__loadJson(messageBytes))
+
+    def __setResponse(self, messageBytes, parsedJson):
+        # json is decoded straight from the message bytes;
+        # the raw JSON string is only built when getJSON asks for it
+        self.__rawMessage = messageBytes
+        self.__response.setParsedJson(parsedJson)
         if self.__response.getStatus() == "ok":
             self.__setColumns()
         else:
             raise ValueError(self.__response.getMsg())
 
+    def __readNextBatch(self):
+        self.__reset()
+        if self.__metrics is not None:
+            self.__metrics.countBatch()
+        if self.__prefetcher is not None:
+            try:
+                messageBytes, parsedJson = self.__prefetcher.next()
+            except:
+                self.__hardDisconnect()
+                raise
+            self.__setResponse(messageBytes, parsedJson)
+            return
+        while True:
+            event = self.__readEvent(0)
+            if event is None:
+                raise IOError("Read timed out")
+            if event.getRequestId():
+                break
+            # pubsub message published in between batches
+            self.__backlog.append(event.getBytes())
+        if event.getRequestId() != self.__requestId:
+            raise ProtocolError("Protocol error invalid request id", event.getRequestId())
+        self.__setResponse(event.getBytes(), event.getJson())
+
+    def __fetchBatch(self, size):
+        # returns up to size rows (all when size is None) left in the current batch
+        # straight from the data array, reading the next batch when needed
+        while True:
+            rows = self.__response.getRows()
+            fromrow = self.__response.getFromrow()
+            torow = self.__response.getTorow()
+            if not rows or not fromrow or not torow:
+                return []
+            start = self.__record + 1
+            batchSize = torow - fromrow + 1
+            if start < batchSize:
+                end = batchSize
+                if size is not None:
+                    end = min(batchSize, start + size)
+                self.__record = end - 1
+                return self.__response.getData()[start:end]
+            if rows == torow:
+                self.__endProfile()
+                return []
+            self.__readNextBatch()
+
+    def __convertColumn(self, numpy, values, dtype):
+        # values is an array of strings; conversion is done on the whole array
+        if dtype is None:
+            return values
+        if dtype is datetime.datetime:
+            dtype = "datetime64[us]"
+        elif dtype is datetime.date:
+            dtype = "datetime64[D]"
+        if isinstance(dtype, (type, basestring, numpy.dtype)):
+            return values.astype(dtype)
+        return numpy.asarray(dtype(values))
+
     def __getColumnIndex(self, column):
         return self.__columns.get(column, -1)
 
@@ -106,13 +260,28 @@ class Client:
     def isConnected(self):
         """Returns true if the Client is currently connected to the pubsubsql server."""
         return self.__net.isOpen()
+
+    def isAlive(self):
+        """Returns true if the Client is connected and the pubsubsql server has not closed the connection.
+        
+        Returns true if the Client is connected and the pubsubsql server has not closed the connection.
+        Nothing is sent to the pubsubsql server, which makes the check cheap.
+        """
+        return bool(self.isConnected()) and not self.__net.isPeerClosed()
     
     def disconnect(self):
         """Disconnects the Client from the pubsubsql server."""
+        if self.__prefetcher is not None:
+            # do not wait for the rest of the result set
+            self.__hardDisconnect()
         self.__backlog.clear()
+        if self.__conflated is not None:
+            self.__conflated.clear()
+        self.__pending.clear()
+        self.__endProfile()
         try:
             if self.isConnected():
-                self.__write("close")
+                self.__write("close", False)
         except:
             pass        
         self.__reset()
@@ -122,51 +291,216 @@ class Client:
         """Connects the Client to the pubsubsql server.
         
         Connects the Client to the pubsubsql server.
-        The address string has the form host:port.
+        The address string has the form host:port, unix:path for a Unix domain socket
+        or inproc:name for a server in the same process, see registerInProcess.
         """
         self.disconnect()
-        # set host and port 
-        host, separator, port = address.partition(":")
-        # validate address
-        if not separator:
-            raise ValueError("Invalid network address", address)
-        elif not host:
-            raise ValueError("Host is not provided")
-        elif not port:
-            raise ValueError("Port is not provided")
-        else:
-            try:
-                port = int(port)
-            except:
-                raise ValueError("Invalid port", port)
-            else:
-                self.__net.open(host, port)
+        self.__net.openTransport(parseAddress(address))
+
+    def __invalidateSelectCache(self, command):
+        if self.__selectCache is not None:
+            self.__selectCache.invalidate(str(command))
+
+    def __endProfile(self):
+        if self.__profiler is not None:
+            self.__profiler.end()
+
+    def __getVerb(self, command):
+        if isinstance(command, BoundCommand):
+            # the verb is at the start of the first part; do not decode the whole command
+            command = bytes(command.getParts()[0][:16]).decode("utf-8", "ignore")
+        return self.__metrics.getVerb(command)
 
     def execute(self, command):
         """Executes a command against the pubsubsql server.
         
         Executes a command against the pubsubsql server.
         The pubsubsql server returns to the Client a response in JSON format.
+        The command is a string or a BoundCommand, see prepare.
         """
+        metrics = self.__metrics
+        profiler = self.__profiler
+        if metrics is None and profiler is None:
+            return self.__execute(command)
+        start = clock()
+        try:
+            return self.__execute(command)
+        finally:
+            executeSec = clock() - start
+            if metrics is not None:
+                metrics.observeExecute(self.__getVerb(command), executeSec)
+            if profiler is not None:
+                rows = self.__response.getRows() or 0
+                profiler.startIterate(executeSec, rows)
+                if not rows:
+                    profiler.end()
+
+    def __execute(self, command):
         self.__reset()
+        ticket = None
+        if self.__selectCache is not None and self.isConnected():
+            command = str(command)
+            cached, ticket = self.__selectCache.lookup(command)
+            if cached is not None:
+                self.__stopPrefetch()
+                self.__abandonResultSet()
+                # no request is sent, so there is nothing to profile
+                self.__endProfile()
+                self.__setResponse(*cached)
+                return
+            self.__selectCache.invalidate(command)
+        if self.__profiler is not None:
+            self.__profiler.begin(self.__net.getProtocol().getNextRequestId())
         self.__write(command)
         while True:
             self.__reset()
-            messageBytes = self.__readTimeout(0)
-            if not messageBytes:
+            event = self.__readEvent(0)
+            if event is None:
                 raise IOError("Read timed out")
-            netRequestId = self.__net.getHeader().getRequestId()
+            netRequestId = event.getRequestId()
             if netRequestId == self.__requestId:
                 # response we are waiting for
-                self.__unmarshallJson(messageBytes)
+                self.__setResponse(event.getBytes(), event.getJson())
+                if ticket is not None and self.__response.getRows() == self.__response.getTorow():
+                    self.__selectCache.store(command, ticket, (event.getBytes(), event.getJson()))
+                self.__startPrefetch()
                 return
             elif not netRequestId:
-                self.__backlog.append(messageBytes)
-            elif netRequestId < self.__requestId:
-                # we did not read full result set from previous command ignore it
-                self.__reset()
+                self.__backlog.append(event.getBytes())
+            elif netRequestId in self.__pending:
+                # response to a command sent with submit
+                self.__addPendingBatch(event)
+            # otherwise we did not read full result set from previous command; ignore it
+
+    def submit(self, command):
+        """Sends a command to the pubsubsql server without waiting for the response.
+        
+        Sends a command to the pubsubsql server without waiting for the response.
+        Returns the request id to pass to collect. Any number of commands can be
+        submitted before their responses are collected.
+        """
+        self.__reset()
+        self.__endProfile()
+        self.__invalidateSelectCache(command)
+        self.__write(command)
+        self.__pending[self.__requestId] = Result(self.__requestId)
+        return self.__requestId
+
+    def collect(self, requestId):
+        """Returns the Result of a command sent with submit.
+        
+        Reads responses from the pubsubsql server until the result set for
+        the given request id is complete. Responses to other submitted commands
+        are kept until they are collected and pubsub messages are kept in the backlog.
+        """
+        result = self.__pending.get(requestId)
+        if result is None:
+            raise ValueError("Unknown request id", requestId)
+        while not result.isComplete():
+            event = self.__readEvent(0)
+            if event is None:
+                raise IOError("Read timed out")
+            netRequestId = event.getRequestId()
+            if not netRequestId:
+                self.__backlog.append(event.getBytes())
+            elif netRequestId in self.__pending:
+                self.__addPendingBatch(event)
+            # otherwise we did not read full result set from previous command; ignore it
+        del self.__pending[requestId]
+        return result
+
+    def executeMany(self, commands, maxInFlight = 128):
+        """Executes commands against the pubsubsql server without waiting for each response.
+        
+        Executes commands against the pubsubsql server keeping up to maxInFlight
+        commands sent ahead of their responses. Returns a list with a Result for every command;
+        commands rejected by the pubsubsql server have Result.isOk() false.
+        """
+        if maxInFlight < 1:
+            raise ValueError("Invalid maxInFlight", maxInFlight)
+        results = []
+        inFlight = collections.deque()
+        for command in commands:
+            if len(inFlight) >= maxInFlight:
+                results.append(self.collect(inFlight.popleft()))
+            inFlight.append(self.submit(command))
+        while inFlight:
+            results.append(self.collect(inFlight.popleft()))
+        return results
+
+    def __submitInserts(self, commands):
+        # inserts of one table; invalidating the SelectCache once covers them all
+        self.__reset()
+        if self.__selectCache is not None:
+            self.__selectCache.invalidate(commands[0])
+        firstRequestId = self.__writeMany(commands)
+        requestIds = list(range(firstRequestId, firstRequestId + len(commands)))
+        for requestId in requestIds:
+            self.__pending[requestId] = Result(requestId)
+        return requestIds
+
+    def __collectInserts(self, requestIds, ids):
+        for requestId in requestIds:
+            result = self.collect(requestId)
+            if result.isOk():
+                ids.append(result.getValue(0, "id"))
             else:
-                self.__invalidRequestIdError()
+                ids.append(result.getError())
+
+    def __sendInserts(self, commands, returnIds, inFlight, ids):
+        # sends the next chunk of inserts before reading the responses to the previous one
+        if not returnIds:
+            self.__reset()
+            if self.__selectCache is not None:
+                self.__selectCache.invalidate(commands[0])
+            self.__writeMany(["stream " + command for command in commands], False)
+            return None
+        requestIds = self.__submitInserts(commands)
+        if inFlight:
+            self.__collectInserts(inFlight, ids)
+        return requestIds
+
+    def insertMany(self, tableName, columns, rows, maxInFlight = 128, returnIds = True):
+        """Inserts rows into a table without waiting for each response.
+        
+        rows is any iterable of rows, such as a list, a generator or a 2-D or structured NumPy array;
+        every row has a value for each of columns. Values are quoted as needed, see Quoter.
+        Inserts are written maxInFlight at a time in a single send while the responses to the previous
+        ones are read. Returns a list with the id of every row, or the ValueError of a row the
+        pubsubsql server rejected. With returnIds false the inserts are streamed without responses
+        and followed by one command that returns once the pubsubsql server has executed them;
+        returns the number of rows sent.
+        """
+        if maxInFlight < 1:
+            raise ValueError("Invalid maxInFlight", maxInFlight)
+        if hasattr(rows, "tolist"):
+            # NumPy arrays convert all values to Python objects in a single call
+            rows = rows.tolist()
+        quote = self.__quoter.quote
+        prefix = "insert into {} ({}) values (".format(tableName, ", ".join(columns))
+        suffix = ")"
+        if returnIds:
+            suffix = ") returning id"
+        ids = []
+        inFlight = None
+        commands = []
+        count = 0
+        for row in rows:
+            commands.append(prefix + ", ".join([quote(value) for value in row]) + suffix)
+            if len(commands) >= maxInFlight:
+                inFlight = self.__sendInserts(commands, returnIds, inFlight, ids)
+                count += len(commands)
+                commands = []
+        if commands:
+            inFlight = self.__sendInserts(commands, returnIds, inFlight, ids)
+            count += len(commands)
+        if inFlight:
+            self.__collectInserts(inFlight, ids)
+        if not returnIds:
+            # the response to status follows the execution of every streamed insert
+            self.execute("status")
+            return count
+        return ids
 
     def stream(self, command):
         """Sends a command to the pubsubsql server.
@@ -175,7 +509,33 @@ class Client:
         The pubsubsql server does not return a response to the Client.
         """
         self.__reset()
-        self.__write("stream " + command)
+        self.__endProfile()
+        self.__invalidateSelectCache(command)
+        if isinstance(command, BoundCommand):
+            self.__write(BoundCommand([b"stream "] + list(command.getParts())), False)
+        else:
+            self.__write("stream " + command, False)
+
+    def prepare(self, command):
+        """Returns a PreparedCommand for a command template with a ? placeholder for every parameter.
+        
+        The template is parsed and encoded once; bind the parameters with PreparedCommand.bind and
+        pass the BoundCommand to execute, submit or stream. Parameters are quoted as needed, see Quoter.
+        """
+        return PreparedCommand(command, self.__quoter)
+
+    def setPrefetch(self, maxBatches, maxBytes = 16 * 1024 * 1024):
+        """Reads the following batches of large result sets ahead on a background thread.
+        
+        When a command returns a result set in more than one batch, the following batches
+        are read and decoded on a background thread while the application reads the current one.
+        At most maxBatches batches and maxBytes bytes of messages wait to be read.
+        A maxBatches of 0 turns prefetching off.
+        """
+        if maxBatches < 0:
+            raise ValueError("Invalid maxBatches", maxBatches)
+        self.__prefetchBatches = maxBatches
+        self.__prefetchBytes = maxBytes
 
     def getJSON(self):
         """Returns a response string in JSON format.
@@ -183,6 +543,11 @@ class Client:
         Returns a response string in JSON format from the 
         last command executed against the pubsubsql server.
         """
+        if not self.__rawJson and self.__rawMessage:
+            self.__rawJson = self.__rawMessage.decode("utf-8")
+        elif not self.__rawJson and self.__response.getParsedJson():
+            # conflated messages are not received as such
+            self.__rawJson = json.dumps(self.__response.getParsedJson())
         return self.__nvl(self.__rawJson)
 
     def getAction(self):
@@ -230,16 +595,102 @@ class Client:
             # we reached the end of the result set?
             if self.__response.getRows() == self.__response.getTorow():
                 self.__record -= 1
+                self.__endProfile()
                 return False
             # there is another batch of data
-            self.__reset()
-            messageBytes = self.__readTimeout(0)
-            if not messageBytes:
-                raise IOError("Read timed out")
-            netRequestId = self.__net.getHeader().getRequestId()
-            if netRequestId != self.__requestId:
-                self.__invalidRequestIdError()
-            self.__unmarshallJson(messageBytes)
+            self.__readNextBatch()
+
+    def fetchOne(self):
+        """Returns the next row of the result set as a tuple or None when all rows are read.
+        
+        fetchOne, fetchMany, fetchAll and iterRows move through the result set
+        together with nextRow; values are in the order of getColumns.
+        """
+        rows = self.__fetchBatch(1)
+        if rows:
+            return tuple(rows[0])
+        return None
+
+    def fetchMany(self, size):
+        """Returns up to size next rows of the result set as a list of tuples.
+        
+        Returns up to size next rows of the result set as a list of tuples,
+        reading the following batches of the result set when needed.
+        Returns an empty list when all rows are read.
+        """
+        rows = []
+        while len(rows) < size:
+            batch = self.__fetchBatch(size - len(rows))
+            if not batch:
+                break
+            rows.extend([tuple(row) for row in batch])
+        return rows
+
+    def fetchAll(self):
+        """Returns the remaining rows of the result set as a list of tuples."""
+        rows = []
+        while True:
+            batch = self.__fetchBatch(None)
+            if not batch:
+                return rows
+            rows.extend([tuple(row) for row in batch])
+
+    def iterRows(self, named = False):
+        """Iterates over the remaining rows of the result set.
+        
+        Yields every remaining row of the result set as a tuple, or as a namedtuple
+        with fields named after the columns when named is true.
+        The following batches of the result set are read as the iteration reaches them.
+        """
+        rowType = tuple
+        if named:
+            rowType = collections.namedtuple("Row", self.getColumns(), rename=True)._make
+        while True:
+            batch = self.__fetchBatch(None)
+            if not batch:
+                return
+            for row in batch:
+                yield rowType(row)
+
+    def fetchArrays(self, dtypes = None, structured = False):
+        """Reads the remaining rows of the result set into NumPy arrays, one per column.
+        
+        Reads the remaining rows of the result set, including the following batches,
+        into an OrderedDict of NumPy arrays keyed by column name, or into a single
+        structured array when structured is true. dtypes maps column names to a NumPy dtype
+        (float, int, datetime.datetime, "datetime64[s]", ...) or to a converter function
+        that is called once per batch with the column values as an array of strings.
+        Columns without a dtype stay arrays of strings. Requires NumPy.
+        """
+        try:
+            import numpy
+        except ImportError:
+            raise ImportError("fetchArrays requires numpy")
+        if dtypes is None:
+            dtypes = {}
+        columns = self.getColumns()
+        chunks = [[] for column in columns]
+        while True:
+            batch = self.__fetchBatch(None)
+            if not batch:
+                break
+            # convert batch by batch so the strings of only one batch are alive at a time
+            for ordinal, values in enumerate(zip(*batch)):
+                chunks[ordinal].append(self.__convertColumn(numpy, numpy.array(values), dtypes.get(columns[ordinal])))
+        arrays = collections.OrderedDict()
+        for ordinal, column in enumerate(columns):
+            if not chunks[ordinal]:
+                chunks[ordinal].append(self.__convertColumn(numpy, numpy.array([], dtype=numpy.str_), dtypes.get(column)))
+            arrays[column] = numpy.concatenate(chunks[ordinal])
+        if not structured:
+            return arrays
+        rowCount = 0
+        if arrays:
+            rowCount = len(arrays[columns[0]])
+        records = numpy.empty(rowCount, dtype=[(str(column), array.dtype) for column, array in arrays.items()])
+        for column, array in arrays.items():
+            records[str(column)] = array
+        return records
 
     def getValue(self, column):
         """Returns the value within the current row for the given column name or column ordinal.
@@ -286,27 +737,212 @@ class Client:
         if timeoutMs <= 0:
             return False
         self.__reset()
+        if self.__conflated is not None:
+            return self.__waitForConflatedPubSub(timeoutMs)
         # process backlog first
         if len(self.__backlog):
             messageBytes = self.__backlog.popleft()
             self.__unmarshallJson(messageBytes)
             return True
         while True:
-            messageBytes = self.__readTimeout(timeoutMs)
-            if not messageBytes:
+            event = self.__readEvent(timeoutMs)
+            if event is None:
                 return False
-            netRequestId = self.__net.getHeader().getRequestId()
-            if not netRequestId:
-                self.__unmarshallJson(messageBytes)
+            if not event.getRequestId():
+                self.__setResponse(event.getBytes(), event.getJson())
                 return True  
             # this is not pubsub message; are we reading abandoned result set?
             # ignore and continue
 
+    def fileno(self):
+        """Returns the file descriptor of the connection so that the Client can be waited on with select or selectors."""
+        if self.__net.isClosed():
+            raise IOError("Not connected")
+        return self.__net.fileno()
+
+    def pollPubSub(self, receive = False):
+        """Moves the pubsub messages already received to the backlog without waiting.
+        
+        Moves the pubsub messages already received to the backlog without waiting.
+        With receive true, first reads what the connection has with a single recv call;
+        call it only once the connection is readable. Returns the number of pubsub
+        messages that waitForPubSub returns without waiting, see ClientSelector.
+        """
+        self.__takeReceived(receive, lambda event: self.__backlog.append(event.getBytes()))
+        if self.__conflated is not None:
+            return len(self.__backlog) + len(self.__conflated)
+        return len(self.__backlog)
+
+    def __takeReceived(self, receive, pubsub):
+        # passes the pubsub messages already received to pubsub without waiting;
+        # with receive true first reads what the connection has with a single recv call
+        self.__stopPrefetch()
+        try:
+            if self.__net.isClosed():
+                raise IOError("Not connected")
+            if receive:
+                self.__net.receive()
+            # only complete frames; the rest of a large frame may still be on its way
+            event = self.__net.nextEvent()
+            while event is not None:
+                netRequestId = event.getRequestId()
+                if not netRequestId:
+                    pubsub(event)
+                elif netRequestId in self.__pending:
+                    self.__addPendingBatch(event)
+                # otherwise we are reading abandoned result set; ignore it
+                event = self.__net.nextEvent()
+        except:
+            self.__hardDisconnect()
+            raise
+
+    def __conflatePubSub(self, timeoutMs):
+        # moves pubsub messages from the backlog and the connection to the conflating queue;
+        # waits up to timeoutMs for the first message and then takes only what has already arrived,
+        # so that a sustained publish rate can not keep waitForPubSub from returning
+        while self.__backlog:
+            self.__conflated.append(self.__loadJson(self.__backlog.popleft()))
+        while timeoutMs:
+            event = self.__readEvent(timeoutMs)
+            if event is None:
+                return
+            if not event.getRequestId():
+                self.__conflated.append(event.getJson())
+                break
+            # otherwise we are reading abandoned result set; ignore and continue
+        self.__takeReceived(self.__net.isReadable(), lambda event: self.__conflated.append(event.getJson()))
+
+    def __waitForConflatedPubSub(self, timeoutMs):
+        if len(self.__conflated):
+            self.__conflatePubSub(0)
+        else:
+            self.__conflatePubSub(timeoutMs)
+        if not len(self.__conflated):
+            return False
+        parsedJson = self.__conflated.popleft()
+        self.__setResponse(None, parsedJson)
+        return True
+
+    def setSelectCache(self, selectCache):
+        """Answers select commands executed with execute from a SelectCache.
+        
+        The SelectCache is connected separately and can be shared by many Clients.
+        A selectCache of None turns caching off.
+        """
+        self.__selectCache = selectCache
+
+    def setConflation(self, keyColumn = "id"):
+        """Merges pending pubsub updates of the same row before waitForPubSub delivers them.
+        
+        Pubsub update messages are delivered one row at a time. When a row is updated
+        again before waitForPubSub delivered its previous update, both updates are merged
+        so that a slow consumer only sees the latest values; rows are identified by keyColumn.
+        Other actions keep their order relative to the updates.
+        A keyColumn of None turns conflation off.
+        """
+        if keyColumn is None:
+            if self.__conflated is not None:
+                # deliver what is queued without conflation, ahead of the backlog
+                messages = []
+                while len(self.__conflated):
+                    messages.append(json.dumps(self.__conflated.popleft()).encode("utf-8"))
+                for messageBytes in reversed(messages):
+                    self.__backlog.appendleft(messageBytes)
+            self.__conflated = None
+        elif self.__conflated is None or self.__conflated.getKeyColumn() != keyColumn:
+            self.setConflation(None)
+            self.__conflated = ConflatingQueue(keyColumn)
+
+    def setBacklogLimit(self, maxMessages = 0, maxBytes = 0, policy = "dropOldest", spillDir = None):
+        """Bounds the backlog of pubsub messages received while waiting for responses.
+        
+        Bounds the backlog to maxMessages messages and maxBytes bytes; a limit of 0 does not bound it.
+        When the backlog is full the policy "dropOldest" discards the oldest messages, "dropNewest"
+        discards new messages and "conflate" merges queued updates of the same row before dropping.
+        The "spill" policy loses no messages: it writes them to memory-mapped files in spillDir,
+        the temporary directory by default, and waitForPubSub reads them back in order.
+        The "block" policy needs another thread to consume the backlog; use MultiplexedClient for it.
+        """
+        if policy == "block":
+            raise ValueError("Client can not block on its own backlog; use MultiplexedClient", policy)
+        backlog = Backlog(maxMessages, maxBytes, policy, spillDir=spillDir)
+        if self.__prefetcher is not None:
+            # the prefetch thread appends pubsub messages to the backlog; keep the batches it read ahead
+            self.__prefetcher.setBacklog(backlog)
+        else:
+            while len(self.__backlog):
+                backlog.append(self.__backlog.popleft())
+        self.__backlog = backlog
+
+    def getBacklogStats(self):
+        """Returns the depth and size of the backlog of pubsub messages as a dict, see Backlog.getStats."""
+        return self.__backlog.getStats()
+
+    def setMetrics(self, metrics):
+        """Records metrics of the Client in a Metrics object; None, the default, stops recording.
+        
+        Records execute latency by command verb, JSON decode time, the frames and bytes
+        read and written, the result set batches read by nextRow and the fetch methods and
+        the connections dropped on errors. Adds the gauges backlog_messages and backlog_bytes
+        with a client label of the Client's own, so that many Clients can share a Metrics object.
+        Without metrics the Client does not read the clock.
+        """
+        client = self.getMetricsLabel()
+        if self.__metrics is not None:
+            self.__metrics.setGauge("backlog_messages", None, client)
+            self.__metrics.setGauge("backlog_bytes", None, client)
+        self.__metrics = metrics
+        self.__net.setMetrics(metrics)
+        if metrics is not None:
+            metrics.setGauge("backlog_messages", lambda: len(self.__backlog), client)
+            metrics.setGauge("backlog_bytes", lambda: self.__backlog.getStats()["bytes"], client)
+
+    def getMetricsLabel(self):
+        """Returns the client label of the gauges of the Client, see Metrics.getSnapshot."""
+        return "{:x}".format(id(self))
+
+    def getMetrics(self):
+        """Returns the Metrics object set with setMetrics or None."""
+        return self.__metrics
+
+    def setProfiler(self, profiler):
+        """Breaks every execute down into phases recorded by a Profiler; None, the default, stops profiling.
+        
+        The phases are the time spent in recv_into, copying frames out of the read buffer,
+        UTF-8 decoding, json.loads and iterating the result set, see Profiler.
+        Commands sent with submit, stream, executeMany and insertMany are not profiled, nor are
+        the selects answered by a SelectCache, since no request is sent for them.
+        The Profiler is not closed by the Client.
+        """
+        self.__endProfile()
+        self.__profiler = profiler
+        self.__net.setProfiler(profiler)
+
+    def getProfiler(self):
+        """Returns the Profiler set with setProfiler or None."""
+        return self.__profiler
+
+    def getConflationStats(self):
+        """Returns conflation statistics as a dict, see ConflatingQueue.getStats."""
+        if self.__conflated is None:
+            return {}
+        return self.__conflated.getStats()
+
     def __init__(self):
-        self.__requestId = 1
+        self.__requestId = 0
         self.__record = -1
         self.__rawJson = ""
-        self.__net = NetHelper()
+        self.__rawMessage = None
+        self.__net = NetHelper(loadJson=self.__loadJson)
         self.__response = ResponseData()
         self.__columns = {}
-        self.__backlog = collections.deque()
+        self.__backlog = Backlog()
+        self.__pending = {}
+        self.__prefetcher = None
+        self.__prefetchBatches = 0
+        self.__prefetchBytes = 0
+        self.__conflated = None
+        self.__selectCache = None
+        self.__quoter = Quoter()
+        self.__metrics = None
+        self.__profiler = None
@@ -0,0 +1,118 @@
+#! /usr/bin/env python
+"""
+Copyright (C) 2014 CompleteDB LLC.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the Apache License Version 2.0 http://www.apache.org/licenses.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+
+"""
+
+import collections
+
+class ConflatingQueue:
+    """Queue of pubsub messages that merges pending updates of the same row.
+
+    Update messages are split into one message per row. While the update
+    of a row is still queued, a newer update of the same row (same pubsubid
+    and key column value) is merged into it, so the consumer only sees the
+    latest values. Any other action (add, insert, delete, remove) is queued
+    as is and ends merging into the updates queued before it, which keeps
+    the order of actions and updates.
+    """
+
+    def __merge(self, message, columns, row):
+        pendingColumns = message["columns"]
+        values = message["data"][0]
+        for column, value in zip(columns, row):
+            try:
+                values[pendingColumns.index(column)] = value
+            except ValueError:
+                # updates only carry the columns that changed
+                pendingColumns.append(column)
+                values.append(value)
+
+    def append(self, parsedJson, sizeB = 0):
+        """Queues a pubsub message decoded from JSON.
+
+        sizeB is the size of the encoded message, used to estimate the size of the queue.
+        """
+        columns = parsedJson.get("columns") or []
+        if parsedJson.get("action") != "update" or self.__keyColumn not in columns:
+            self.__pendingUpdates.clear()
+            self.__queue.append([None, parsedJson, 0, sizeB])
+            self.__sizeB += sizeB
+            return
+        ordinal = columns.index(self.__keyColumn)
+        pubsubid = parsedJson.get("pubsubid", "")
+        rows = parsedJson.get("data") or []
+        rowSizeB = sizeB // max(len(rows), 1)
+        for row in rows:
+            self.__receivedUpdates += 1
+            key = (pubsubid, row[ordinal])
+            entry = self.__pendingUpdates.get(key)
+            if entry is not None:
+                self.__merge(entry[1], columns, row)
+                entry[2] += 1
+                continue
+            message = {"status": "ok", "action": "update", "pubsubid": pubsubid,
+                       "rows": 1, "fromrow": 1, "torow": 1,
+                       "columns": list(columns), "data": [list(row)]}
+            entry = [key, message, 1, rowSizeB]
+            self.__pendingUpdates[key] = entry
+            self.__queue.append(entry)
+            self.__sizeB += rowSizeB
+
+    def popleft(self):
+        """Removes and returns the oldest queued message."""
+        entry = self.__queue.popleft()
+        key, message, updates, sizeB = entry
+        self.__sizeB -= sizeB
+        if key is not None:
+            if self.__pendingUpdates.get(key) is entry:
+                del self.__pendingUpdates[key]
+            self.__deliveredUpdates += 1
+            self.__mergedUpdates += updates
+        return message
+
+    def clear(self):
+        self.__queue.clear()
+        self.__pendingUpdates.clear()
+        self.__sizeB = 0
+
+    def getSizeB(self):
+        """Returns the estimated size of the queued messages in bytes."""
+        return self.__sizeB
+
+    def getKeyColumn(self):
+        return self.__keyColumn
+
+    def getStats(self):
+        """Returns conflation statistics as a dict.
+
+        conflationRatio is the number of row updates merged into each delivered row update.
+        """
+        ratio = 1.0
+        if self.__deliveredUpdates:
+            ratio = float(self.__mergedUpdates) / self.__deliveredUpdates
+        return {
+            "receivedUpdates": self.__receivedUpdates,
+            "deliveredUpdates": self.__deliveredUpdates,
+            "queuedMessages": len(self.__queue),
+            "conflationRatio": ratio,
+        }
+
+    def __len__(self):
+        return len(self.__queue)
+
+    def __init__(self, keyColumn = "id"):
+        self.__keyColumn = keyColumn
+        self.__queue = collections.deque()
+        self.__pendingUpdates = {}
+        self.__receivedUpdates = 0
+        self.__deliveredUpdates = 0
+        self.__mergedUpdates = 0
+        self.__sizeB = 0
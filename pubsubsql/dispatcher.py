@@ -0,0 +1,300 @@
+#! /usr/bin/env python
+"""
+Copyright (C) 2014 CompleteDB LLC.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the Apache License Version 2.0 http://www.apache.org/licenses.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+
+"""
+
+import collections
+import threading
+import time
+from pubsubsql.multiplexed import MultiplexedClient
+
+class HandlerQueue:
+    """Bounded queue of pubsub messages for one handler, consumed by its own worker threads.
+
+    With workers set to 0 the handler is called inline by the thread that puts the message.
+    With more than one worker, messages of the subscription may be handled out of order.
+    When maxMessages messages wait, the policy "dropOldest" discards the oldest waiting message,
+    "dropNewest" the new one and "block" waits for a worker to take one. A blocking
+    HandlerQueue of a Dispatcher holds back the messages of every other subscription while it waits.
+    """
+
+    def __POLICIES(self):
+        return ("block", "dropOldest", "dropNewest")
+
+    def __handle(self, result):
+        start = time.time()
+        try:
+            self.__handler(result)
+        except Exception:
+            with self.__condition:
+                self.__errors += 1
+        finally:
+            with self.__condition:
+                self.__handled += 1
+                self.__handlerSec += time.time() - start
+
+    def __work(self):
+        while True:
+            with self.__condition:
+                while not self.__queue and not self.__closed:
+                    self.__condition.wait()
+                if not self.__queue:
+                    return
+                result = self.__queue.popleft()
+                self.__condition.notify_all()
+            self.__handle(result)
+
+    def put(self, result):
+        """Queues a pubsub message for the handler; returns false when the message was dropped."""
+        if not self.__workers:
+            if self.__closed:
+                return False
+            self.__handle(result)
+            return True
+        with self.__condition:
+            if self.__maxMessages and len(self.__queue) >= self.__maxMessages:
+                if self.__policy == "dropNewest":
+                    self.__dropped += 1
+                    return False
+                elif self.__policy == "block":
+                    self.__blocked += 1
+                    while len(self.__queue) >= self.__maxMessages and not self.__closed:
+                        self.__condition.wait()
+                else:
+                    self.__queue.popleft()
+                    self.__dropped += 1
+            if self.__closed:
+                return False
+            self.__queue.append(result)
+            self.__peakMessages = max(self.__peakMessages, len(self.__queue))
+            self.__condition.notify_all()
+            return True
+
+    def close(self):
+        """Stops the workers once they have handled the waiting messages and waits for them."""
+        with self.__condition:
+            self.__closed = True
+            self.__condition.notify_all()
+        for thread in self.__threads:
+            # a handler may close its own HandlerQueue
+            if thread is not threading.current_thread():
+                thread.join()
+
+    def getStats(self):
+        """Returns handler statistics as a dict.
+
+        messages is the number of waiting messages and peakMessages the highest number seen.
+        handled counts the handler calls, errors the calls that raised and handlerSec their total time;
+        dropped counts discarded messages and blocked the puts that waited.
+        """
+        with self.__condition:
+            return {
+                "workers": self.__workers,
+                "policy": self.__policy,
+                "maxMessages": self.__maxMessages,
+                "messages": len(self.__queue),
+                "peakMessages": self.__peakMessages,
+                "handled": self.__handled,
+                "errors": self.__errors,
+                "handlerSec": self.__handlerSec,
+                "dropped": self.__dropped,
+                "blocked": self.__blocked,
+            }
+
+    def __init__(self, handler, workers = 1, maxMessages = 1024, policy = "dropOldest"):
+        """Creates a HandlerQueue calling handler with each message as a Result; see the class for the arguments."""
+        if policy not in self.__POLICIES():
+            raise ValueError("Invalid policy", policy)
+        if workers < 0:
+            raise ValueError("Invalid workers", workers)
+        if maxMessages < 0:
+            raise ValueError("Invalid maxMessages", maxMessages)
+        self.__handler = handler
+        self.__workers = workers
+        self.__maxMessages = maxMessages
+        self.__policy = policy
+        self.__condition = threading.Condition()
+        self.__queue = collections.deque()
+        self.__closed = False
+        self.__peakMessages = 0
+        self.__handled = 0
+        self.__errors = 0
+        self.__handlerSec = 0.0
+        self.__dropped = 0
+        self.__blocked = 0
+        self.__threads = []
+        for worker in range(workers):
+            thread = threading.Thread(target=self.__work)
+            thread.daemon = True
+            thread.start()
+            self.__threads.append(thread)
+
+class Dispatcher:
+    """Calls a handler for every pubsub message, chosen by the pubsubid of the message.
+
+    A background thread waits for pubsub messages on the Dispatcher's connection and
+    puts each one into the HandlerQueue registered for its pubsubid. Every HandlerQueue
+    is bounded and has its own workers, and by default drops its oldest message when full,
+    so a slow handler does not hold back the others. Messages of unknown pubsubids go to
+    the default handler.
+    """
+
+    def __WAIT_FOR_PUBSUB_MS(self):
+        return 100
+
+    def __dispatchLoop(self, client):
+        while not self.__stopped:
+            result = client.waitForPubSub(self.__WAIT_FOR_PUBSUB_MS())
+            if result is not None:
+                self.dispatch(result)
+            elif not client.isConnected():
+                return
+
+    def __getClient(self):
+        if self.__client is None:
+            raise IOError("Not connected")
+        return self.__client
+
+    def isConnected(self):
+        """Returns true if the Dispatcher is currently connected to the pubsubsql server."""
+        return self.__client is not None and self.__client.isConnected()
+
+    def connect(self, address):
+        """Connects the Dispatcher to the pubsubsql server and starts dispatching.
+
+        The address string has the form host:port.
+        """
+        self.disconnect()
+        client = MultiplexedClient()
+        client.connect(address)
+        self.__client = client
+        self.__stopped = False
+        self.__thread = threading.Thread(target=self.__dispatchLoop, args=(client,))
+        self.__thread.daemon = True
+        self.__thread.start()
+
+    def disconnect(self):
+        """Disconnects the Dispatcher from the pubsubsql server.
+
+        Waits for the handlers to finish the messages already queued and removes them.
+        """
+        self.__stopped = True
+        if self.__client is not None:
+            self.__client.disconnect()
+        if self.__thread is not None and self.__thread is not threading.current_thread():
+            self.__thread.join()
+        self.__client = None
+        self.__thread = None
+        with self.__lock:
+            handlers = list(self.__handlers.values())
+            self.__handlers.clear()
+        for handlerQueue in handlers:
+            handlerQueue.close()
+
+    def execute(self, command):
+        """Executes a command on the Dispatcher's connection and returns its Result, see MultiplexedClient.execute."""
+        return self.__getClient().execute(command)
+
+    def subscribe(self, command, handler, workers = 1, maxMessages = 1024, policy = "dropOldest"):
+        """Executes a subscribe command and calls handler for the messages of the subscription.
+
+        Returns the pubsubid of the subscription. The handler is registered before
+        any message of the subscription is dispatched, including the rows published on subscribe.
+        workers, maxMessages and policy configure its HandlerQueue.
+        """
+        client = self.__getClient()
+        # dispatch waits for the lock, so the messages published on subscribe find the handler
+        with self.__lock:
+            result = client.execute(command)
+            pubsubId = result.getPubSubId()
+            if not pubsubId:
+                raise ValueError("Not a subscribe command", command)
+            previous = self.__setHandler(pubsubId, HandlerQueue(handler, workers, maxMessages, policy))
+        if previous is not None:
+            previous.close()
+        return pubsubId
+
+    def __setHandler(self, pubsubId, handlerQueue):
+        # returns the HandlerQueue replaced; it is closed once the lock is released,
+        # since its workers may be in a handler that calls back into the Dispatcher
+        with self.__lock:
+            previous = self.__handlers.get(pubsubId)
+            self.__handlers[pubsubId] = handlerQueue
+        return previous
+
+    def addHandler(self, pubsubId, handler, workers = 1, maxMessages = 1024, policy = "dropOldest"):
+        """Calls handler with the messages of pubsubId as Result objects.
+
+        The handler runs on workers threads of its own, or inline on the dispatching
+        thread when workers is 0; up to maxMessages messages wait for it, see HandlerQueue.
+        Replaces the handler already registered for pubsubId.
+        """
+        previous = self.__setHandler(pubsubId, HandlerQueue(handler, workers, maxMessages, policy))
+        if previous is not None:
+            previous.close()
+
+    def removeHandler(self, pubsubId):
+        """Stops calling the handler of pubsubId once it has handled the messages already queued.
+
+        Later messages of pubsubId go to the default handler; unsubscribe to stop them.
+        """
+        with self.__lock:
+            handlerQueue = self.__handlers.pop(pubsubId, None)
+        if handlerQueue is not None:
+            handlerQueue.close()
+
+    def setDefaultHandler(self, handler):
+        """Calls handler inline on the dispatching thread for messages without a handler; None discards them."""
+        self.__defaultHandler = handler
+
+    def dispatch(self, result):
+        """Hands a pubsub message to the handler of its pubsubid.
+
+        Called by the Dispatcher's own thread; can also be called with messages
+        received elsewhere. Returns false when the message was discarded.
+        """
+        with self.__lock:
+            handlerQueue = self.__handlers.get(result.getPubSubId())
+            self.__dispatched += 1
+            if handlerQueue is None:
+                self.__unrouted += 1
+        if handlerQueue is not None:
+            return handlerQueue.put(result)
+        handler = self.__defaultHandler
+        if handler is None:
+            return False
+        handler(result)
+        return True
+
+    def getStats(self):
+        """Returns dispatch statistics as a dict.
+
+        dispatched counts the messages dispatched and unrouted the ones without a handler;
+        handlers maps every pubsubid to the statistics of its HandlerQueue.
+        """
+        with self.__lock:
+            handlers = dict(self.__handlers)
+            stats = {
+                "dispatched": self.__dispatched,
+                "unrouted": self.__unrouted,
+            }
+        stats["handlers"] = dict((pubsubId, handlerQueue.getStats()) for pubsubId, handlerQueue in handlers.items())
+        return stats
+
+    def __init__(self):
+        self.__lock = threading.RLock()
+        self.__handlers = {}
+        self.__defaultHandler = None
+        self.__client = None
+        self.__thread = None
+        self.__stopped = True
+        self.__dispatched = 0
+        self.__unrouted = 0
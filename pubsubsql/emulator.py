@@ -0,0 +1,534 @@
+#! /usr/bin/env python
+"""
+Copyright (C) 2014 CompleteDB LLC.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the Apache License Version 2.0 http://www.apache.org/licenses.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+
+usage: python -m pubsubsql.emulator [host:port]
+"""
+
+import asyncio
+import collections
+import json
+import os
+import re
+import sys
+import threading
+from pubsubsql.net.header import Header as NetHeader
+from pubsubsql.net.transport import parseAddress, registerInProcess, unregisterInProcess, TcpTransport, UnixTransport
+
+class CommandError(Exception):
+    """Command the Emulator can not parse or execute; reported to the client as an err response."""
+
+class Tokenizer:
+    """Splits a command into words, quoted strings and the punctuation ( ) , = *."""
+
+    def __TOKEN_PATTERN(self):
+        return re.compile(r"\s*(?:'((?:[^']|'')*)'|([(),=*])|([^\s,()='][^\s,)=']*))")
+
+    def next(self):
+        """Returns the next token as (kind, text) with kind "word", "string" or "punct", or None at the end."""
+        if self.__position >= len(self.__tokens):
+            return None
+        token = self.__tokens[self.__position]
+        self.__position += 1
+        return token
+
+    def peek(self):
+        if self.__position >= len(self.__tokens):
+            return None
+        return self.__tokens[self.__position]
+
+    def expect(self, text):
+        token = self.next()
+        if token is None or token[0] == "string" or token[1] != text:
+            raise CommandError("Expected {}".format(text))
+
+    def accept(self, text):
+        token = self.peek()
+        if token is not None and token[0] != "string" and token[1] == text:
+            self.__position += 1
+            return True
+        return False
+
+    def word(self):
+        token = self.next()
+        if token is None or token[0] != "word":
+            raise CommandError("Expected identifier")
+        return token[1]
+
+    def value(self):
+        token = self.next()
+        if token is None or token[0] == "punct":
+            raise CommandError("Expected value")
+        return token[1]
+
+    def end(self):
+        if self.peek() is not None:
+            raise CommandError("Unexpected {}".format(self.peek()[1]))
+
+    def __init__(self, command):
+        pattern = self.__TOKEN_PATTERN()
+        self.__tokens = []
+        self.__position = 0
+        position = 0
+        command = command.rstrip()
+        while position < len(command):
+            match = pattern.match(command, position)
+            if match is None or match.end() == position:
+                raise CommandError("Invalid command")
+            quoted, punct, word = match.groups()
+            if quoted is not None:
+                self.__tokens.append(("string", quoted.replace("''", "'")))
+            elif punct is not None:
+                self.__tokens.append(("punct", punct))
+            else:
+                self.__tokens.append(("word", word))
+            position = match.end()
+
+class Table:
+    """Rows of a table by id; columns are added as they are used and id is always the first one."""
+
+    def addColumn(self, column):
+        if column not in self.columns:
+            self.columns.append(column)
+
+    def getRow(self, rowId, columns = None):
+        row = self.rows[rowId]
+        return [row.get(column, "") for column in columns or self.columns]
+
+    def matches(self, rowId, where):
+        if where is None:
+            return True
+        column, value = where
+        return self.rows[rowId].get(column, "") == value
+
+    def select(self, where):
+        if where is not None and where[0] == "id":
+            if where[1] in self.rows:
+                return [where[1]]
+            return []
+        if where is not None and where[0] in self.keys:
+            rowId = self.keys[where[0]].get(where[1])
+            if rowId is None:
+                return []
+            return [rowId]
+        return [rowId for rowId in self.rows if self.matches(rowId, where)]
+
+    def checkKeys(self, rowId, values):
+        for column, index in self.keys.items():
+            if column in values and index.get(values[column], rowId) != rowId:
+                raise CommandError("Duplicate key {} = {}".format(column, values[column]))
+
+    def setValues(self, rowId, values):
+        row = self.rows[rowId]
+        for column, index in self.keys.items():
+            if column in values:
+                if column in row:
+                    index.pop(row[column], None)
+                index[values[column]] = rowId
+        row.update(values)
+
+    def __init__(self, name):
+        self.name = name
+        self.columns = ["id"]
+        self.rows = collections.OrderedDict()
+        self.keys = {}
+        self.tags = set()
+        self.nextId = 0
+
+class Subscription:
+
+    def __init__(self, pubsubId, connection, table, where):
+        self.pubsubId = pubsubId
+        self.connection = connection
+        self.table = table
+        self.where = where
+
+class Emulator:
+    """In-memory stand-in for the pubsubsql server (Python 3.5 or later).
+
+    Speaks the framed protocol of the pubsubsql server over TCP, a Unix domain socket or
+    in-process socket pairs and executes status, key, tag, insert, select, update, delete,
+    subscribe and unsubscribe against in-memory tables, including the stream prefix,
+    result sets split into batches of batchRows rows and the add, insert, update,
+    delete and remove messages published to subscribers. Where clauses compare one column with =.
+    Meant for hermetic tests and benchmarks, not as a database.
+    """
+
+    def __frame(self, requestId, response):
+        messageBytes = json.dumps(response, separators=(",", ":")).encode("utf-8")
+        return bytes(NetHeader(len(messageBytes), requestId).getBytes()) + messageBytes
+
+    def __resultSet(self, requestId, response, columns, data):
+        # result sets go out in batches of batchRows rows, each with fromrow and torow
+        rows = len(data)
+        if not rows:
+            batch = dict(response, rows=0, fromrow=0, torow=0, columns=columns, data=[])
+            return [self.__frame(requestId, batch)]
+        frames = []
+        for start in range(0, rows, self.__batchRows):
+            end = min(rows, start + self.__batchRows)
+            batch = dict(response, rows=rows, fromrow=start + 1, torow=end, columns=columns, data=data[start:end])
+            frames.append(self.__frame(requestId, batch))
+        return frames
+
+    def __publish(self, subscription, action, columns, data):
+        response = {"status": "ok", "action": action, "pubsubid": subscription.pubsubId}
+        for frame in self.__resultSet(0, response, columns, data):
+            subscription.connection.write(frame)
+
+    def __getTable(self, name):
+        table = self.__tables.get(name)
+        if table is None:
+            table = Table(name)
+            self.__tables[name] = table
+        return table
+
+    def __where(self, tokens):
+        if not tokens.accept("where"):
+            return None
+        column = tokens.word()
+        tokens.expect("=")
+        return column, tokens.value()
+
+    def __columnList(self, tokens):
+        tokens.expect("(")
+        values = [tokens.value()]
+        while tokens.accept(","):
+            values.append(tokens.value())
+        tokens.expect(")")
+        return values
+
+    def __status(self, connection, tokens):
+        tokens.end()
+        return {"status": "ok", "action": "status", "connections": len(self.__connections)}
+
+    def __index(self, connection, tokens, action):
+        table = self.__getTable(tokens.word())
+        column = tokens.word()
+        tokens.end()
+        table.addColumn(column)
+        if action == "key" and column not in table.keys:
+            index = {}
+            for rowId, row in table.rows.items():
+                if column in row:
+                    if row[column] in index:
+                        raise CommandError("Duplicate key {} = {}".format(column, row[column]))
+                    index[row[column]] = rowId
+            table.keys[column] = index
+        elif action == "tag":
+            table.tags.add(column)
+        return {"status": "ok", "action": action}
+
+    def __insert(self, connection, tokens):
+        tokens.expect("into")
+        table = self.__getTable(tokens.word())
+        columns = self.__columnList(tokens)
+        tokens.expect("values")
+        values = self.__columnList(tokens)
+        returning = None
+        if tokens.accept("returning"):
+            returning = self.__selectColumns(tokens)
+        tokens.end()
+        if len(columns) != len(values) or "id" in columns:
+            raise CommandError("Invalid insert")
+        row = dict(zip(columns, values))
+        rowId = str(table.nextId)
+        table.checkKeys(rowId, row)
+        table.nextId += 1
+        for column in columns:
+            table.addColumn(column)
+        table.rows[rowId] = {"id": rowId}
+        table.setValues(rowId, row)
+        for subscription in self.__getSubscriptions(table):
+            if table.matches(rowId, subscription.where):
+                self.__publish(subscription, "insert", list(table.columns), [table.getRow(rowId)])
+        response = {"status": "ok", "action": "insert", "id": rowId}
+        if returning is None:
+            return response
+        columns = returning or list(table.columns)
+        return response, columns, [table.getRow(rowId, columns)]
+
+    def __selectColumns(self, tokens):
+        # an empty list stands for *
+        if tokens.accept("*"):
+            return []
+        columns = [tokens.word()]
+        while tokens.accept(","):
+            columns.append(tokens.word())
+        return columns
+
+    def __select(self, connection, tokens):
+        columns = self.__selectColumns(tokens)
+        tokens.expect("from")
+        table = self.__getTable(tokens.word())
+        where = self.__where(tokens)
+        tokens.end()
+        columns = columns or list(table.columns)
+        data = [table.getRow(rowId, columns) for rowId in table.select(where)]
+        return {"status": "ok", "action": "select"}, columns, data
+
+    def __update(self, connection, tokens):
+        table = self.__getTable(tokens.word())
+        tokens.expect("set")
+        values = collections.OrderedDict()
+        while True:
+            column = tokens.word()
+            tokens.expect("=")
+            values[column] = tokens.value()
+            if not tokens.accept(","):
+                break
+        where = self.__where(tokens)
+        tokens.end()
+        if "id" in values:
+            raise CommandError("Can not update id")
+        rowIds = table.select(where)
+        for rowId in rowIds:
+            table.checkKeys(rowId, values)
+        for column in values:
+            table.addColumn(column)
+        subscriptions = self.__getSubscriptions(table)
+        updateColumns = ["id"] + list(values)
+        for rowId in rowIds:
+            before = [table.matches(rowId, subscription.where) for subscription in subscriptions]
+            table.setValues(rowId, values)
+            for subscription, matched in zip(subscriptions, before):
+                matches = table.matches(rowId, subscription.where)
+                if matched and matches:
+                    self.__publish(subscription, "update", updateColumns, [table.getRow(rowId, updateColumns)])
+                elif matched:
+                    self.__publish(subscription, "remove", list(table.columns), [table.getRow(rowId)])
+                elif matches:
+                    self.__publish(subscription, "add", list(table.columns), [table.getRow(rowId)])
+        return {"status": "ok", "action": "update", "rows": len(rowIds)}
+
+    def __delete(self, connection, tokens):
+        tokens.expect("from")
+        table = self.__getTable(tokens.word())
+        where = self.__where(tokens)
+        tokens.end()
+        rowIds = table.select(where)
+        subscriptions = self.__getSubscriptions(table)
+        for rowId in rowIds:
+            for subscription in subscriptions:
+                if table.matches(rowId, subscription.where):
+                    self.__publish(subscription, "delete", list(table.columns), [table.getRow(rowId)])
+            row = table.rows.pop(rowId)
+            for column, index in table.keys.items():
+                if column in row:
+                    index.pop(row[column], None)
+        return {"status": "ok", "action": "delete", "rows": len(rowIds)}
+
+    def __subscribe(self, connection, tokens):
+        skip = tokens.accept("skip")
+        tokens.expect("*")
+        tokens.expect("from")
+        table = self.__getTable(tokens.word())
+        where = self.__where(tokens)
+        tokens.end()
+        self.__pubsubId += 1
+        subscription = Subscription(str(self.__pubsubId), connection, table, where)
+        self.__subscriptions.setdefault(table.name, []).append(subscription)
+        # the rows the table has are published once the response is written
+        rowIds = []
+        if not skip:
+            rowIds = table.select(where)
+        data = [table.getRow(rowId) for rowId in rowIds]
+        return {"status": "ok", "action": "subscribe", "pubsubid": subscription.pubsubId}, (subscription, list(table.columns), data)
+
+    def __unsubscribe(self, connection, tokens):
+        tokens.expect("from")
+        table = self.__getTable(tokens.word())
+        where = self.__where(tokens)
+        tokens.end()
+        if where is not None and where[0] != "pubsubid":
+            raise CommandError("Expected pubsubid")
+        subscriptions = self.__subscriptions.get(table.name, [])
+        self.__subscriptions[table.name] = [subscription for subscription in subscriptions
+                                            if subscription.connection is not connection
+                                            or (where is not None and subscription.pubsubId != where[1])]
+        return {"status": "ok", "action": "unsubscribe"}
+
+    def __getSubscriptions(self, table):
+        return list(self.__subscriptions.get(table.name, ()))
+
+    def __execute(self, connection, requestId, command):
+        # returns the frames of the response and the frames published to this connection on subscribe
+        tokens = Tokenizer(command)
+        action = tokens.word()
+        if action == "status":
+            response = self.__status(connection, tokens)
+        elif action in ("key", "tag"):
+            response = self.__index(connection, tokens, action)
+        elif action == "insert":
+            response = self.__insert(connection, tokens)
+        elif action == "select":
+            response = self.__select(connection, tokens)
+        elif action == "update":
+            response = self.__update(connection, tokens)
+        elif action == "delete":
+            response = self.__delete(connection, tokens)
+        elif action == "subscribe":
+            response, added = self.__subscribe(connection, tokens)
+            subscription, columns, data = added
+            if not data:
+                return [self.__frame(requestId, response)], []
+            published = {"status": "ok", "action": "add", "pubsubid": subscription.pubsubId}
+            return [self.__frame(requestId, response)], self.__resultSet(0, published, columns, data)
+        elif action == "unsubscribe":
+            response = self.__unsubscribe(connection, tokens)
+        else:
+            raise CommandError("Invalid command {}".format(action))
+        if isinstance(response, tuple):
+            return self.__resultSet(requestId, *response), []
+        return [self.__frame(requestId, response)], []
+
+    def __handleCommand(self, connection, requestId, command):
+        stream = command.startswith("stream ")
+        if stream:
+            command = command[len("stream "):]
+        try:
+            frames, published = self.__execute(connection, requestId, command)
+        except CommandError as e:
+            frames, published = [self.__frame(requestId, {"status": "err", "msg": str(e)})], []
+        if stream:
+            # the rows published on subscribe are still sent
+            frames = []
+        for frame in frames + published:
+            connection.write(frame)
+
+    async def __serve(self, reader, writer):
+        header = NetHeader()
+        self.__connections.add(writer)
+        try:
+            while True:
+                header.unpackFrom(await reader.readexactly(header.getHeaderSizeB()), 0)
+                messageBytes = await reader.readexactly(header.getMessageSizeB())
+                command = messageBytes.decode("utf-8")
+                if command == "close":
+                    break
+                self.__handleCommand(writer, header.getRequestId(), command)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self.__connections.discard(writer)
+            for name, subscriptions in self.__subscriptions.items():
+                self.__subscriptions[name] = [subscription for subscription in subscriptions
+                                              if subscription.connection is not writer]
+            writer.close()
+
+    def __acceptInProcess(self, sock):
+        # called by the connecting thread; the connection is served on the Emulator's loop
+        async def serve():
+            reader, writer = await asyncio.open_connection(sock=sock)
+            await self.__serve(reader, writer)
+        self.__serverLoop.call_soon_threadsafe(asyncio.ensure_future, serve())
+
+    async def start(self, address = "localhost:0"):
+        """Starts listening at address and returns the address it listens at.
+
+        The address has the form host:port, where port 0 binds a free port,
+        unix:path for a Unix domain socket or inproc:name for Clients in the same process.
+        """
+        transport = parseAddress(address)
+        self.__serverLoop = asyncio.get_event_loop()
+        if isinstance(transport, TcpTransport):
+            self.__server = await asyncio.start_server(self.__serve, transport.getHost(), transport.getPort())
+            self.__address = "{}:{}".format(transport.getHost(), self.__server.sockets[0].getsockname()[1])
+        elif isinstance(transport, UnixTransport):
+            self.__server = await asyncio.start_unix_server(self.__serve, transport.getPath())
+            self.__unixPath = transport.getPath()
+            self.__address = address
+        else:
+            registerInProcess(transport.getName(), self.__acceptInProcess)
+            self.__inProcessName = transport.getName()
+            self.__address = address
+        return self.__address
+
+    async def stop(self):
+        """Stops listening and closes the connections."""
+        if self.__inProcessName is not None:
+            unregisterInProcess(self.__inProcessName)
+            self.__inProcessName = None
+        for writer in list(self.__connections):
+            writer.close()
+        if self.__server is not None:
+            self.__server.close()
+            await self.__server.wait_closed()
+            self.__server = None
+        if self.__unixPath is not None:
+            try:
+                os.remove(self.__unixPath)
+            except OSError:
+                pass
+            self.__unixPath = None
+
+    def startThread(self, address = "localhost:0"):
+        """Runs the Emulator on an event loop of its own in a background thread; returns the address it listens at."""
+        started = threading.Event()
+        def run():
+            asyncio.set_event_loop(self.__loop)
+            self.__loop.call_soon(started.set)
+            self.__loop.run_forever()
+        self.__loop = asyncio.new_event_loop()
+        self.__thread = threading.Thread(target=run)
+        self.__thread.daemon = True
+        self.__thread.start()
+        started.wait()
+        return asyncio.run_coroutine_threadsafe(self.start(address), self.__loop).result()
+
+    def stopThread(self):
+        """Stops an Emulator started with startThread."""
+        if self.__thread is None:
+            return
+        asyncio.run_coroutine_threadsafe(self.stop(), self.__loop).result()
+        self.__loop.call_soon_threadsafe(self.__loop.stop)
+        self.__thread.join()
+        self.__loop.close()
+        self.__thread = None
+        self.__loop = None
+
+    def getAddress(self):
+        return self.__address
+
+    def __init__(self, batchRows = 100):
+        """Creates an Emulator that splits result sets into batches of batchRows rows."""
+        if batchRows < 1:
+            raise ValueError("Invalid batchRows", batchRows)
+        self.__batchRows = batchRows
+        self.__tables = {}
+        self.__subscriptions = {}
+        self.__connections = set()
+        self.__pubsubId = 0
+        self.__server = None
+        self.__serverLoop = None
+        self.__inProcessName = None
+        self.__unixPath = None
+        self.__address = None
+        self.__loop = None
+        self.__thread = None
+
+def main(argv):
+    address = "localhost:7777"
+    if len(argv) > 1:
+        address = argv[1]
+    loop = asyncio.new_event_loop()
+    emulator = Emulator()
+    print("pubsubsql emulator listening at {}".format(loop.run_until_complete(emulator.start(address))))
+    try:
+        loop.run_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        loop.run_until_complete(emulator.stop())
+        loop.close()
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,191 @@
+#! /usr/bin/env python
+"""
+Copyright (C) 2014 CompleteDB LLC.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the Apache License Version 2.0 http://www.apache.org/licenses.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+
+"""
+
+import bisect
+import threading
+import time
+
+# the most precise clock there is; python 2 only has time
+clock = getattr(time, "perf_counter", time.time)
+
+class Histogram:
+    """Counts observed durations in buckets with upper bounds in seconds, as Prometheus does."""
+
+    def BOUNDS_SEC(self):
+        return (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def observe(self, sec):
+        # the last count is for the durations beyond the highest bound
+        self.__counts[bisect.bisect_left(self.__bounds, sec)] += 1
+        self.__count += 1
+        self.__sumSec += sec
+
+    def getSnapshot(self):
+        """Returns count, sumSec and buckets, a list of cumulative (upper bound, count) pairs ending with infinity."""
+        buckets = []
+        cumulative = 0
+        for bound, count in zip(self.__bounds + (float("inf"),), self.__counts):
+            cumulative += count
+            buckets.append((bound, cumulative))
+        return {"count": self.__count, "sumSec": self.__sumSec, "buckets": buckets}
+
+    def __init__(self):
+        self.__bounds = self.BOUNDS_SEC()
+        self.__counts = [0] * (len(self.__bounds) + 1)
+        self.__count = 0
+        self.__sumSec = 0.0
+
+class Metrics:
+    """Opt-in measurements of a Client, see Client.setMetrics.
+
+    Keeps an execute latency histogram per command verb, a JSON decode time histogram,
+    counters of the frames and bytes read and written, of the result set batches read
+    after the first one and of the connections dropped on errors, and gauges sampled
+    when a snapshot is taken. Clients can share a Metrics object; the counters and
+    histograms add up and every Client labels its gauges with a client label of its own.
+    """
+
+    def __VERBS(self):
+        return frozenset(("status", "key", "tag", "insert", "select", "update", "delete",
+                          "subscribe", "unsubscribe", "stream", "close"))
+
+    def __COUNTERS(self):
+        # snapshot key, Prometheus name, help
+        return (("framesRead", "frames_read_total", "Frames read from the pubsubsql server."),
+                ("bytesRead", "bytes_read_total", "Bytes read from the pubsubsql server including headers."),
+                ("framesWritten", "frames_written_total", "Frames written to the pubsubsql server."),
+                ("bytesWritten", "bytes_written_total", "Bytes written to the pubsubsql server including headers."),
+                ("batches", "batches_total", "Result set batches read after the first one."),
+                ("hardDisconnects", "hard_disconnects_total", "Connections dropped because of an error."))
+
+    def getVerb(self, command):
+        """Returns the verb of a command, or other for commands the pubsubsql server does not know."""
+        words = command.split(None, 1)
+        if not words:
+            return "other"
+        verb = words[0].lower()
+        if verb not in self.__VERBS():
+            return "other"
+        return verb
+
+    def observeExecute(self, verb, sec):
+        with self.__lock:
+            histogram = self.__execute.get(verb)
+            if histogram is None:
+                histogram = self.__execute[verb] = Histogram()
+            histogram.observe(sec)
+
+    def observeDecode(self, sec):
+        with self.__lock:
+            self.__decode.observe(sec)
+
+    def countRead(self, frames, sizeB):
+        with self.__lock:
+            self.__counters["framesRead"] += frames
+            self.__counters["bytesRead"] += sizeB
+
+    def countWritten(self, frames, sizeB):
+        with self.__lock:
+            self.__counters["framesWritten"] += frames
+            self.__counters["bytesWritten"] += sizeB
+
+    def countBatch(self):
+        with self.__lock:
+            self.__counters["batches"] += 1
+
+    def countHardDisconnect(self):
+        with self.__lock:
+            self.__counters["hardDisconnects"] += 1
+
+    def setGauge(self, name, function, client = None):
+        """Samples function, which returns a number, for the gauge name on every snapshot; None removes the gauge.
+
+        Gauges set with different client labels do not replace each other.
+        """
+        with self.__lock:
+            if function is None:
+                self.__gauges.pop((name, client), None)
+            else:
+                self.__gauges[(name, client)] = function
+
+    def getSnapshot(self):
+        """Returns the metrics as a dict.
+
+        execute maps command verbs to latency histograms and decode is the JSON decode
+        time histogram, see Histogram.getSnapshot; the counters are framesRead, bytesRead,
+        framesWritten, bytesWritten, batches and hardDisconnects; gauges maps gauge names to their values
+        added up over the client labels and clientGauges maps client labels to the values of their gauges.
+        """
+        with self.__lock:
+            snapshot = dict(self.__counters)
+            snapshot["execute"] = dict((verb, histogram.getSnapshot()) for verb, histogram in self.__execute.items())
+            snapshot["decode"] = self.__decode.getSnapshot()
+            gauges = dict(self.__gauges)
+        snapshot["gauges"] = {}
+        snapshot["clientGauges"] = {}
+        for (name, client), function in gauges.items():
+            value = function()
+            snapshot["gauges"][name] = snapshot["gauges"].get(name, 0) + value
+            if client is not None:
+                snapshot["clientGauges"].setdefault(client, {})[name] = value
+        return snapshot
+
+    def __formatBound(self, bound):
+        if bound == float("inf"):
+            return "+Inf"
+        return repr(bound)
+
+    def __formatHistogram(self, lines, name, labels, histogram):
+        for bound, count in histogram["buckets"]:
+            lines.append('{}_bucket{{{}le="{}"}} {}'.format(name, labels, self.__formatBound(bound), count))
+        labels = labels.rstrip(",")
+        if labels:
+            labels = "{" + labels + "}"
+        lines.append("{}_sum{} {}".format(name, labels, repr(histogram["sumSec"])))
+        lines.append("{}_count{} {}".format(name, labels, histogram["count"]))
+
+    def toPrometheus(self, prefix = "pubsubsql_client"):
+        """Returns the metrics in the Prometheus text exposition format with names starting with prefix."""
+        snapshot = self.getSnapshot()
+        lines = []
+        name = prefix + "_execute_seconds"
+        lines.append("# HELP {} Latency of execute by command verb.".format(name))
+        lines.append("# TYPE {} histogram".format(name))
+        for verb in sorted(snapshot["execute"]):
+            self.__formatHistogram(lines, name, 'verb="{}",'.format(verb), snapshot["execute"][verb])
+        name = prefix + "_decode_seconds"
+        lines.append("# HELP {} Time spent decoding JSON responses.".format(name))
+        lines.append("# TYPE {} histogram".format(name))
+        self.__formatHistogram(lines, name, "", snapshot["decode"])
+        for key, suffix, help in self.__COUNTERS():
+            name = "{}_{}".format(prefix, suffix)
+            lines.append("# HELP {} {}".format(name, help))
+            lines.append("# TYPE {} counter".format(name))
+            lines.append("{} {}".format(name, snapshot[key]))
+        for gauge in sorted(snapshot["gauges"]):
+            name = "{}_{}".format(prefix, gauge)
+            lines.append("# TYPE {} gauge".format(name))
+            clients = [client for client in sorted(snapshot["clientGauges"]) if gauge in snapshot["clientGauges"][client]]
+            for client in clients:
+                lines.append('{}{{client="{}"}} {}'.format(name, client, snapshot["clientGauges"][client][gauge]))
+            if not clients:
+                lines.append("{} {}".format(name, snapshot["gauges"][gauge]))
+        return "\n".join(lines) + "\n"
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__execute = {}
+        self.__decode = Histogram()
+        self.__counters = dict((key, 0) for key, name, help in self.__COUNTERS())
+        self.__gauges = {}
@@ -0,0 +1,229 @@
+#! /usr/bin/env python
+"""
+Copyright (C) 2014 CompleteDB LLC.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the Apache License Version 2.0 http://www.apache.org/licenses.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+
+"""
+
+import json
+import threading
+from pubsubsql.net.helper import Helper as NetHelper
+from pubsubsql.net.transport import parseAddress
+from pubsubsql.result import Result
+from pubsubsql.backlog import Backlog
+
+class MultiplexedClient:
+    """Client that can be shared by many threads.
+
+    A background reader thread owns the connection and hands every response
+    to the thread waiting for its request id, so any number of threads can
+    execute commands concurrently over one connection. Results are returned
+    as Result objects instead of being kept in the MultiplexedClient.
+    """
+
+    def __write(self, message, pending = None):
+        with self.__writeLock:
+            if self.__net.isClosed():
+                raise IOError("Not connected")
+            self.__requestId += 1
+            if pending is not None:
+                # register before writing; the response may arrive before the write returns
+                result, event = pending
+                result.setRequestId(self.__requestId)
+                with self.__pendingLock:
+                    self.__pending[self.__requestId] = pending
+            try:
+                self.__net.writeWithHeader(self.__requestId, message.encode("utf-8"))
+            except:
+                self.__hardDisconnect()
+                raise
+
+    def __dispatch(self, requestId, messageBytes):
+        if bytes is str and not isinstance(messageBytes, str):
+            messageBytes = bytes(messageBytes)
+        if not requestId:
+            # decoded by the thread that waits for it
+            self.__pubsub.append(messageBytes)
+            self.__notifyPubSub()
+            return
+        with self.__pendingLock:
+            pending = self.__pending.get(requestId)
+        if pending is None:
+            # batches of a result set nobody waits for anymore
+            return
+        result, event = pending
+        if result.addBatch(json.loads(messageBytes)):
+            with self.__pendingLock:
+                del self.__pending[requestId]
+            event.set()
+
+    def __readLoop(self, net):
+        try:
+            while True:
+                messageBytes = net.readTimeout(0)
+                self.__dispatch(net.getHeader().getRequestId(), messageBytes)
+        except:
+            # disconnected by the pubsubsql server or by disconnect
+            pass
+        finally:
+            self.__hardDisconnect()
+
+    def __hardDisconnect(self):
+        self.__net.close()
+        with self.__pendingLock:
+            pending = self.__pending
+            self.__pending = {}
+        # wake up threads waiting for responses
+        for result, event in pending.values():
+            event.set()
+        # wake up threads waiting for pubsub messages
+        self.__pubsub.close()
+        self.__notifyPubSub()
+
+    def __notifyPubSub(self):
+        listener = self.__pubSubListener
+        if listener is not None:
+            listener()
+
+    def isConnected(self):
+        """Returns true if the MultiplexedClient is currently connected to the pubsubsql server."""
+        return bool(self.__net.isOpen())
+
+    def connect(self, address):
+        """Connects the MultiplexedClient to the pubsubsql server.
+
+        Connects the MultiplexedClient to the pubsubsql server and starts the reader thread.
+        The address string has the form host:port, unix:path or inproc:name, see Client.connect.
+        """
+        self.disconnect()
+        transport = parseAddress(address)
+        with self.__pendingLock:
+            self.__submitted.clear()
+        self.__net = NetHelper()
+        # deletes the spill files left by the previous connection
+        self.__pubsub.clear()
+        self.__pubsub = Backlog(*self.__backlogLimit)
+        self.__net.openTransport(transport)
+        self.__reader = threading.Thread(target=self.__readLoop, args=(self.__net,))
+        self.__reader.daemon = True
+        self.__reader.start()
+
+    def disconnect(self):
+        """Disconnects the MultiplexedClient from the pubsubsql server."""
+        try:
+            if self.isConnected():
+                self.__write("close")
+        except:
+            pass
+        self.__hardDisconnect()
+        if self.__reader is not None and self.__reader is not threading.current_thread():
+            self.__reader.join()
+        self.__reader = None
+
+    def execute(self, command):
+        """Executes a command against the pubsubsql server.
+
+        Executes a command against the pubsubsql server and returns its Result
+        once every batch of the result set has been received. Safe to call from many threads.
+        Raises ValueError when the pubsubsql server rejects the command.
+        """
+        result = self.collect(self.submit(command))
+        if not result.isOk():
+            raise ValueError(result.getMsg())
+        return result
+
+    def submit(self, command):
+        """Sends a command to the pubsubsql server without waiting for the response.
+
+        Returns the request id to pass to collect. Safe to call from many threads.
+        """
+        result = Result()
+        event = threading.Event()
+        self.__write(command, (result, event))
+        with self.__pendingLock:
+            self.__submitted[result.getRequestId()] = (result, event)
+        return result.getRequestId()
+
+    def collect(self, requestId):
+        """Waits for the Result of a command sent with submit.
+
+        Commands rejected by the pubsubsql server have Result.isOk() false.
+        """
+        with self.__pendingLock:
+            pending = self.__submitted.pop(requestId, None)
+        if pending is None:
+            raise ValueError("Unknown request id", requestId)
+        result, event = pending
+        event.wait()
+        if not result.isComplete():
+            raise IOError("Not connected")
+        return result
+
+    def stream(self, command):
+        """Sends a command to the pubsubsql server.
+
+        Sends a command to the pubsubsql server.
+        The pubsubsql server does not return a response to the MultiplexedClient.
+        """
+        self.__write("stream " + command)
+
+    def waitForPubSub(self, timeoutMs):
+        """Waits until the pubsubsql server publishes a message.
+
+        Waits until the pubsubsql server publishes a message for
+        the subscribed MultiplexedClient or until the timeout interval elapses.
+        Returns the message as a Result or None when timeout interval elapses.
+        """
+        if timeoutMs <= 0:
+            return None
+        messageBytes = self.__pubsub.get(float(timeoutMs) / 1000)
+        if messageBytes is None:
+            return None
+        if bytes is str and not isinstance(messageBytes, str):
+            messageBytes = bytes(messageBytes)
+        result = Result(0)
+        result.addBatch(json.loads(messageBytes))
+        return result
+
+    def setPubSubListener(self, listener):
+        """Calls listener without arguments from the reader thread after every pubsub message and on disconnect.
+
+        Lets one thread wait for many MultiplexedClients; the listener must not block.
+        None, the default, removes the listener.
+        """
+        self.__pubSubListener = listener
+
+    def setBacklogLimit(self, maxMessages = 0, maxBytes = 0, policy = "block", spillDir = None):
+        """Bounds the pubsub messages waiting for waitForPubSub.
+
+        Bounds the waiting messages to maxMessages messages and maxBytes bytes; a limit of 0 does not bound them.
+        When full, the policy "block" stops the reader thread until messages are consumed,
+        which also holds back the responses to execute; "dropOldest", "dropNewest",
+        "conflate" and "spill" are described in Backlog; spill files go to spillDir.
+        Applies from the next connect.
+        """
+        # raises ValueError for invalid limits
+        Backlog(maxMessages, maxBytes, policy, spillDir=spillDir)
+        self.__backlogLimit = (maxMessages, maxBytes, policy, "id", spillDir)
+
+    def getBacklogStats(self):
+        """Returns the depth and size of the pubsub messages waiting for waitForPubSub as a dict."""
+        return self.__pubsub.getStats()
+
+    def __init__(self):
+        self.__requestId = 1
+        self.__net = NetHelper()
+        self.__reader = None
+        self.__writeLock = threading.Lock()
+        self.__pendingLock = threading.Lock()
+        self.__pending = {}
+        self.__submitted = {}
+        self.__backlogLimit = (0, 0, "block", "id", None)
+        self.__pubsub = Backlog()
+        self.__pubSubListener = None
@@ -30,7 +30,11 @@ class Header:
 
     def unpackBuffer(self):
         self.__messageSizeB, self.__requestId = \
-            struct.unpack_from(">II", buffer(self.__buffer), 0)
+            struct.unpack_from(">II", self.__buffer, 0)
+
+    def unpackFrom(self, srcBuffer, offset):
+        self.__buffer[:] = srcBuffer[offset:offset + self.getHeaderSizeB()]
+        self.unpackBuffer()
     
     def getHeaderSizeB(self):
         return 8
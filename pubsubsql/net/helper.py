@@ -12,58 +12,138 @@ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
 """
 
 import socket
-from header import Header as NetHeader
+import select
+from pubsubsql.net.header import Header as NetHeader
+from pubsubsql.net.protocol import Protocol, loadJson as protocolLoadJson
+from pubsubsql.net.transport import TcpTransport
+from pubsubsql.metrics import clock
 
 class Helper:
-    
+    """Drives a Protocol with a blocking socket."""
+
     def __CONNECTION_TIMEOUT_SEC(self):
-        return 500.0 / 1000 
-
-    def __readSocket(self, dstBuffer, readSizeB):
-        view = memoryview(dstBuffer)[:readSizeB]
-        toRead = readSizeB
-        while toRead > 0:
-            readCount = self.__socket.recv_into(view)
-            if readCount > 0:
-                view = view[readCount:]
-                toRead -= readCount
-            else:
-                raise Exception("Failed to read socket")
-
-        
-    def __readHeader(self):
-        self.__readSocket(self.__netHeader.getHeaderBuffer(),
-                          self.__netHeader.getHeaderSizeB())
-        self.__netHeader.unpackBuffer()
-    
-    def __readData(self):
-        dataSizeB = self.__netHeader.getMessageSizeB()
-        if dataSizeB < 0:
-            raise Exception("Invalid message size", dataSizeB)
-        if len(self.__dataBuffer) < dataSizeB:
-            self.__dataBuffer = bytearray(dataSizeB)
-        self.__readSocket(self.__dataBuffer, dataSizeB)
-        view = memoryview(self.__dataBuffer)[:dataSizeB]
-        return view.tobytes()
-                     
+        return 500.0 / 1000
+
+    def READ_BUFFER_SIZE_B(self):
+        return 64 * 1024
+
+    def __recvInto(self, view):
+        profiler = self.__profiler
+        if profiler is None:
+            return self.__socket.recv_into(view)
+        start = clock()
+        try:
+            return self.__socket.recv_into(view)
+        finally:
+            profiler.add("recv", clock() - start)
+
+    def __receive(self):
+        # reads what the socket has, waiting for at least one byte, straight into the protocol's buffer
+        readCount = self.__recvInto(self.__protocol.getReadBuffer())
+        if readCount > 0:
+            self.__protocol.received(readCount)
+        else:
+            raise Exception("Failed to read socket")
+
+    def __nextFrame(self):
+        # only slicing the frame out of the buffer counts as copy; decoding is profiled by the caller
+        profiler = self.__profiler
+        if profiler is None:
+            return self.__protocol.nextFrame()
+        start = clock()
+        frame = self.__protocol.nextFrame()
+        if frame is not None:
+            profiler.add("copy", clock() - start)
+        return frame
+
+    def __read(self):
+        frame = self.__nextFrame()
+        while frame is None:
+            self.__receive()
+            frame = self.__nextFrame()
+        return self.__frameRead(frame)
+
+    def __frameRead(self, frame):
+        requestId, messageBytes = frame
+        self.__netHeader.setData(len(messageBytes), requestId)
+        if self.__metrics is not None:
+            self.__metrics.countRead(1, self.__netHeader.getHeaderSizeB() + len(messageBytes))
+        return frame
+
+    def __sendAll(self, frames):
+        data = self.__protocol.dataToSend()
+        sizeB = len(data)
+        try:
+            self.__socket.sendall(data)
+        finally:
+            # the outgoing buffer is cleared in place once no view of it is left
+            data = None
+            self.__protocol.dataSent()
+        if self.__metrics is not None:
+            self.__metrics.countWritten(frames, sizeB)
+
     def isOpen(self):
         return self.__socket
 
     def isClosed(self):
         return not self.isOpen()
-    
-    def open(self, host, port):
+
+    def hasFrame(self):
+        """Returns true if a complete frame is already in the read buffer, see Protocol.hasFrame."""
+        return self.__protocol.hasFrame()
+
+    def receive(self):
+        """Reads what the socket has into the read buffer with a single recv call.
+
+        Waits for the peer unless the socket is readable. Returns true if a frame is then
+        ready, see hasFrame.
+        """
+        # a full buffer holds a frame already
+        if not self.hasFrame() or len(self.__protocol.getReadBuffer()):
+            self.__receive()
+        return self.hasFrame()
+
+    def isReadable(self):
+        """Returns true if read can make progress without waiting for the peer."""
+        if self.hasFrame():
+            return True
+        try:
+            readable, _, _ = select.select([self.__socket], [], [], 0)
+            return bool(readable)
+        except (select.error, ValueError, TypeError):
+            return False
+
+    def isPeerClosed(self):
+        # a socket that is readable without anything to read was closed by the peer
+        if self.isClosed():
+            return True
+        if self.__protocol.getBufferedSizeB():
+            return False
         try:
-            self.__socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self.__socket.settimeout(self.__CONNECTION_TIMEOUT_SEC())
-            self.__socket.connect((host, port))
-            self.__socket.settimeout(None)
-        except:
-            self.__socket = None
-            raise
-    
+            readable, _, _ = select.select([self.__socket], [], [], 0)
+            if not readable:
+                return False
+            return not self.__socket.recv(1, socket.MSG_PEEK)
+        except (socket.error, select.error, ValueError):
+            return True
+
+    def open(self, host, port):
+        self.openTransport(TcpTransport(host, port))
+
+    def openTransport(self, transport):
+        """Connects with a transport such as TcpTransport, UnixTransport or InProcessTransport, see parseAddress."""
+        self.__protocol.reset()
+        self.__socketTimeoutSec = None
+        self.__socket = None
+        self.__socket = transport.connect(self.__CONNECTION_TIMEOUT_SEC())
+
     def close(self):
         if self.isOpen():
+            try:
+                # wakes up a thread blocked reading the socket
+                self.__socket.shutdown(socket.SHUT_RDWR)
+            except:
+                pass
             try:
                 self.__socket.close()
             except:
@@ -71,29 +151,118 @@ class Helper:
             finally:
                 self.__socket = None
 
+    def setMetrics(self, metrics):
+        """Counts the frames and bytes read and written in metrics, see Metrics; None stops counting."""
+        self.__metrics = metrics
+
+    def setProfiler(self, profiler):
+        """Adds the time spent in recv_into and copying frames to profiler, see Profiler; None stops profiling."""
+        self.__profiler = profiler
+
+    def fileno(self):
+        return self.__socket.fileno()
+
+    def getProtocol(self):
+        return self.__protocol
+
     def getHeader(self):
         return self.__netHeader
 
     def writeWithHeader(self, requestId, messageBytes):
-        self.__netHeader.setData(len(messageBytes), requestId)
-        self.__socket.sendall(self.__netHeader.getBytes())
-        self.__socket.sendall(messageBytes)
+        self.writePartsWithHeader(requestId, (messageBytes,))
+
+    def writePartsWithHeader(self, requestId, parts):
+        """Writes a message made of parts in a single send, copying the parts next to the header."""
+        self.__protocol.packFrame(requestId, parts)
+        self.__sendAll(1)
+
+    def writeManyWithHeader(self, firstRequestId, messages):
+        """Writes messages with consecutive request ids starting at firstRequestId in a single send."""
+        requestId = firstRequestId
+        for messageBytes in messages:
+            self.__protocol.packFrame(requestId, (messageBytes,))
+            requestId += 1
+        self.__sendAll(requestId - firstRequestId)
+
+    def send(self, command, response = True):
+        """Writes a command numbered by the Protocol in a single send and returns its request id, see Protocol.send."""
+        requestId = self.__protocol.send(command, response)
+        self.__sendAll(1)
+        return requestId
+
+    def sendMany(self, commands, response = True):
+        """Writes commands numbered by the Protocol in a single send and returns the request id of the first one."""
+        firstRequestId = self.__protocol.getNextRequestId()
+        self.__protocol.sendMany(commands, response)
+        self.__sendAll(self.__protocol.getNextRequestId() - firstRequestId)
+        return firstRequestId
 
     def read(self):
-        self.__readHeader()
-        return self.__readData()
-    
+        """Reads the next message.
+
+        Returns the message bytes as bytes or bytearray; the caller owns them.
+        getHeader returns the header of the message.
+        """
+        requestId, messageBytes = self.__read()
+        return messageBytes
+
+    def readEvent(self):
+        """Reads the next PubSubMessage, ResponseBatch or ErrorResponse, see Protocol.nextEvent."""
+        event = None
+        while event is None:
+            # frames of abandoned requests are skipped
+            event = self.__protocol.toEvent(*self.__read())
+        return event
+
+    def nextEvent(self):
+        """Returns the next event already received like readEvent does, None instead of reading the socket.
+
+        A frame only counts once it was received completely.
+        """
+        while True:
+            frame = self.__nextFrame()
+            if frame is None:
+                return None
+            event = self.__protocol.toEvent(*self.__frameRead(frame))
+            if event is not None:
+                return event
+
+    def __setTimeout(self, socketTimeoutSec):
+        if not socketTimeoutSec:
+            socketTimeoutSec = None
+        # changing the socket timeout is a system call; only do it when needed
+        if socketTimeoutSec != self.__socketTimeoutSec:
+            self.__socket.settimeout(socketTimeoutSec)
+            self.__socketTimeoutSec = socketTimeoutSec
+
     def readTimeout(self, socketTimeoutSec):
+        self.__setTimeout(socketTimeoutSec)
         try:
-            if socketTimeoutSec:
-                self.__socket.settimeout(socketTimeoutSec)
-            else:
-                self.__socket.settimeout(None)
             return self.read()
         except socket.timeout:
             return None
 
-    def __init__(self):
+    def readEventTimeout(self, socketTimeoutSec):
+        """Reads the next event like readEvent; returns None when the timeout elapses first."""
+        self.__setTimeout(socketTimeoutSec)
+        try:
+            return self.readEvent()
+        except socket.timeout:
+            return None
+
+    def __init__(self, readBufferSizeB = None, loadJson = protocolLoadJson):
+        """Creates a Helper.
+
+        Frames are sliced out of a read-ahead buffer of readBufferSizeB bytes
+        so that a single recv call can deliver many frames.
+        A readBufferSizeB of 0 reads every header and message with separate recv calls.
+        loadJson decodes the responses returned by readEvent.
+        """
+        if readBufferSizeB is None:
+            readBufferSizeB = self.READ_BUFFER_SIZE_B()
         self.__socket = None
+        self.__socketTimeoutSec = None
         self.__netHeader = NetHeader()
-        self.__dataBuffer = bytearray()
+        self.__protocol = Protocol(readBufferSizeB, loadJson)
+        self.__metrics = None
+        self.__profiler = None
@@ -0,0 +1,358 @@
+#! /usr/bin/env python
+"""
+Copyright (C) 2014 CompleteDB LLC.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the Apache License Version 2.0 http://www.apache.org/licenses.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+
+"""
+
+import json
+from pubsubsql.net.header import Header as NetHeader
+
+def loadJson(messageBytes):
+    # python 2 json only decodes str
+    if bytes is str and not isinstance(messageBytes, str):
+        messageBytes = bytes(messageBytes)
+    return json.loads(messageBytes)
+
+class ProtocolError(Exception):
+    pass
+
+class PubSubMessage:
+    """Message published by the pubsubsql server; decoded only when getJson is called."""
+
+    def getRequestId(self):
+        return 0
+
+    def getBytes(self):
+        return self.__messageBytes
+
+    def getJson(self):
+        if self.__parsedJson is None:
+            self.__parsedJson = self.__loadJson(self.__messageBytes)
+        return self.__parsedJson
+
+    def __init__(self, messageBytes, loadJson):
+        self.__messageBytes = messageBytes
+        self.__loadJson = loadJson
+        self.__parsedJson = None
+
+class ResponseBatch:
+    """Response to a command, or one batch of its result set."""
+
+    def getRequestId(self):
+        return self.__requestId
+
+    def getBytes(self):
+        return self.__messageBytes
+
+    def getJson(self):
+        return self.__parsedJson
+
+    def isOk(self):
+        return True
+
+    def isLast(self):
+        """Returns true for the last batch of the response."""
+        rows = self.__parsedJson.get("rows", 0)
+        torow = self.__parsedJson.get("torow", 0)
+        return not rows or not torow or rows == torow
+
+    def __init__(self, requestId, messageBytes, parsedJson):
+        self.__requestId = requestId
+        self.__messageBytes = messageBytes
+        self.__parsedJson = parsedJson
+
+class ErrorResponse(ResponseBatch):
+    """Response to a command the pubsubsql server rejected."""
+
+    def isOk(self):
+        return False
+
+    def isLast(self):
+        return True
+
+    def getMsg(self):
+        parsedJson = self.getJson()
+        if type(parsedJson) is not dict:
+            return "Invalid response"
+        return parsedJson.get("msg", "")
+
+class Protocol:
+    """The pubsubsql protocol without any I/O.
+
+    Commands passed to send are framed and numbered with request ids; dataToSend returns the
+    frames to write to the connection and dataSent drops them once written. Bytes read from the
+    connection are passed to feed, or received straight into getReadBuffer, and nextEvent returns what they contain: a PubSubMessage,
+    a ResponseBatch or an ErrorResponse. The Protocol knows which requests await a response and
+    raises ProtocolError for responses to anything else; the rest of an abandoned response is dropped. It neither blocks nor starts threads,
+    so any event loop can drive it; Helper drives it with a blocking socket.
+
+    nextFrame and packFrame work on frames with request ids of the caller's choosing instead;
+    a connection uses either them or send and nextEvent.
+    """
+
+    def __WRITE_BUFFER_KEEP_B(self):
+        # a larger outgoing buffer is given back once its frames were sent
+        return 1024 * 1024
+
+    def __getBufferedSizeB(self):
+        return self.__readEnd - self.__readStart
+
+    def __resetInput(self):
+        self.__readStart = 0
+        self.__readEnd = 0
+        self.__largeRequestId = 0
+        self.__largeBuffer = None
+        self.__largeReadB = 0
+
+    def reset(self):
+        """Drops the buffered data and the requests awaiting responses, as for a new connection."""
+        self.__resetInput()
+        self.__outgoing = bytearray()
+        self.__outstanding.clear()
+        self.__abandoned.clear()
+
+    def packFrame(self, requestId, parts):
+        """Queues a frame made of the message parts for dataToSend."""
+        headerSizeB = self.__writeHeader.getHeaderSizeB()
+        frame = self.__outgoing
+        start = len(frame)
+        try:
+            frame += self.__writeHeader.getBytes()
+        except BufferError:
+            # a view returned by dataToSend is still held; it keeps the buffer it shows
+            frame = self.__outgoing = bytearray(frame)
+            frame += self.__writeHeader.getBytes()
+        for part in parts:
+            frame += part
+        self.__writeHeader.setData(len(frame) - start - headerSizeB, requestId)
+        frame[start:start + headerSizeB] = self.__writeHeader.getBytes()
+
+    def __encode(self, command):
+        if isinstance(command, (list, tuple)):
+            return command
+        if not isinstance(command, (bytes, bytearray)):
+            command = command.encode("utf-8")
+        return (command,)
+
+    def send(self, command, response = True):
+        """Queues a command and returns its request id.
+
+        The command is a string, bytes or a list of bytes to send as one message.
+        With response false the pubsubsql server is not expected to respond, as for stream and close.
+        """
+        self.__requestId += 1
+        self.packFrame(self.__requestId, self.__encode(command))
+        if response:
+            self.__outstanding.add(self.__requestId)
+        return self.__requestId
+
+    def sendMany(self, commands, response = True):
+        """Queues commands with consecutive request ids and returns the request id of the first one."""
+        firstRequestId = self.__requestId + 1
+        for command in commands:
+            self.send(command, response)
+        return firstRequestId
+
+    def getNextRequestId(self):
+        return self.__requestId + 1
+
+    def dataToSend(self):
+        """Returns a memoryview of the queued frames, empty when there are none.
+
+        The frames stay queued until dataSent is called; release the view before calling it
+        so that the outgoing buffer can be reused.
+        """
+        return memoryview(self.__outgoing)
+
+    def dataSent(self, count = None):
+        """Drops the first count bytes of the queued frames once they were written, all of them by default."""
+        outgoing = self.__outgoing
+        if count is None or count >= len(outgoing):
+            count = len(outgoing)
+            if count > self.__WRITE_BUFFER_KEEP_B():
+                self.__outgoing = bytearray()
+                return
+        try:
+            # cleared in place so that the next frames reuse the memory
+            del outgoing[:count]
+        except BufferError:
+            self.__outgoing = outgoing[count:]
+
+    def isAwaitingResponse(self, requestId):
+        return requestId in self.__outstanding
+
+    def abandon(self, requestId):
+        """Drops the rest of the response to requestId, such as the batches of a result set not read to the end.
+
+        Its frames are skipped without decoding them. The pubsubsql server responds in request order,
+        so the request is forgotten once a response to a later one arrives.
+        """
+        if requestId in self.__outstanding:
+            self.__outstanding.discard(requestId)
+            self.__abandoned.add(requestId)
+
+    def __isReadingLargeFrame(self):
+        return self.__largeBuffer is not None and self.__largeReadB < len(self.__largeBuffer)
+
+    def getReadBuffer(self):
+        """Returns a writable memoryview to receive bytes into without copying them; call received with their count."""
+        # a frame larger than the read buffer gets a buffer of its own
+        self.__startLargeFrame()
+        if self.__isReadingLargeFrame():
+            return memoryview(self.__largeBuffer)[self.__largeReadB:]
+        # make room at the tail for the frame in progress by moving the unread bytes to the front
+        minSizeB = self.__readHeader.getHeaderSizeB()
+        if self.__getBufferedSizeB() >= minSizeB:
+            self.__readHeader.unpackFrom(self.__readBuffer, self.__readStart)
+            minSizeB += self.__readHeader.getMessageSizeB()
+        if len(self.__readBuffer) - self.__readStart < minSizeB:
+            bufferedSizeB = self.__getBufferedSizeB()
+            self.__readBuffer[:bufferedSizeB] = self.__readBuffer[self.__readStart:self.__readEnd]
+            self.__readStart = 0
+            self.__readEnd = bufferedSizeB
+        return memoryview(self.__readBuffer)[self.__readEnd:]
+
+    def received(self, count):
+        """Accounts for count bytes received into the view returned by getReadBuffer."""
+        if self.__isReadingLargeFrame():
+            self.__largeReadB += count
+        else:
+            self.__readEnd += count
+
+    def feed(self, data):
+        """Adds bytes read from the connection."""
+        view = memoryview(data)
+        while len(view):
+            readBuffer = self.getReadBuffer()
+            if not len(readBuffer):
+                # complete frames fill the buffer; make it larger once the view on it is gone
+                readBuffer = None
+                self.__readBuffer += bytearray(len(view))
+                continue
+            count = min(len(readBuffer), len(view))
+            readBuffer[:count] = view[:count]
+            self.received(count)
+            view = view[count:]
+
+    def getBufferedSizeB(self):
+        """Returns the number of bytes received but not returned by nextFrame or nextEvent yet."""
+        if self.__largeBuffer is not None:
+            return self.__getBufferedSizeB() + self.__largeReadB
+        return self.__getBufferedSizeB()
+
+    def __startLargeFrame(self):
+        if self.__largeBuffer is not None:
+            return
+        headerSizeB = self.__readHeader.getHeaderSizeB()
+        if self.__getBufferedSizeB() < headerSizeB:
+            return
+        self.__readHeader.unpackFrom(self.__readBuffer, self.__readStart)
+        dataSizeB = self.__readHeader.getMessageSizeB()
+        if headerSizeB + dataSizeB <= len(self.__readBuffer):
+            return
+        # the rest of the message is received straight into its own buffer
+        dataBuffer = bytearray(dataSizeB)
+        bufferedSizeB = self.__getBufferedSizeB() - headerSizeB
+        dataStart = self.__readStart + headerSizeB
+        dataBuffer[:bufferedSizeB] = memoryview(self.__readBuffer)[dataStart:self.__readEnd]
+        self.__readStart = self.__readEnd = 0
+        self.__largeRequestId = self.__readHeader.getRequestId()
+        self.__largeBuffer = dataBuffer
+        self.__largeReadB = bufferedSizeB
+
+    def hasFrame(self):
+        """Returns true if nextFrame returns a frame, that is once a whole frame was received."""
+        if self.__largeBuffer is not None:
+            return self.__largeReadB == len(self.__largeBuffer)
+        headerSizeB = self.__readHeader.getHeaderSizeB()
+        if self.__getBufferedSizeB() < headerSizeB:
+            return False
+        self.__readHeader.unpackFrom(self.__readBuffer, self.__readStart)
+        return self.__getBufferedSizeB() >= headerSizeB + self.__readHeader.getMessageSizeB()
+
+    def nextFrame(self):
+        """Returns the next complete frame as (requestId, messageBytes) or None.
+
+        The message bytes are bytes or bytearray; the caller owns them.
+        """
+        self.__startLargeFrame()
+        if self.__largeBuffer is not None:
+            if self.__largeReadB < len(self.__largeBuffer):
+                return None
+            frame = (self.__largeRequestId, self.__largeBuffer)
+            self.__largeBuffer = None
+            return frame
+        headerSizeB = self.__readHeader.getHeaderSizeB()
+        if self.__getBufferedSizeB() < headerSizeB:
+            return None
+        self.__readHeader.unpackFrom(self.__readBuffer, self.__readStart)
+        frameSizeB = headerSizeB + self.__readHeader.getMessageSizeB()
+        if self.__getBufferedSizeB() < frameSizeB:
+            return None
+        dataStart = self.__readStart + headerSizeB
+        self.__readStart += frameSizeB
+        messageBytes = memoryview(self.__readBuffer)[dataStart:self.__readStart].tobytes()
+        if self.__readStart == self.__readEnd:
+            self.__readStart = self.__readEnd = 0
+        return self.__readHeader.getRequestId(), messageBytes
+
+    def nextEvent(self):
+        """Returns the next PubSubMessage, ResponseBatch or ErrorResponse, or None until more bytes arrive.
+
+        Raises ProtocolError for a response to a request that does not await one.
+        """
+        while True:
+            frame = self.nextFrame()
+            if frame is None:
+                return None
+            event = self.toEvent(*frame)
+            if event is not None:
+                return event
+
+    def toEvent(self, requestId, messageBytes):
+        """Returns the PubSubMessage, ResponseBatch or ErrorResponse of a frame returned by nextFrame.
+
+        Decodes responses; raises ProtocolError for a response to a request that does not await one.
+        Returns None for a frame of an abandoned request, see abandon.
+        """
+        if not requestId:
+            return PubSubMessage(messageBytes, self.__loadJson)
+        if requestId in self.__abandoned:
+            return None
+        if requestId not in self.__outstanding:
+            raise ProtocolError("Protocol error invalid request id", requestId)
+        if self.__abandoned:
+            # the abandoned requests sent before this one are complete
+            self.__abandoned = set(abandoned for abandoned in self.__abandoned if abandoned > requestId)
+        parsedJson = self.__loadJson(messageBytes)
+        if type(parsedJson) is dict and parsedJson.get("status") == "ok":
+            event = ResponseBatch(requestId, messageBytes, parsedJson)
+        else:
+            event = ErrorResponse(requestId, messageBytes, parsedJson)
+        if event.isLast():
+            self.__outstanding.discard(requestId)
+        return event
+
+    def __init__(self, readBufferSizeB = 64 * 1024, loadJson = loadJson):
+        """Creates a Protocol.
+
+        Frames are sliced out of a read buffer of readBufferSizeB bytes so that a single
+        read can deliver many frames; larger frames get a buffer of their own. A readBufferSizeB
+        of 0 receives every header and message separately. loadJson decodes messages.
+        """
+        self.__readHeader = NetHeader()
+        self.__writeHeader = NetHeader()
+        self.__readBuffer = bytearray(max(readBufferSizeB, self.__readHeader.getHeaderSizeB()))
+        self.__loadJson = loadJson
+        self.__requestId = 0
+        self.__outstanding = set()
+        self.__abandoned = set()
+        self.__resetInput()
+        self.__outgoing = bytearray()
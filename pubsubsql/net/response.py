@@ -40,6 +40,9 @@ class Response:
     def getData(self):
         return self.__parsedJson.get("data", [])
 
+    def getParsedJson(self):
+        return self.__parsedJson
+
     def reset(self):
         self.__parsedJson = {}
 
@@ -12,7 +12,7 @@ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
 """
 
 import unittest
-from header import Header as NetHeader
+from pubsubsql.net.header import Header as NetHeader
 
 class TestHeader(unittest.TestCase):
          
@@ -57,5 +57,20 @@ class TestHeader(unittest.TestCase):
                          header2.getRequestId(),
                          "RequestId do not match")
 
+    def testUnpackFrom(self):
+        header1 = NetHeader(32567, 9875235)
+        header2 = NetHeader()
+        #
+        buffer_bytes = bytearray(3) + header1.getBytes() + bytearray(5)
+        header2.unpackFrom(buffer_bytes, 3)
+        #
+        self.assertEqual(header1.getMessageSizeB(),
+                         header2.getMessageSizeB(),
+                         "MessageSize do not match")
+        #
+        self.assertEqual(header1.getRequestId(),
+                         header2.getRequestId(),
+                         "RequestId do not match")
+
 if __name__ == "__main__":
     unittest.main()
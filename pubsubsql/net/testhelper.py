@@ -0,0 +1,124 @@
+#! /usr/bin/env python
+"""
+Copyright (C) 2014 CompleteDB LLC.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the Apache License Version 2.0 http://www.apache.org/licenses.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+
+"""
+
+import unittest
+import socket
+from pubsubsql.net.header import Header as NetHeader
+from pubsubsql.net.helper import Helper as NetHelper
+
+class TestHelper(unittest.TestCase):
+
+    def __frame(self, requestId, messageBytes):
+        return bytes(NetHeader(len(messageBytes), requestId).getBytes()) + messageBytes
+
+    def __frames(self):
+        frames = []
+        for requestId in range(1, 50):
+            frames.append((requestId, b"x" * (requestId * 7)))
+        return frames
+
+    def __connect(self, readBufferSizeB):
+        listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        listener.bind(("127.0.0.1", 0))
+        listener.listen(1)
+        helper = NetHelper(readBufferSizeB)
+        helper.open("127.0.0.1", listener.getsockname()[1])
+        sender, _ = listener.accept()
+        listener.close()
+        return helper, sender
+
+    def __checkRead(self, readBufferSizeB, chunkSizeB):
+        helper, sender = self.__connect(readBufferSizeB)
+        frames = self.__frames()
+        data = b"".join([self.__frame(requestId, messageBytes) for requestId, messageBytes in frames])
+        for offset in range(0, len(data), chunkSizeB):
+            sender.sendall(data[offset:offset + chunkSizeB])
+        for requestId, messageBytes in frames:
+            self.assertEqual(messageBytes, helper.readTimeout(1))
+            self.assertEqual(requestId, helper.getHeader().getRequestId())
+        sender.close()
+        helper.close()
+
+    def setUp(self):
+        pass
+
+    def tearDown(self):
+        pass
+
+    def testReadUnbuffered(self):
+        self.__checkRead(0, 1000)
+
+    def testReadBuffered(self):
+        self.__checkRead(64 * 1024, 100000)
+
+    def testReadBufferedPartialFrames(self):
+        self.__checkRead(1024, 3)
+
+    def testReadMessageLargerThanBuffer(self):
+        self.__checkRead(64, 1000)
+
+    def testReadTimeoutKeepsPartialFrame(self):
+        helper, sender = self.__connect(1024)
+        frame = self.__frame(5, b"hello")
+        sender.sendall(frame[:6])
+        self.assertEqual(None, helper.readTimeout(0.01))
+        sender.sendall(frame[6:])
+        self.assertEqual(b"hello", helper.readTimeout(1))
+        self.assertEqual(5, helper.getHeader().getRequestId())
+        sender.close()
+        helper.close()
+
+    def testWriteMany(self):
+        helper, sender = self.__connect(1024)
+        frames = self.__frames()
+        helper.writeManyWithHeader(1, [messageBytes for requestId, messageBytes in frames])
+        data = b"".join([self.__frame(requestId, messageBytes) for requestId, messageBytes in frames])
+        received = b""
+        while len(received) < len(data):
+            received += sender.recv(len(data) - len(received))
+        self.assertEqual(data, received)
+        sender.close()
+        helper.close()
+
+    def testWriteParts(self):
+        helper, sender = self.__connect(1024)
+        helper.writePartsWithHeader(3, [b"update T set col1 = ", b"1", b" where id = ", b"2"])
+        helper.writeWithHeader(4, b"status")
+        data = self.__frame(3, b"update T set col1 = 1 where id = 2") + self.__frame(4, b"status")
+        received = b""
+        while len(received) < len(data):
+            received += sender.recv(len(data) - len(received))
+        self.assertEqual(data, received)
+        sender.close()
+        helper.close()
+
+    def testReceive(self):
+        helper, sender = self.__connect(64)
+        frame = self.__frame(5, b"hello")
+        sender.sendall(frame[:6])
+        self.assertTrue(helper.isReadable())
+        self.assertFalse(helper.receive())
+        self.assertFalse(helper.isReadable())
+        sender.sendall(frame[6:] + self.__frame(0, b"x" * 100)[:10])
+        self.assertTrue(helper.receive())
+        self.assertEqual(b"hello", helper.read())
+        # a frame larger than the read buffer only counts once it is complete
+        self.assertFalse(helper.hasFrame())
+        self.assertEqual(None, helper.nextEvent())
+        sender.sendall(b"x" * 98)
+        self.assertEqual(b"x" * 100, helper.read())
+        sender.close()
+        helper.close()
+
+if __name__ == "__main__":
+    unittest.main()
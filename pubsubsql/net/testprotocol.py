@@ -0,0 +1,184 @@
+#! /usr/bin/env python
+"""
+Copyright (C) 2014 CompleteDB LLC.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the Apache License Version 2.0 http://www.apache.org/licenses.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+
+"""
+
+import unittest
+import json
+from pubsubsql.net.header import Header as NetHeader
+from pubsubsql.net.protocol import Protocol, ProtocolError, PubSubMessage, ResponseBatch, ErrorResponse
+
+class TestProtocol(unittest.TestCase):
+
+    def __frame(self, requestId, messageBytes):
+        return bytes(NetHeader(len(messageBytes), requestId).getBytes()) + messageBytes
+
+    def __response(self, requestId, **fields):
+        fields["status"] = fields.get("status", "ok")
+        return self.__frame(requestId, json.dumps(fields).encode("utf-8"))
+
+    def __events(self, protocol):
+        events = []
+        event = protocol.nextEvent()
+        while event is not None:
+            events.append(event)
+            event = protocol.nextEvent()
+        return events
+
+    def setUp(self):
+        pass
+
+    def tearDown(self):
+        pass
+
+    def testSend(self):
+        protocol = Protocol()
+        self.assertEqual(1, protocol.send("status"))
+        self.assertEqual(2, protocol.send(b"stream delete from T", False))
+        self.assertEqual(3, protocol.sendMany(["select * from T", "key T"]))
+        self.assertEqual(5, protocol.send([b"update T set col1 = ", b"1"]))
+        data = (self.__frame(1, b"status") + self.__frame(2, b"stream delete from T")
+                + self.__frame(3, b"select * from T") + self.__frame(4, b"key T")
+                + self.__frame(5, b"update T set col1 = 1"))
+        self.assertEqual(data, protocol.dataToSend().tobytes())
+        protocol.dataSent()
+        self.assertEqual(b"", protocol.dataToSend().tobytes())
+        self.assertTrue(protocol.isAwaitingResponse(1))
+        self.assertFalse(protocol.isAwaitingResponse(2))
+        self.assertTrue(protocol.isAwaitingResponse(4))
+
+    def testDataSent(self):
+        protocol = Protocol()
+        protocol.send("status")
+        view = protocol.dataToSend()
+        # frames queued while a view is held do not change it
+        protocol.send("key T")
+        self.assertEqual(self.__frame(1, b"status"), view.tobytes())
+        view = None
+        data = self.__frame(1, b"status") + self.__frame(2, b"key T")
+        self.assertEqual(data, protocol.dataToSend().tobytes())
+        protocol.dataSent(3)
+        self.assertEqual(data[3:], protocol.dataToSend().tobytes())
+        protocol.dataSent()
+        self.assertEqual(b"", protocol.dataToSend().tobytes())
+
+    def testOutgoingBufferReused(self):
+        protocol = Protocol()
+        protocol.send("status")
+        outgoing = protocol.dataToSend()
+        if not hasattr(outgoing, "obj"):
+            self.skipTest("memoryview.obj requires python 3.3")
+        outgoing = outgoing.obj
+        protocol.dataSent()
+        protocol.send("status")
+        self.assertTrue(protocol.dataToSend().obj is outgoing)
+        protocol.dataSent()
+        # a buffer that grew past the keep size is given back
+        protocol.send("insert into T (a) values ('{}')".format("x" * 2 * 1024 * 1024))
+        protocol.dataSent()
+        self.assertFalse(protocol.dataToSend().obj is outgoing)
+
+    def testFeedByteByByte(self):
+        protocol = Protocol(64)
+        requestId = protocol.send("select * from T")
+        data = (self.__frame(0, b'{"action":"insert"}')
+                + self.__response(requestId, rows=4, fromrow=1, torow=2)
+                + self.__response(requestId, rows=4, fromrow=3, torow=4)
+                + self.__frame(0, b'{"action":"delete"}'))
+        events = []
+        for offset in range(len(data)):
+            protocol.feed(data[offset:offset + 1])
+            events += self.__events(protocol)
+        self.assertEqual(4, len(events))
+        self.assertTrue(isinstance(events[0], PubSubMessage))
+        self.assertEqual("insert", events[0].getJson()["action"])
+        self.assertTrue(isinstance(events[1], ResponseBatch))
+        self.assertFalse(events[1].isLast())
+        self.assertTrue(events[2].isLast())
+        self.assertEqual(requestId, events[2].getRequestId())
+        self.assertEqual(b'{"action":"delete"}', events[3].getBytes())
+        self.assertFalse(protocol.isAwaitingResponse(requestId))
+        self.assertEqual(0, protocol.getBufferedSizeB())
+
+    def testFeedManyFrames(self):
+        protocol = Protocol(1024)
+        data = b"".join([self.__frame(0, b"x" * size) for size in range(1, 300)])
+        protocol.feed(data)
+        self.assertEqual(len(data), protocol.getBufferedSizeB())
+        sizes = [len(event.getBytes()) for event in self.__events(protocol)]
+        self.assertEqual(list(range(1, 300)), sizes)
+
+    def testLargeFrame(self):
+        protocol = Protocol(64)
+        messageBytes = b"y" * 1000
+        frame = self.__frame(0, messageBytes)
+        protocol.feed(frame[:10])
+        self.assertFalse(protocol.hasFrame())
+        self.assertEqual(None, protocol.nextFrame())
+        readBuffer = protocol.getReadBuffer()
+        # the rest of a large frame is received straight into its own buffer
+        self.assertEqual(len(frame) - 10, len(readBuffer))
+        readBuffer[:] = frame[10:]
+        protocol.received(len(frame) - 10)
+        self.assertTrue(protocol.hasFrame())
+        self.assertEqual((0, messageBytes), protocol.nextFrame())
+        self.assertEqual(None, protocol.nextFrame())
+
+    def testUnbuffered(self):
+        protocol = Protocol(0)
+        protocol.feed(self.__frame(0, b"a") + self.__frame(0, b"bb"))
+        self.assertEqual([b"a", b"bb"], [event.getBytes() for event in self.__events(protocol)])
+
+    def testErrorResponse(self):
+        protocol = Protocol()
+        requestId = protocol.send("select * from X")
+        protocol.feed(self.__response(requestId, status="err", msg="Table X does not exist"))
+        event = protocol.nextEvent()
+        self.assertTrue(isinstance(event, ErrorResponse))
+        self.assertFalse(event.isOk())
+        self.assertTrue(event.isLast())
+        self.assertEqual("Table X does not exist", event.getMsg())
+        self.assertFalse(protocol.isAwaitingResponse(requestId))
+
+    def testInvalidRequestId(self):
+        protocol = Protocol()
+        protocol.send("stream delete from T", False)
+        protocol.feed(self.__response(1))
+        self.assertRaises(ProtocolError, protocol.nextEvent)
+
+    def testAbandon(self):
+        protocol = Protocol()
+        selectId = protocol.send("select * from T")
+        statusId = protocol.send("status")
+        protocol.feed(self.__response(selectId, action="select", rows=3, fromrow=1, torow=1))
+        self.assertEqual(selectId, protocol.nextEvent().getRequestId())
+        protocol.abandon(selectId)
+        self.assertFalse(protocol.isAwaitingResponse(selectId))
+        # the batches left are not decoded, so they need not even be JSON
+        protocol.feed(self.__frame(selectId, b"batch 2") + self.__frame(0, b"{}") + self.__frame(selectId, b"batch 3"))
+        protocol.feed(self.__response(statusId, action="status"))
+        self.assertEqual([0, statusId], [event.getRequestId() for event in self.__events(protocol)])
+        # forgotten once a later request is answered
+        protocol.feed(self.__response(selectId))
+        self.assertRaises(ProtocolError, protocol.nextEvent)
+
+    def testReset(self):
+        protocol = Protocol()
+        requestId = protocol.send("status")
+        protocol.feed(self.__frame(0, b"{}")[:5])
+        protocol.reset()
+        self.assertFalse(protocol.isAwaitingResponse(requestId))
+        self.assertEqual(0, protocol.getBufferedSizeB())
+        self.assertEqual(b"", protocol.dataToSend().tobytes())
+        self.assertEqual(requestId + 1, protocol.getNextRequestId())
+
+if __name__ == "__main__":
+    unittest.main()
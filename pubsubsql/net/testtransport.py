@@ -0,0 +1,54 @@
+#! /usr/bin/env python
+"""
+Copyright (C) 2014 CompleteDB LLC.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the Apache License Version 2.0 http://www.apache.org/licenses.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+
+"""
+
+import unittest
+import socket
+from pubsubsql.net.helper import Helper as NetHelper
+from pubsubsql.net.transport import parseAddress, registerInProcess, unregisterInProcess
+from pubsubsql.net.transport import TcpTransport, UnixTransport, InProcessTransport
+
+class TestTransport(unittest.TestCase):
+
+    def testParseAddress(self):
+        transport = parseAddress("localhost:7777")
+        self.assertTrue(isinstance(transport, TcpTransport))
+        self.assertEqual(("localhost", 7777), (transport.getHost(), transport.getPort()))
+        transport = parseAddress("unix:/tmp/pubsubsql.sock")
+        self.assertTrue(isinstance(transport, UnixTransport))
+        self.assertEqual("/tmp/pubsubsql.sock", transport.getPath())
+        transport = parseAddress("inproc:server")
+        self.assertTrue(isinstance(transport, InProcessTransport))
+        self.assertEqual("inproc:server", str(transport))
+        for address in ("localhost", ":7777", "localhost:", "localhost:port", "unix:", "inproc:"):
+            self.assertRaises(ValueError, parseAddress, address)
+
+    def testInProcess(self):
+        accepted = []
+        registerInProcess("testInProcess", accepted.append)
+        try:
+            self.assertRaises(ValueError, registerInProcess, "testInProcess", accepted.append)
+            helper = NetHelper()
+            helper.openTransport(parseAddress("inproc:testInProcess"))
+            self.assertEqual(1, len(accepted))
+            helper.writeWithHeader(3, b"status")
+            self.assertEqual(8 + 6, len(accepted[0].recv(100)))
+            accepted[0].sendall(b"\x00\x00\x00\x02\x00\x00\x00\x03ok")
+            self.assertEqual(b"ok", helper.readTimeout(1))
+            helper.close()
+            accepted[0].close()
+        finally:
+            unregisterInProcess("testInProcess")
+        self.assertRaises(socket.error, NetHelper().openTransport, parseAddress("inproc:testInProcess"))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,144 @@
+#! /usr/bin/env python
+"""
+Copyright (C) 2014 CompleteDB LLC.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the Apache License Version 2.0 http://www.apache.org/licenses.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+
+"""
+
+import socket
+import threading
+
+class TcpTransport:
+    """Connects to a pubsubsql server over TCP; the address has the form host:port."""
+
+    def connect(self, timeoutSec):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        try:
+            sock.settimeout(timeoutSec)
+            sock.connect((self.__host, self.__port))
+            sock.settimeout(None)
+            # every send already holds whole frames; Nagle's algorithm would only hold
+            # a small command back until the previous send is acked
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        except:
+            sock.close()
+            raise
+        return sock
+
+    def getHost(self):
+        return self.__host
+
+    def getPort(self):
+        return self.__port
+
+    def __str__(self):
+        return "{}:{}".format(self.__host, self.__port)
+
+    def __init__(self, host, port):
+        self.__host = host
+        self.__port = port
+
+class UnixTransport:
+    """Connects to a pubsubsql server on the same host over a Unix domain socket; the address has the form unix:path."""
+
+    def connect(self, timeoutSec):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.settimeout(timeoutSec)
+            sock.connect(self.__path)
+            sock.settimeout(None)
+        except:
+            sock.close()
+            raise
+        return sock
+
+    def getPath(self):
+        return self.__path
+
+    def __str__(self):
+        return "unix:{}".format(self.__path)
+
+    def __init__(self, path):
+        self.__path = path
+
+_inProcessLock = threading.Lock()
+_inProcessAcceptors = {}
+
+def registerInProcess(name, acceptor):
+    """Makes the address inproc:name connect to acceptor.
+
+    Every connection creates a socket pair; acceptor is called with the server's
+    end and serves it, typically by handing it to a thread or event loop of its own.
+    """
+    with _inProcessLock:
+        if name in _inProcessAcceptors:
+            raise ValueError("In-process name is taken", name)
+        _inProcessAcceptors[name] = acceptor
+
+def unregisterInProcess(name):
+    with _inProcessLock:
+        _inProcessAcceptors.pop(name, None)
+
+def getInProcessAcceptor(name):
+    with _inProcessLock:
+        return _inProcessAcceptors.get(name)
+
+class InProcessTransport:
+    """Connects to a server running in the same process over a socket pair; the address has the form inproc:name.
+
+    See registerInProcess. Skips the network stack and the listening socket altogether.
+    """
+
+    def connect(self, timeoutSec):
+        acceptor = getInProcessAcceptor(self.__name)
+        if acceptor is None:
+            raise socket.error("No in-process server", self.__name)
+        sock, serverSock = socket.socketpair()
+        try:
+            acceptor(serverSock)
+        except:
+            sock.close()
+            serverSock.close()
+            raise
+        return sock
+
+    def getName(self):
+        return self.__name
+
+    def __str__(self):
+        return "inproc:{}".format(self.__name)
+
+    def __init__(self, name):
+        self.__name = name
+
+def parseAddress(address):
+    """Returns the transport for an address of the form host:port, unix:path or inproc:name.
+
+    Raises ValueError when the address is not valid.
+    """
+    scheme, separator, rest = address.partition(":")
+    if separator and scheme == "unix":
+        if not rest:
+            raise ValueError("Path is not provided")
+        return UnixTransport(rest)
+    if separator and scheme == "inproc":
+        if not rest:
+            raise ValueError("Name is not provided")
+        return InProcessTransport(rest)
+    host, separator, port = address.partition(":")
+    if not separator:
+        raise ValueError("Invalid network address", address)
+    elif not host:
+        raise ValueError("Host is not provided")
+    elif not port:
+        raise ValueError("Port is not provided")
+    try:
+        return TcpTransport(host, int(port))
+    except ValueError:
+        raise ValueError("Invalid port", port)
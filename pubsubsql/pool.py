@@ -0,0 +1,233 @@
+#! /usr/bin/env python
+"""
+Copyright (C) 2014 CompleteDB LLC.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the Apache License Version 2.0 http://www.apache.org/licenses.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+
+"""
+
+import collections
+import contextlib
+import threading
+import time
+from pubsubsql.client import Client
+
+class ClientPool:
+    """Bounded pool of connected Clients.
+
+    Clients are checked out for one job at a time, preferably with
+    the connection context manager, and returned to the pool connected.
+    Pooled Clients are meant for executing commands; a Client that
+    subscribed to a table should not be returned to the pool.
+    """
+
+    def __clock(self):
+        return time.time()
+
+    def __disconnect(self, clients):
+        for client in clients:
+            try:
+                client.disconnect()
+            except:
+                pass
+
+    def __connect(self):
+        client = Client()
+        client.connect(self.__address)
+        return client
+
+    def __removeIdle(self, now):
+        # the least recently used Clients are at the left
+        expired = []
+        while self.__idle and now - self.__idle[0][1] >= self.__idleTimeoutSec:
+            expired.append(self.__idle.popleft()[0])
+        self.__size -= len(expired)
+        self.__reaped += len(expired)
+        if expired:
+            self.__condition.notify(len(expired))
+        return expired
+
+    def __accountBusy(self, now):
+        # busy time integrates the number of Clients in use over time
+        self.__busySec += (now - self.__busySince) * self.__inUse
+        self.__busySince = now
+
+    def __take(self, timeoutSec, expired):
+        # returns an idle Client, or None when a new Client may be connected;
+        # idle Clients that expired are added to expired for the caller to disconnect
+        start = self.__clock()
+        with self.__condition:
+            while True:
+                if self.__closed:
+                    raise IOError("ClientPool is closed")
+                expired.extend(self.__removeIdle(self.__clock()))
+                if self.__idle:
+                    client = self.__idle.pop()[0]
+                    break
+                if self.__size < self.__maxSize:
+                    self.__size += 1
+                    client = None
+                    break
+                waitSec = None
+                if timeoutSec is not None:
+                    waitSec = timeoutSec - (self.__clock() - start)
+                    if waitSec <= 0:
+                        self.__timeouts += 1
+                        raise IOError("Timed out waiting for a Client")
+                self.__condition.wait(waitSec)
+            now = self.__clock()
+            self.__accountBusy(now)
+            self.__inUse += 1
+            self.__peakInUse = max(self.__peakInUse, self.__inUse)
+            self.__checkouts += 1
+            waitSec = now - start
+            self.__waitSec += waitSec
+            self.__maxWaitSec = max(self.__maxWaitSec, waitSec)
+            return client
+
+    def __release(self, client, keep):
+        with self.__condition:
+            self.__accountBusy(self.__clock())
+            self.__inUse -= 1
+            if keep and not self.__closed:
+                self.__idle.append((client, self.__clock()))
+            else:
+                self.__size -= 1
+                if client is not None:
+                    self.__discarded += 1
+            self.__condition.notify()
+
+    def checkout(self, timeoutSec = None):
+        """Returns a connected Client from the pool.
+
+        Returns an idle Client that has not been idle for longer than idleTimeoutSec
+        and passes a cheap connection check, or connects
+        a new one while the pool has fewer than maxSize Clients. Otherwise waits until
+        a Client is checked in; raises IOError when timeoutSec elapses first.
+        """
+        while True:
+            expired = []
+            try:
+                client = self.__take(timeoutSec, expired)
+            finally:
+                self.__disconnect(expired)
+            if client is not None and client.isAlive():
+                return client
+            if client is not None:
+                # the pubsubsql server closed the connection while the Client was idle
+                self.__release(client, False)
+                self.__disconnect([client])
+                continue
+            try:
+                client = self.__connect()
+            except:
+                self.__release(None, False)
+                raise
+            with self.__condition:
+                self.__created += 1
+            return client
+
+    def checkin(self, client):
+        """Returns a Client to the pool.
+
+        Clients that were disconnected, for example after a network error, are discarded.
+        """
+        keep = client.isConnected()
+        self.__release(client, keep)
+        if not keep or self.__closed:
+            self.__disconnect([client])
+        self.reap()
+
+    @contextlib.contextmanager
+    def connection(self, timeoutSec = None):
+        """Checks out a Client for the duration of a with block."""
+        client = self.checkout(timeoutSec)
+        try:
+            yield client
+        finally:
+            self.checkin(client)
+
+    def reap(self):
+        """Disconnects Clients that have been idle for longer than idleTimeoutSec."""
+        with self.__condition:
+            expired = self.__removeIdle(self.__clock())
+        self.__disconnect(expired)
+        return len(expired)
+
+    def close(self):
+        """Disconnects idle Clients; Clients in use are disconnected when checked in."""
+        with self.__condition:
+            self.__closed = True
+            idle = [client for client, idleSince in self.__idle]
+            self.__idle.clear()
+            self.__size -= len(idle)
+            self.__condition.notify_all()
+        self.__disconnect(idle)
+
+    def getStats(self):
+        """Returns pool statistics as a dict.
+
+        size, idle and inUse count the Clients right now; utilization is inUse / maxSize
+        and averageUtilization is the same ratio averaged since the pool was created.
+        waitSec and maxWaitSec measure the time checkout spent waiting for a Client.
+        """
+        with self.__condition:
+            now = self.__clock()
+            self.__accountBusy(now)
+            elapsedSec = now - self.__createdAt
+            averageUtilization = 0.0
+            if elapsedSec > 0:
+                averageUtilization = self.__busySec / (elapsedSec * self.__maxSize)
+            averageWaitSec = 0.0
+            if self.__checkouts:
+                averageWaitSec = self.__waitSec / self.__checkouts
+            return {
+                "maxSize": self.__maxSize,
+                "size": self.__size,
+                "idle": len(self.__idle),
+                "inUse": self.__inUse,
+                "peakInUse": self.__peakInUse,
+                "utilization": float(self.__inUse) / self.__maxSize,
+                "averageUtilization": averageUtilization,
+                "checkouts": self.__checkouts,
+                "timeouts": self.__timeouts,
+                "waitSec": self.__waitSec,
+                "averageWaitSec": averageWaitSec,
+                "maxWaitSec": self.__maxWaitSec,
+                "created": self.__created,
+                "discarded": self.__discarded,
+                "reaped": self.__reaped,
+            }
+
+    def __init__(self, address, maxSize = 8, idleTimeoutSec = 300.0):
+        """Creates a ClientPool.
+
+        Creates a ClientPool of at most maxSize Clients connected to the pubsubsql server at address.
+        Clients idle for longer than idleTimeoutSec are disconnected.
+        """
+        if maxSize < 1:
+            raise ValueError("Invalid maxSize", maxSize)
+        self.__address = address
+        self.__maxSize = maxSize
+        self.__idleTimeoutSec = idleTimeoutSec
+        self.__condition = threading.Condition()
+        self.__idle = collections.deque()
+        self.__size = 0
+        self.__inUse = 0
+        self.__peakInUse = 0
+        self.__closed = False
+        self.__createdAt = self.__clock()
+        self.__busySince = self.__createdAt
+        self.__busySec = 0.0
+        self.__checkouts = 0
+        self.__timeouts = 0
+        self.__waitSec = 0.0
+        self.__maxWaitSec = 0.0
+        self.__created = 0
+        self.__discarded = 0
+        self.__reaped = 0
@@ -0,0 +1,119 @@
+#! /usr/bin/env python
+"""
+Copyright (C) 2014 CompleteDB LLC.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the Apache License Version 2.0 http://www.apache.org/licenses.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+
+"""
+
+import collections
+import threading
+from pubsubsql.net.protocol import ProtocolError
+
+class BatchPrefetcher:
+    """Reads and decodes the following batches of a result set on a background thread.
+
+    While it runs the BatchPrefetcher is the only reader of the connection.
+    Decoded batches wait in a queue bounded by maxBatches and maxBytes;
+    pubsub messages read along the way are appended to the backlog.
+    """
+
+    def __put(self, item, sizeB):
+        with self.__condition:
+            while (not self.__abandoned and self.__queue
+                   and (len(self.__queue) >= self.__maxBatches
+                        or self.__queuedB + sizeB > self.__maxBytes)):
+                self.__condition.wait()
+            if self.__abandoned:
+                return False
+            self.__queue.append((item, sizeB))
+            self.__queuedB += sizeB
+            self.__condition.notify_all()
+            return True
+
+    def __run(self):
+        try:
+            while True:
+                event = self.__net.readEventTimeout(0)
+                if event is None:
+                    raise IOError("Read timed out")
+                if not event.getRequestId():
+                    with self.__condition:
+                        self.__backlog.append(event.getBytes())
+                    continue
+                if event.getRequestId() != self.__requestId:
+                    raise ProtocolError("Protocol error invalid request id", event.getRequestId())
+                messageBytes = event.getBytes()
+                queued = self.__put((messageBytes, event.getJson(), None), len(messageBytes))
+                if event.isLast():
+                    return
+                if not queued:
+                    # the protocol drops the rest of the result set without decoding it
+                    self.__net.getProtocol().abandon(self.__requestId)
+                    return
+        except Exception as e:
+            self.__put((None, None, e), 0)
+        finally:
+            with self.__condition:
+                self.__done = True
+                self.__condition.notify_all()
+
+    def start(self):
+        self.__thread.start()
+
+    def next(self):
+        """Returns the next batch as (messageBytes, parsedJson).
+
+        Raises the error the background thread ran into reading the batch.
+        """
+        with self.__condition:
+            while not self.__queue:
+                if self.__done:
+                    raise IOError("Result set already read")
+                self.__condition.wait()
+            item, sizeB = self.__queue.popleft()
+            self.__queuedB -= sizeB
+            self.__condition.notify_all()
+        messageBytes, parsedJson, error = item
+        if error is not None:
+            raise error
+        return messageBytes, parsedJson
+
+    def setBacklog(self, backlog):
+        """Moves the pubsub messages to backlog and appends the ones read from now on to it."""
+        with self.__condition:
+            while len(self.__backlog):
+                backlog.append(self.__backlog.popleft())
+            self.__backlog = backlog
+
+    def abandon(self):
+        """Discards the rest of the result set and waits for the background thread to finish.
+
+        The background thread stops after the batch it is reading and abandons the rest
+        of the result set, see Protocol.abandon.
+        """
+        with self.__condition:
+            self.__abandoned = True
+            self.__queue.clear()
+            self.__queuedB = 0
+            self.__condition.notify_all()
+        self.__thread.join()
+
+    def __init__(self, net, requestId, backlog, maxBatches, maxBytes):
+        self.__net = net
+        self.__requestId = requestId
+        self.__backlog = backlog
+        self.__maxBatches = maxBatches
+        self.__maxBytes = maxBytes
+        self.__condition = threading.Condition()
+        self.__queue = collections.deque()
+        self.__queuedB = 0
+        self.__abandoned = False
+        self.__done = False
+        self.__thread = threading.Thread(target=self.__run)
+        self.__thread.daemon = True
@@ -0,0 +1,80 @@
+#! /usr/bin/env python
+"""
+Copyright (C) 2014 CompleteDB LLC.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the Apache License Version 2.0 http://www.apache.org/licenses.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+
+"""
+
+from pubsubsql.quoting import Quoter
+
+class BoundCommand:
+    """Command of a PreparedCommand with its parameters, kept as the UTF-8 encoded parts of the message.
+
+    Client writes the parts straight into its frame buffer after the header.
+    """
+
+    def getParts(self):
+        return self.__parts
+
+    def getSizeB(self):
+        return sum(len(part) for part in self.__parts)
+
+    def __str__(self):
+        return b"".join(self.__parts).decode("utf-8")
+
+    def __init__(self, parts):
+        self.__parts = parts
+
+class PreparedCommand:
+    """Command template with a ? placeholder for every parameter.
+
+    The template is parsed once into a format string; binding only quotes the
+    parameters and formats and encodes the command in one call each, which is
+    cheaper in Python than joining pre-encoded segments. A ? within single quotes
+    is not a placeholder. Pass the BoundCommand returned by bind to Client.execute,
+    submit or stream.
+    """
+
+    def __parse(self, command):
+        segments = []
+        segment = []
+        quoted = False
+        for char in command:
+            if char == "'":
+                # a doubled quote within quotes leaves and re-enters the quotes
+                quoted = not quoted
+            if char == "?" and not quoted:
+                segments.append("".join(segment))
+                segment = []
+            else:
+                segment.append(char)
+        segments.append("".join(segment))
+        return segments
+
+    def bind(self, *params):
+        """Returns the command with the parameters in place of the placeholders; raises ValueError for a wrong count."""
+        if len(params) != self.__paramCount:
+            raise ValueError("Expected {} parameters".format(self.__paramCount), len(params))
+        quote = self.__quoter.quote
+        return BoundCommand((self.__format.format(*map(quote, params)).encode("utf-8"),))
+
+    def getCommand(self):
+        return self.__command
+
+    def getParamCount(self):
+        return self.__paramCount
+
+    def __init__(self, command, quoter = None):
+        if quoter is None:
+            quoter = Quoter()
+        self.__command = command
+        self.__quoter = quoter
+        segments = self.__parse(command)
+        self.__paramCount = len(segments) - 1
+        self.__format = "{}".join([segment.replace("{", "{{").replace("}", "}}") for segment in segments])
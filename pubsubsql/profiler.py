@@ -0,0 +1,152 @@
+#! /usr/bin/env python
+"""
+Copyright (C) 2014 CompleteDB LLC.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the Apache License Version 2.0 http://www.apache.org/licenses.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+
+"""
+
+from __future__ import print_function
+
+import struct
+import sys
+import threading
+from pubsubsql.metrics import clock
+
+PHASES = ("recv", "copy", "decode", "json", "iterate", "other")
+
+def _MAGIC():
+    return b"PSSPROF\x01"
+
+def _RECORD():
+    # request id, rows, then the time of every phase in microseconds
+    return struct.Struct(">II{}f".format(len(PHASES)))
+
+class Profiler:
+    """Breaks every execute of a Client down into phases and writes them to a trace file, see Client.setProfiler.
+
+    recv is the time spent in recv_into, which includes waiting for the pubsubsql server,
+    copy the time spent copying frames out of the read buffer, decode the UTF-8 decoding
+    and json the json.loads of the responses, including the later batches of the result set.
+    iterate is the time the application spent going through the result set with nextRow or
+    the fetch methods until the last row or the next command, and other the rest of the time
+    execute took, such as writing the command. The phases do not overlap. Frames read while
+    a request is profiled, such as pubsub messages, count towards it.
+    Every request takes a fixed size record; see readTrace and report.
+    """
+
+    def begin(self, requestId):
+        """Starts profiling a request, ending the previous one."""
+        with self.__lock:
+            self.__end()
+            self.__requestId = requestId
+            self.__times = [0.0] * len(PHASES)
+            self.__readSec = 0.0
+            self.__iterateStart = None
+
+    def add(self, phase, sec):
+        with self.__lock:
+            if self.__times is not None:
+                self.__times[self.__index[phase]] += sec
+                self.__readSec += sec
+
+    def startIterate(self, executeSec, rows):
+        """Records the time execute took besides reading and starts the iterate phase."""
+        with self.__lock:
+            if self.__times is None:
+                return
+            self.__times[self.__index["other"]] = max(executeSec - self.__readSec, 0.0)
+            self.__rows = rows
+            self.__readSec = 0.0
+            # a response without rows has nothing to iterate
+            if rows:
+                self.__iterateStart = clock()
+
+    def __end(self):
+        if self.__times is None:
+            return
+        if self.__iterateStart is not None:
+            self.__times[self.__index["iterate"]] = max(clock() - self.__iterateStart - self.__readSec, 0.0)
+        self.__file.write(_RECORD().pack(self.__requestId, self.__rows, *[sec * 1e6 for sec in self.__times]))
+        self.__records += 1
+        self.__times = None
+        self.__rows = 0
+        self.__readSec = 0.0
+
+    def end(self):
+        """Ends profiling the current request and writes its record."""
+        with self.__lock:
+            self.__end()
+
+    def getRecordCount(self):
+        return self.__records
+
+    def close(self):
+        """Ends the current request and closes the trace file."""
+        with self.__lock:
+            self.__end()
+            self.__file.close()
+
+    def __init__(self, path):
+        """Creates a Profiler writing its trace to the file at path."""
+        self.__lock = threading.Lock()
+        self.__index = dict((phase, index) for index, phase in enumerate(PHASES))
+        self.__file = open(path, "wb")
+        self.__file.write(_MAGIC())
+        self.__requestId = 0
+        self.__rows = 0
+        self.__times = None
+        self.__readSec = 0.0
+        self.__iterateStart = None
+        self.__records = 0
+
+def readTrace(path):
+    """Yields the records of a trace file as dicts with requestId, rows and the time of every phase in seconds."""
+    record = _RECORD()
+    with open(path, "rb") as traceFile:
+        if traceFile.read(len(_MAGIC())) != _MAGIC():
+            raise ValueError("Not a pubsubsql trace file", path)
+        while True:
+            recordBytes = traceFile.read(record.size)
+            if len(recordBytes) < record.size:
+                return
+            values = record.unpack(recordBytes)
+            entry = {"requestId": values[0], "rows": values[1]}
+            for phase, usec in zip(PHASES, values[2:]):
+                entry[phase] = usec / 1e6
+            yield entry
+
+def _percentile(values, fraction):
+    # nearest rank of sorted values
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+def report(path, out = None):
+    """Prints p50, p99, mean and the share of the total time of every phase in a trace file to out, stdout by default."""
+    if out is None:
+        out = sys.stdout
+    records = list(readTrace(path))
+    print("{:,} requests".format(len(records)), file=out)
+    if not records:
+        return
+    totalSec = sum(entry[phase] for entry in records for phase in PHASES)
+    print("{:<8} {:>10} {:>10} {:>10} {:>7}".format("usec", "p50", "p99", "mean", "share"), file=out)
+    for phase in PHASES:
+        values = sorted(entry[phase] for entry in records)
+        share = 100.0 * sum(values) / totalSec if totalSec else 0.0
+        print("{:<8} {:>10.1f} {:>10.1f} {:>10.1f} {:>6.1f}%".format(phase, _percentile(values, 0.5) * 1e6,
+              _percentile(values, 0.99) * 1e6, sum(values) / len(values) * 1e6, share), file=out)
+
+def main(argv):
+    if len(argv) != 2:
+        print("usage: python -m pubsubsql.profiler trace", file=sys.stderr)
+        return 2
+    report(argv[1])
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
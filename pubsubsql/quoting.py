@@ -0,0 +1,58 @@
+#! /usr/bin/env python
+"""
+Copyright (C) 2014 CompleteDB LLC.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the Apache License Version 2.0 http://www.apache.org/licenses.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+
+"""
+
+import re
+
+try:
+    basestring
+except NameError:
+    # python 3
+    basestring = str
+
+class Quoter:
+    """Turns values into pubsubsql command literals and back.
+
+    Values are strings to the pubsubsql server. A value only needs single quotes
+    when it is empty or has a special character: a comma, white space,
+    a right parenthesis or a single quote, which is doubled within the quotes.
+    """
+
+    def __SPECIAL_PATTERN(self):
+        return re.compile(r"[,\s)']")
+
+    def quote(self, value):
+        """Returns value as a literal; bytes are decoded as UTF-8, None is the empty string and other values use str."""
+        if not isinstance(value, basestring):
+            if isinstance(value, bytes):
+                value = value.decode("utf-8")
+            elif value is None:
+                value = ""
+            else:
+                value = str(value)
+        if value and not self.__special(value):
+            return value
+        return "'" + value.replace("'", "''") + "'"
+
+    def quoteList(self, values):
+        """Returns "(value, ...)" with every value quoted."""
+        return "(" + ", ".join([self.quote(value) for value in values]) + ")"
+
+    def unquote(self, literal):
+        """Returns the value of a literal that may be enclosed in single quotes."""
+        literal = literal.strip()
+        if len(literal) >= 2 and literal.startswith("'") and literal.endswith("'"):
+            return literal[1:-1].replace("''", "'")
+        return literal
+
+    def __init__(self):
+        self.__special = self.__SPECIAL_PATTERN().search
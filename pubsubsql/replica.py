@@ -0,0 +1,205 @@
+#! /usr/bin/env python
+"""
+Copyright (C) 2014 CompleteDB LLC.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the Apache License Version 2.0 http://www.apache.org/licenses.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+
+"""
+
+import threading
+from pubsubsql.multiplexed import MultiplexedClient
+
+class TableReplica:
+    """Local copy of a pubsubsql table kept up to date by a subscription.
+
+    The TableReplica subscribes to every row of the table and applies the
+    published actions to an in-memory store on a background thread, so
+    lookups by id or by an indexed column are answered without a round
+    trip to the pubsubsql server. Rows are returned as dicts of column values.
+    """
+
+    def __WAIT_FOR_PUBSUB_MS(self):
+        return 100
+
+    def __indexRow(self, rowId, row, columns):
+        for column in columns:
+            index = self.__indexes.get(column)
+            if index is None or column not in row:
+                continue
+            index.setdefault(row[column], set()).add(rowId)
+
+    def __unindexRow(self, rowId, row, columns):
+        for column in columns:
+            index = self.__indexes.get(column)
+            if index is None or column not in row:
+                continue
+            ids = index.get(row[column])
+            if ids is not None:
+                ids.discard(rowId)
+                if not ids:
+                    del index[row[column]]
+
+    def __putRow(self, values):
+        rowId = values[self.__keyColumn]
+        row = self.__rows.get(rowId)
+        if row is None:
+            row = {}
+            self.__rows[rowId] = row
+        else:
+            self.__unindexRow(rowId, row, values)
+        row.update(values)
+        self.__indexRow(rowId, row, values)
+
+    def __removeRow(self, rowId):
+        row = self.__rows.pop(rowId, None)
+        if row is not None:
+            self.__unindexRow(rowId, row, row)
+
+    def __apply(self, result):
+        action = result.getAction()
+        columns = result.getColumns()
+        if self.__keyColumn not in columns:
+            return
+        ordinal = columns.index(self.__keyColumn)
+        with self.__lock:
+            for values in result.getRows():
+                if action in ("delete", "remove"):
+                    self.__removeRow(values[ordinal])
+                else:
+                    # add, insert and update; updates only carry the columns that changed
+                    self.__putRow(dict(zip(columns, values)))
+            self.__messages += 1
+            self.__actions[action] = self.__actions.get(action, 0) + 1
+
+    def __applyLoop(self, client):
+        while not self.__stopped:
+            result = client.waitForPubSub(self.__WAIT_FOR_PUBSUB_MS())
+            if result is not None:
+                self.__apply(result)
+            elif not client.isConnected():
+                return
+
+    def isConnected(self):
+        """Returns true while the TableReplica receives changes from the pubsubsql server.
+
+        Once disconnected the TableReplica keeps the rows it has but they are no longer kept up to date.
+        """
+        return self.__client is not None and self.__client.isConnected()
+
+    def connect(self, address):
+        """Connects the TableReplica to the pubsubsql server and loads the table.
+
+        Subscribes to every row of the table and returns once the rows the table
+        had at the time of the subscription are in the TableReplica.
+        The address string has the form host:port.
+        """
+        self.disconnect()
+        with self.__lock:
+            self.__rows.clear()
+            for index in self.__indexes.values():
+                index.clear()
+        client = MultiplexedClient()
+        client.connect(address)
+        try:
+            client.execute("subscribe * from {}".format(self.__tableName))
+            # the response to a later command of the same table follows the rows
+            # published on subscribe, which are then already queued
+            client.execute("select {} from {} where {} = 0".format(self.__keyColumn, self.__tableName, self.__keyColumn))
+            while True:
+                result = client.waitForPubSub(1)
+                if result is None:
+                    break
+                self.__apply(result)
+        except:
+            client.disconnect()
+            raise
+        self.__client = client
+        self.__stopped = False
+        self.__thread = threading.Thread(target=self.__applyLoop, args=(client,))
+        self.__thread.daemon = True
+        self.__thread.start()
+
+    def disconnect(self):
+        """Disconnects the TableReplica from the pubsubsql server."""
+        self.__stopped = True
+        if self.__client is not None:
+            self.__client.disconnect()
+        if self.__thread is not None:
+            self.__thread.join()
+        self.__client = None
+        self.__thread = None
+
+    def get(self, rowId):
+        """Returns the row with the given id or None."""
+        with self.__lock:
+            row = self.__rows.get(rowId)
+            if row is None:
+                return None
+            return dict(row)
+
+    def findBy(self, column, value):
+        """Returns the rows where column has the given value.
+
+        Indexed columns are looked up in their hash index; other columns are scanned.
+        """
+        with self.__lock:
+            index = self.__indexes.get(column)
+            if index is not None:
+                return [dict(self.__rows[rowId]) for rowId in index.get(value, ())]
+            return [dict(row) for row in self.__rows.values() if row.get(column) == value]
+
+    def getIds(self):
+        """Returns the ids of the rows in the TableReplica."""
+        with self.__lock:
+            return list(self.__rows)
+
+    def getRowCount(self):
+        """Returns the number of rows in the TableReplica."""
+        with self.__lock:
+            return len(self.__rows)
+
+    def getTableName(self):
+        return self.__tableName
+
+    def getStats(self):
+        """Returns replication statistics as a dict.
+
+        messages counts the pubsub messages applied; actions counts them by action.
+        """
+        with self.__lock:
+            return {
+                "rows": len(self.__rows),
+                "messages": self.__messages,
+                "actions": dict(self.__actions),
+            }
+
+    def __contains__(self, rowId):
+        with self.__lock:
+            return rowId in self.__rows
+
+    def __len__(self):
+        return self.getRowCount()
+
+    def __init__(self, tableName, indexColumns = (), keyColumn = "id"):
+        """Creates a TableReplica.
+
+        Creates a TableReplica of the table tableName with a hash index for each of indexColumns,
+        typically the key and tag columns of the table. Rows are identified by keyColumn.
+        """
+        self.__tableName = tableName
+        self.__keyColumn = keyColumn
+        self.__indexes = {}
+        for column in indexColumns:
+            self.__indexes[column] = {}
+        self.__rows = {}
+        self.__lock = threading.Lock()
+        self.__client = None
+        self.__thread = None
+        self.__stopped = True
+        self.__messages = 0
+        self.__actions = {}
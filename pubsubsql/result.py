@@ -0,0 +1,153 @@
+#! /usr/bin/env python
+"""
+Copyright (C) 2014 CompleteDB LLC.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the Apache License Version 2.0 http://www.apache.org/licenses.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+
+"""
+
+from pubsubsql.net.response import Response as ResponseData
+
+try:
+    basestring
+except NameError:
+    # python 3
+    basestring = str
+
+class Result:
+    """Result of a single command executed against the pubsubsql server.
+
+    Unlike the Client, which only holds the response of the last command,
+    a Result is detached from the connection and collects every batch
+    of the result set returned for its request id.
+    """
+
+    def __nvl(self, string):
+        if string:
+            return string
+        else:
+            return ""
+
+    def __setColumns(self, columns):
+        self.__columns = columns
+        self.__columnIndex.clear()
+        for index, column in enumerate(columns):
+            self.__columnIndex[column] = index
+
+    def addBatch(self, parsedJson):
+        """Adds a batch of the result set returned by the pubsubsql server.
+
+        Returns true when the last batch of the result set has been added.
+        """
+        response = ResponseData()
+        response.setParsedJson(parsedJson)
+        if not self.__batches:
+            self.__status = response.getStatus()
+            self.__msg = response.getMsg()
+            self.__action = response.getAction()
+            self.__pubsubid = response.getPubsubid()
+            self.__rowCount = response.getRows()
+        self.__batches += 1
+        if response.getStatus() != "ok":
+            self.__status = response.getStatus()
+            self.__msg = response.getMsg()
+            self.__complete = True
+            return True
+        columns = response.getColumns()
+        if columns and columns != self.__columns:
+            self.__setColumns(columns)
+        self.__data.extend(response.getData())
+        # no result set or last batch of the result set
+        self.__complete = (not response.getRows()
+                           or not response.getTorow()
+                           or response.getRows() == response.getTorow())
+        return self.__complete
+
+    def isComplete(self):
+        """Returns true when all batches of the result set have been received."""
+        return self.__complete
+
+    def isOk(self):
+        """Returns true if the pubsubsql server executed the command successfully."""
+        return self.__status == "ok"
+
+    def getError(self):
+        """Returns the error reported by the pubsubsql server or None."""
+        if self.isOk():
+            return None
+        return ValueError(self.__msg)
+
+    def getRequestId(self):
+        """Returns the request id the command was sent with."""
+        return self.__requestId
+
+    def setRequestId(self, requestId):
+        self.__requestId = requestId
+
+    def getMsg(self):
+        """Returns the error message returned by the pubsubsql server."""
+        return self.__nvl(self.__msg)
+
+    def getAction(self):
+        """Returns an action string from the response."""
+        return self.__nvl(self.__action)
+
+    def getPubSubId(self):
+        """Returns a unique identifier generated by the pubsubsql server."""
+        return self.__nvl(self.__pubsubid)
+
+    def setPubSubId(self, pubsubid):
+        self.__pubsubid = pubsubid
+
+    def getRowCount(self):
+        """Returns the number of rows in the result set returned by the pubsubsql server."""
+        return self.__nvl(self.__rowCount)
+
+    def getColumnCount(self):
+        """Returns the number of columns in the columns collection of the result set."""
+        return len(self.__columns)
+
+    def getColumns(self):
+        """Returns the column names in the columns collection of the result set."""
+        return self.__columns
+
+    def hasColumn(self, column):
+        """Determines if the column name exists in the columns collection of the result set."""
+        return column in self.__columnIndex
+
+    def getRows(self):
+        """Returns all rows of the result set as lists of values."""
+        return self.__data
+
+    def getValue(self, row, column):
+        """Returns the value within the given row for the given column name or column ordinal.
+
+        If the row, the column name or the column ordinal does not exist, getValue returns an empty string.
+        """
+        if isinstance(column, basestring):
+            ordinal = self.__columnIndex.get(column, -1)
+        else:
+            ordinal = column
+        if ordinal < 0 or ordinal >= len(self.__columns):
+            return ""
+        if row < 0 or row >= len(self.__data):
+            return ""
+        return self.__data[row][ordinal]
+
+    def __init__(self, requestId = 0):
+        self.__requestId = requestId
+        self.__status = ""
+        self.__msg = ""
+        self.__action = ""
+        self.__pubsubid = ""
+        self.__rowCount = 0
+        self.__columns = []
+        self.__columnIndex = {}
+        self.__data = []
+        self.__batches = 0
+        self.__complete = False
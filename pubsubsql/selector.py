@@ -0,0 +1,85 @@
+#! /usr/bin/env python
+"""
+Copyright (C) 2014 CompleteDB LLC.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the Apache License Version 2.0 http://www.apache.org/licenses.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+
+"""
+
+import collections
+import selectors
+import time
+
+class ClientSelector:
+    """Waits for pubsub messages on many Clients at once (Python 3.4 or later).
+
+    A single thread waits on the connections of all registered Clients with the best
+    mechanism of the platform, such as epoll, instead of one thread or one waitForPubSub
+    timeout per Client. Messages a Client already holds in its backlog, for example
+    the ones received while executing a command, are returned without waiting.
+    The Clients must not be used by other threads while they are registered.
+    """
+
+    def register(self, client):
+        """Registers a connected Client; unregister it before disconnecting it."""
+        fileno = client.fileno()
+        self.__selector.register(fileno, selectors.EVENT_READ, client)
+        self.__clients[client] = fileno
+
+    def unregister(self, client):
+        fileno = self.__clients.pop(client, None)
+        if fileno is not None:
+            self.__selector.unregister(fileno)
+
+    def getClients(self):
+        return list(self.__clients)
+
+    def __poll(self, client, receive):
+        # returns true when the client is ready; a client that failed is unregistered and ready
+        try:
+            return client.pollPubSub(receive) > 0
+        except Exception:
+            self.unregister(client)
+            return True
+
+    def select(self, timeoutMs):
+        """Waits until any of the registered Clients has a pubsub message or until the timeout interval elapses.
+
+        Returns the ready Clients, an empty list when the timeout interval elapses.
+        Every ready Client has moved to its next pubsub message as waitForPubSub does,
+        so getAction, getPubSubId, nextRow and the fetch methods read it. Only frames
+        received completely count; a Client with more messages is returned by the next call too.
+        A Client whose connection failed is unregistered and returned disconnected, see isConnected.
+        """
+        ready = [client for client in list(self.__clients) if self.__poll(client, False)]
+        deadline = time.time() + float(max(timeoutMs, 0)) / 1000
+        while not ready:
+            remainingSec = deadline - time.time()
+            if remainingSec <= 0:
+                return []
+            for key, events in self.__selector.select(remainingSec):
+                if self.__poll(key.data, True):
+                    ready.append(key.data)
+        for client in ready:
+            if client.isConnected():
+                client.waitForPubSub(1)
+        return ready
+
+    def close(self):
+        """Unregisters all Clients."""
+        self.__clients.clear()
+        self.__selector.close()
+        self.__selector = selectors.DefaultSelector()
+
+    def __len__(self):
+        return len(self.__clients)
+
+    def __init__(self):
+        self.__selector = selectors.DefaultSelector()
+        # registration order is kept so that Clients are served in a stable order
+        self.__clients = collections.OrderedDict()
@@ -0,0 +1,378 @@
+#! /usr/bin/env python
+"""
+Copyright (C) 2014 CompleteDB LLC.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the Apache License Version 2.0 http://www.apache.org/licenses.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+
+"""
+
+import bisect
+import collections
+import hashlib
+import re
+import threading
+import time
+from pubsubsql.multiplexed import MultiplexedClient
+from pubsubsql.result import Result
+from pubsubsql.quoting import Quoter
+
+class HashRing:
+    """Consistent hash ring mapping keys to nodes.
+
+    Every node is placed on the ring at virtualNodes points and a key belongs to
+    the first point that follows its hash. Adding or removing one of n nodes
+    only moves about 1/n of the keys.
+    """
+
+    def __hash(self, key):
+        return int(hashlib.md5(key.encode("utf-8")).hexdigest()[:16], 16)
+
+    def add(self, node):
+        if node in self.__nodes:
+            return
+        self.__nodes.append(node)
+        for point in range(self.__virtualNodes):
+            position = self.__hash("{}#{}".format(node, point))
+            index = bisect.bisect(self.__positions, position)
+            self.__positions.insert(index, position)
+            self.__points.insert(index, node)
+
+    def remove(self, node):
+        if node not in self.__nodes:
+            return
+        self.__nodes.remove(node)
+        points = [(position, point) for position, point in zip(self.__positions, self.__points) if point != node]
+        self.__positions = [position for position, point in points]
+        self.__points = [point for position, point in points]
+
+    def get(self, key):
+        """Returns the node the key belongs to; raises ValueError when the ring is empty."""
+        if not self.__points:
+            raise ValueError("No nodes")
+        index = bisect.bisect(self.__positions, self.__hash(key)) % len(self.__points)
+        return self.__points[index]
+
+    def getNodes(self):
+        return list(self.__nodes)
+
+    def __len__(self):
+        return len(self.__nodes)
+
+    def __init__(self, nodes = (), virtualNodes = 64):
+        if virtualNodes < 1:
+            raise ValueError("Invalid virtualNodes", virtualNodes)
+        self.__virtualNodes = virtualNodes
+        self.__nodes = []
+        self.__positions = []
+        self.__points = []
+        for node in nodes:
+            self.add(node)
+
+class ShardedClient:
+    """Client that partitions tables across many pubsubsql servers.
+
+    Every command goes to the shard that owns its table on a consistent hash ring
+    of the server addresses. Tables given a key column are partitioned by the value
+    of that column instead: inserts must set it, and selects, updates, deletes and
+    subscribes that do not compare it with = in their where clause run on every shard
+    with their results merged. Ids are assigned by every shard on its own, so rows of
+    such tables can not be updated or deleted by id. Results are returned as Result
+    objects, see MultiplexedClient.
+    """
+
+    def __NO_WAIT_MS(self):
+        # waitForPubSub does not wait when the message is already there
+        return 0.001
+
+    def __COMMAND_PATTERN(self):
+        return re.compile(r"^\s*(insert\s+into|select\s.*?\sfrom|update|delete\s+from|subscribe\s.*?\sfrom"
+                          r"|unsubscribe\s+from|key|tag)\s+([A-Za-z]\w*)(.*)$", re.S)
+
+    def __WHERE_PATTERN(self):
+        return re.compile(r"\swhere\s+(\w+)\s*=\s*('(?:[^']|'')*'|[^\s,)']+)", re.S)
+
+    def __splitList(self, text):
+        # splits "(a, 'b, c', d) ..." into its values; commas and ) within quotes do not count
+        start = text.find("(")
+        if start < 0:
+            return None, text
+        values = []
+        value = []
+        quoted = False
+        index = start + 1
+        while index < len(text):
+            char = text[index]
+            if quoted:
+                value.append(char)
+                if char == "'":
+                    if text[index + 1:index + 2] == "'":
+                        value.append("'")
+                        index += 1
+                    else:
+                        quoted = False
+            elif char == "'":
+                value.append(char)
+                quoted = True
+            elif char == "," or char == ")":
+                values.append(self.__quoter.unquote("".join(value)))
+                value = []
+                if char == ")":
+                    return values, text[index + 1:]
+            else:
+                value.append(char)
+            index += 1
+        return None, text
+
+    def __parseKey(self, verb, rest, keyColumn):
+        # returns the value of keyColumn set or selected by the command or None
+        if verb == "insert":
+            columns, rest = self.__splitList(rest)
+            values, rest = self.__splitList(rest)
+            if columns is None or values is None or keyColumn not in columns:
+                return None
+            ordinal = columns.index(keyColumn)
+            if ordinal >= len(values):
+                return None
+            return values[ordinal]
+        for column, value in self.__WHERE_PATTERN().findall(rest):
+            if column == keyColumn:
+                return self.__quoter.unquote(value)
+        return None
+
+    def __route(self, command):
+        # returns the addresses of the shards that execute the command
+        match = self.__COMMAND_PATTERN().match(command)
+        if match is None:
+            return self.__ring.getNodes()
+        verb = match.group(1).split()[0]
+        tableName = match.group(2)
+        if verb in ("key", "tag", "unsubscribe"):
+            return self.__ring.getNodes()
+        keyColumn = self.__keyColumns.get(tableName)
+        if keyColumn is None:
+            return [self.__ring.get(tableName)]
+        keyValue = self.__parseKey(verb, match.group(3), keyColumn)
+        if keyValue is not None:
+            return [self.__ring.get(keyValue)]
+        if verb == "insert":
+            raise ValueError("Insert does not set the key column", keyColumn, command)
+        if verb in ("update", "delete") and self.__parseKey(verb, match.group(3), "id") is not None:
+            # the same id stands for unrelated rows on the other shards
+            raise ValueError("Rows of a partitioned table can not be addressed by id", keyColumn, command)
+        return self.__ring.getNodes()
+
+    def __notifyPubSub(self):
+        # called by the reader threads of the shards
+        with self.__pubSubCondition:
+            self.__pubSubSignals += 1
+            self.__pubSubCondition.notify_all()
+
+    def __newClient(self, address):
+        client = MultiplexedClient()
+        client.setPubSubListener(self.__notifyPubSub)
+        client.connect(address)
+        return client
+
+    def __getClient(self, address):
+        client = self.__clients.get(address)
+        if client is None:
+            raise IOError("Not connected")
+        return client
+
+    def __submitUnsubscribe(self, command):
+        # an aggregated pubsubid stands for one subscription on every shard it spans
+        match = re.search(r"\bpubsubid\s*=\s*(\w+)", command)
+        if match is None or match.group(1) not in self.__subscriptions:
+            return None, None
+        addresses = []
+        requests = []
+        for address, pubsubId in self.__subscriptions.pop(match.group(1)):
+            self.__pubsubIds.pop((address, pubsubId), None)
+            shardCommand = command[:match.start(1)] + pubsubId + command[match.end(1):]
+            addresses.append(address)
+            requests.append(self.__getClient(address).submit(shardCommand))
+        return addresses, requests
+
+    def __subscribed(self, addresses, results):
+        self.__subscriptionCount += 1
+        aggregateId = str(self.__subscriptionCount)
+        shardIds = []
+        for address, result in zip(addresses, results):
+            self.__pubsubIds[(address, result.getPubSubId())] = aggregateId
+            shardIds.append((address, result.getPubSubId()))
+        self.__subscriptions[aggregateId] = shardIds
+        return aggregateId
+
+    def __scatter(self, command):
+        addresses, requests = None, None
+        if command.lstrip().startswith("unsubscribe"):
+            addresses, requests = self.__submitUnsubscribe(command)
+        if requests is None:
+            addresses = self.__route(command)
+            requests = [self.__getClient(address).submit(command) for address in addresses]
+        results = [self.__getClient(address).collect(requestId) for address, requestId in zip(addresses, requests)]
+        for result in results:
+            if not result.isOk():
+                raise ValueError(result.getMsg())
+        return addresses, results
+
+    def __mergeColumns(self, results):
+        columns = []
+        for result in results:
+            for column in result.getColumns():
+                if column not in columns:
+                    columns.append(column)
+        return columns
+
+    def __alignRows(self, result, columns):
+        # shards may know the columns of a table in a different order or not at all
+        if result.getColumns() == columns:
+            return result.getRows()
+        ordinals = [result.getColumns().index(column) if result.hasColumn(column) else -1 for column in columns]
+        return [[row[ordinal] if ordinal >= 0 else "" for ordinal in ordinals] for row in result.getRows()]
+
+    def isConnected(self):
+        """Returns true if the ShardedClient is connected to every shard."""
+        return bool(self.__clients) and all(client.isConnected() for client in self.__clients.values())
+
+    def connect(self):
+        """Connects the ShardedClient to every shard."""
+        self.disconnect()
+        try:
+            for address in self.__ring.getNodes():
+                self.__clients[address] = self.__newClient(address)
+        except:
+            self.disconnect()
+            raise
+
+    def disconnect(self):
+        """Disconnects the ShardedClient from every shard."""
+        for client in self.__clients.values():
+            client.disconnect()
+        self.__clients.clear()
+        self.__pubsubIds.clear()
+        self.__subscriptions.clear()
+
+    def addShard(self, address):
+        """Adds a pubsubsql server to the ring and connects to it when the ShardedClient is connected.
+
+        About 1/n of the keys move to the new shard; moving their rows is up to the application.
+        """
+        if self.__clients and address not in self.__clients:
+            self.__clients[address] = self.__newClient(address)
+        self.__ring.add(address)
+
+    def removeShard(self, address):
+        """Removes a pubsubsql server from the ring and disconnects from it."""
+        self.__ring.remove(address)
+        client = self.__clients.pop(address, None)
+        if client is not None:
+            client.disconnect()
+
+    def getShard(self, tableName, keyValue = None):
+        """Returns the address of the shard that owns the table, or the key value of a table with a key column."""
+        if keyValue is not None and tableName in self.__keyColumns:
+            return self.__ring.get(str(keyValue))
+        return self.__ring.get(tableName)
+
+    def getShards(self):
+        """Returns the addresses of the shards."""
+        return self.__ring.getNodes()
+
+    def execute(self, command):
+        """Executes a command against the shards that own its rows and returns the merged Result.
+
+        Raises ValueError when a shard rejects the command. A subscription that spans
+        many shards gets a pubsubid of its own, which its pubsub messages carry
+        and which unsubscribe accepts in its where clause.
+        """
+        addresses, results = self.__scatter(command)
+        if results[0].getAction() == "subscribe":
+            aggregateId = self.__subscribed(addresses, results)
+        else:
+            aggregateId = results[0].getPubSubId()
+        if len(results) == 1:
+            results[0].setPubSubId(aggregateId)
+            return results[0]
+        columns = self.__mergeColumns(results)
+        data = []
+        for result in results:
+            data.extend(self.__alignRows(result, columns))
+        merged = Result()
+        merged.addBatch({"status": "ok", "action": results[0].getAction(), "pubsubid": aggregateId,
+                         "rows": len(data), "fromrow": min(len(data), 1), "torow": len(data),
+                         "columns": columns, "data": data})
+        return merged
+
+    def iterRows(self, command, named = False):
+        """Executes a command against the shards and iterates over the rows of all of their result sets.
+
+        Yields tuples, or namedtuples when named is true, with values in the order of the merged columns.
+        """
+        addresses, results = self.__scatter(command)
+        columns = self.__mergeColumns(results)
+        rowType = tuple
+        if named:
+            rowType = collections.namedtuple("Row", columns, rename=True)._make
+        for result in results:
+            for row in self.__alignRows(result, columns):
+                yield rowType(row)
+
+    def stream(self, command):
+        """Sends a command to the shards that own its rows without waiting for the responses."""
+        for address in self.__route(command):
+            self.__getClient(address).stream(command)
+
+    def waitForPubSub(self, timeoutMs):
+        """Waits until any shard publishes a message.
+
+        Returns the message as a Result or None when the timeout interval elapses.
+        Sleeps until a shard receives a message instead of polling the shards.
+        """
+        if timeoutMs <= 0:
+            return None
+        deadline = time.time() + float(timeoutMs) / 1000
+        while True:
+            with self.__pubSubCondition:
+                signals = self.__pubSubSignals
+            clients = list(self.__clients.items())
+            for offset in range(len(clients)):
+                address, client = clients[(self.__nextShard + offset) % len(clients)]
+                result = client.waitForPubSub(self.__NO_WAIT_MS())
+                if result is not None:
+                    # the next call starts with the following shard so that no shard starves the others
+                    self.__nextShard = (self.__nextShard + offset + 1) % len(clients)
+                    aggregateId = self.__pubsubIds.get((address, result.getPubSubId()))
+                    if aggregateId is not None:
+                        result.setPubSubId(aggregateId)
+                    return result
+            waitSec = deadline - time.time()
+            if not clients or waitSec <= 0:
+                return None
+            # a message that arrived while the shards were checked has changed the signal count
+            with self.__pubSubCondition:
+                if self.__pubSubSignals == signals:
+                    self.__pubSubCondition.wait(waitSec)
+
+    def __init__(self, addresses, keyColumns = None, virtualNodes = 64):
+        """Creates a ShardedClient.
+
+        Creates a ShardedClient for the pubsubsql servers at addresses, each of the form host:port.
+        keyColumns maps table names to the column their rows are partitioned by;
+        other tables are placed on a shard as a whole.
+        """
+        self.__ring = HashRing(addresses, virtualNodes)
+        self.__keyColumns = dict(keyColumns or {})
+        self.__quoter = Quoter()
+        self.__clients = collections.OrderedDict()
+        self.__pubsubIds = {}
+        self.__subscriptions = {}
+        self.__subscriptionCount = 0
+        self.__nextShard = 0
+        self.__pubSubCondition = threading.Condition()
+        self.__pubSubSignals = 0
@@ -0,0 +1,143 @@
+#! /usr/bin/env python
+"""
+Copyright (C) 2014 CompleteDB LLC.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the Apache License Version 2.0 http://www.apache.org/licenses.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+
+"""
+
+import collections
+import mmap
+import os
+import struct
+import tempfile
+
+class Segment:
+    """Append-only memory-mapped file of length prefixed messages."""
+
+    def __LENGTH(self):
+        return struct.Struct("!I")
+
+    def fits(self, sizeB):
+        return self.__writeOffset + self.__LENGTH().size + sizeB <= self.__capacityB
+
+    def append(self, messageBytes):
+        if bytes is str and isinstance(messageBytes, bytearray):
+            # python 2 mmap only takes str
+            messageBytes = bytes(messageBytes)
+        length = self.__LENGTH()
+        dataOffset = self.__writeOffset + length.size
+        endOffset = dataOffset + len(messageBytes)
+        self.__map[self.__writeOffset:dataOffset] = length.pack(len(messageBytes))
+        self.__map[dataOffset:endOffset] = messageBytes
+        # a message only counts once it is written whole
+        self.__writeOffset = endOffset
+
+    def popleft(self):
+        length = self.__LENGTH()
+        sizeB = length.unpack_from(self.__map, self.__readOffset)[0]
+        self.__readOffset += length.size
+        messageBytes = self.__map[self.__readOffset:self.__readOffset + sizeB]
+        self.__readOffset += sizeB
+        return messageBytes
+
+    def isConsumed(self):
+        return self.__readOffset == self.__writeOffset
+
+    def close(self):
+        """Unmaps and deletes the segment file."""
+        self.__map.close()
+        os.close(self.__fd)
+        try:
+            os.remove(self.__path)
+        except OSError:
+            pass
+
+    def __init__(self, directory, capacityB):
+        self.__fd, self.__path = tempfile.mkstemp(prefix="pubsubsql-", suffix=".spill", dir=directory)
+        try:
+            os.ftruncate(self.__fd, capacityB)
+            self.__map = mmap.mmap(self.__fd, capacityB)
+        except:
+            os.close(self.__fd)
+            os.remove(self.__path)
+            raise
+        self.__capacityB = capacityB
+        self.__writeOffset = 0
+        self.__readOffset = 0
+
+class SpillQueue:
+    """FIFO queue of raw messages kept in memory-mapped segment files instead of memory.
+
+    Messages are appended to the newest segment and read back in order from the oldest one.
+    A segment file is deleted as soon as all of its messages are read, so the disk space
+    follows the number of queued messages. Used by Backlog for its "spill" policy.
+    """
+
+    def append(self, messageBytes):
+        sizeB = len(messageBytes)
+        if not self.__segments or not self.__segments[-1].fits(sizeB):
+            # a message larger than segmentB gets a segment of its own; 4 bytes hold its length
+            self.__segments.append(Segment(self.__directory, max(self.__segmentB, sizeB + 4)))
+            self.__segmentCount += 1
+        self.__segments[-1].append(messageBytes)
+        self.__count += 1
+        self.__queuedB += sizeB
+        self.__spilled += 1
+
+    def popleft(self):
+        """Removes and returns the oldest message; raises IndexError when empty."""
+        if not self.__count:
+            raise IndexError("pop from an empty SpillQueue")
+        segment = self.__segments[0]
+        messageBytes = segment.popleft()
+        self.__count -= 1
+        self.__queuedB -= len(messageBytes)
+        if segment.isConsumed():
+            # the newest segment is reclaimed too so an idle queue holds no files
+            self.__segments.popleft().close()
+        return messageBytes
+
+    def clear(self):
+        while self.__segments:
+            self.__segments.popleft().close()
+        self.__count = 0
+        self.__queuedB = 0
+
+    def getSizeB(self):
+        """Returns the size of the queued messages in bytes."""
+        return self.__queuedB
+
+    def getStats(self):
+        """Returns spill statistics as a dict.
+
+        messages, bytes and segments measure the queue right now;
+        spilled and segmentsCreated count the messages and segment files written so far.
+        """
+        return {
+            "messages": self.__count,
+            "bytes": self.__queuedB,
+            "segments": len(self.__segments),
+            "spilled": self.__spilled,
+            "segmentsCreated": self.__segmentCount,
+        }
+
+    def __len__(self):
+        return self.__count
+
+    def __init__(self, directory = None, segmentB = 16 * 1024 * 1024):
+        """Creates a SpillQueue writing segments of segmentB bytes to directory, the temporary directory by default."""
+        if segmentB <= 0:
+            raise ValueError("Invalid segmentB", segmentB)
+        self.__directory = directory
+        self.__segmentB = segmentB
+        self.__segments = collections.deque()
+        self.__count = 0
+        self.__queuedB = 0
+        self.__spilled = 0
+        self.__segmentCount = 0
@@ -0,0 +1,128 @@
+#! /usr/bin/env python
+"""
+Copyright (C) 2014 CompleteDB LLC.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the Apache License Version 2.0 http://www.apache.org/licenses.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+
+"""
+
+import unittest
+import asyncio
+import struct
+import time
+from pubsubsql.aio import AsyncClient
+
+class TestAsyncClient(unittest.TestCase):
+    """MAKE SURE TO RUN PUBSUBSQL SERVER!"""
+
+    def __ADDRESS(self):
+        return "localhost:7777"
+
+    def __ROWS(self):
+        return 3
+
+    def __generateTableName(self):
+        return "T" + str(int(round(time.time() * 1000)))
+
+    def __run(self, coroutine):
+        loop = asyncio.new_event_loop()
+        try:
+            return loop.run_until_complete(coroutine)
+        finally:
+            loop.close()
+
+    def setUp(self):
+        pass
+
+    def tearDown(self):
+        pass
+
+    def testConnectDisconnect(self):
+        async def test():
+            client = AsyncClient()
+            await client.connect(self.__ADDRESS())
+            self.assertTrue(client.isConnected())
+            await client.disconnect()
+            self.assertFalse(client.isConnected())
+            with self.assertRaises(Exception):
+                await client.connect("addresswithnoport")
+            self.assertFalse(client.isConnected())
+        self.__run(test())
+
+    def testExecuteStatus(self):
+        async def test():
+            client = AsyncClient()
+            await client.connect(self.__ADDRESS())
+            result = await client.execute("status")
+            self.assertEqual("status", result.getAction())
+            with self.assertRaises(ValueError):
+                await client.execute("blablabla")
+            await client.disconnect()
+        self.__run(test())
+
+    def testExecuteConcurrently(self):
+        async def test():
+            client = AsyncClient()
+            await client.connect(self.__ADDRESS())
+            tableName = self.__generateTableName()
+            commands = []
+            for row in range(self.__ROWS()):
+                commands.append(client.execute("insert into {} (col1) values ({}:col1) returning *".format(tableName, row)))
+            results = await asyncio.gather(*commands)
+            for row, result in enumerate(results):
+                self.assertEqual("insert", result.getAction())
+                self.assertEqual("{}:col1".format(row), result.getValue(0, "col1"))
+            result = await client.execute("select * from {}".format(tableName))
+            self.assertEqual(self.__ROWS(), len(result.getRows()))
+            await client.disconnect()
+        self.__run(test())
+
+    def testPubSub(self):
+        async def test():
+            client = AsyncClient()
+            await client.connect(self.__ADDRESS())
+            tableName = self.__generateTableName()
+            result = await client.execute("subscribe * from {}".format(tableName))
+            pubsubId = result.getPubSubId()
+            self.assertEqual(None, await client.waitForPubSub(10))
+            for row in range(self.__ROWS()):
+                await client.execute("insert into {} (col1) values ({}:col1)".format(tableName, row))
+            readRows = 0
+            async for message in client:
+                self.assertEqual("insert", message.getAction())
+                self.assertEqual(pubsubId, message.getPubSubId())
+                readRows += len(message.getRows())
+                if readRows == self.__ROWS():
+                    await client.disconnect()
+            self.assertEqual(self.__ROWS(), readRows)
+        self.__run(test())
+
+    def testInvalidResponse(self):
+        async def respond(reader, writer):
+            # answers the first command with a message that is not JSON
+            sizeB, requestId = struct.unpack(">II", await reader.readexactly(8))
+            await reader.readexactly(sizeB)
+            writer.write(struct.pack(">II", 3, requestId) + b"{x}")
+            await writer.drain()
+            writer.close()
+        async def test():
+            server = await asyncio.start_server(respond, "127.0.0.1", 0)
+            client = AsyncClient()
+            await client.connect("127.0.0.1:{}".format(server.sockets[0].getsockname()[1]))
+            # the decoding error is raised instead of a lost connection
+            with self.assertRaises(ValueError) as context:
+                await client.execute("status")
+            self.assertFalse(isinstance(context.exception, IOError))
+            self.assertFalse(client.isConnected())
+            await client.disconnect()
+            server.close()
+            await server.wait_closed()
+        self.__run(test())
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,183 @@
+#! /usr/bin/env python
+"""
+Copyright (C) 2014 CompleteDB LLC.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the Apache License Version 2.0 http://www.apache.org/licenses.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+
+"""
+
+import unittest
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from pubsubsql.backlog import Backlog
+from pubsubsql.spill import Segment
+
+class TestBacklog(unittest.TestCase):
+
+    def __message(self, action, rowId, value):
+        message = {"status": "ok", "action": action, "pubsubid": "1", "rows": 1,
+                   "fromrow": 1, "torow": 1, "columns": ["id", "col1"], "data": [[rowId, value]]}
+        return json.dumps(message).encode("utf-8")
+
+    def __values(self, backlog):
+        values = []
+        while len(backlog):
+            values.append(json.loads(backlog.popleft().decode("utf-8"))["data"][0][1])
+        return values
+
+    def testUnbounded(self):
+        backlog = Backlog()
+        for i in range(100):
+            self.assertTrue(backlog.append(self.__message("insert", str(i), str(i))))
+        stats = backlog.getStats()
+        self.assertEqual(100, stats["messages"])
+        self.assertEqual(backlog.getSizeB(), stats["bytes"])
+        self.assertEqual(0, stats["dropped"])
+        self.assertEqual([str(i) for i in range(100)], self.__values(backlog))
+        self.assertEqual(0, backlog.getSizeB())
+
+    def testDropOldest(self):
+        backlog = Backlog(3, 0, "dropOldest")
+        for i in range(5):
+            self.assertTrue(backlog.append(self.__message("insert", str(i), str(i))))
+        self.assertEqual(2, backlog.getStats()["dropped"])
+        self.assertEqual(["2", "3", "4"], self.__values(backlog))
+
+    def testDropNewest(self):
+        backlog = Backlog(3, 0, "dropNewest")
+        for i in range(5):
+            backlog.append(self.__message("insert", str(i), str(i)))
+        self.assertFalse(backlog.append(self.__message("insert", "5", "5")))
+        self.assertEqual(["0", "1", "2"], self.__values(backlog))
+
+    def testMaxBytes(self):
+        messageSizeB = len(self.__message("insert", "0", "0"))
+        backlog = Backlog(0, 2 * messageSizeB, "dropOldest")
+        for i in range(5):
+            backlog.append(self.__message("insert", str(i), str(i)))
+        self.assertEqual(2 * messageSizeB, backlog.getSizeB())
+        self.assertEqual(2 * messageSizeB, backlog.getStats()["peakBytes"])
+        self.assertEqual(["3", "4"], self.__values(backlog))
+
+    def testConflate(self):
+        backlog = Backlog(2, 0, "conflate")
+        backlog.append(self.__message("update", "1", "a"))
+        backlog.append(self.__message("update", "2", "b"))
+        backlog.append(self.__message("update", "1", "c"))
+        backlog.append(self.__message("update", "2", "d"))
+        self.assertEqual(2, len(backlog))
+        self.assertEqual(0, backlog.getStats()["dropped"])
+        # actions that can not be merged still bound the backlog
+        backlog.append(self.__message("delete", "1", "c"))
+        self.assertEqual(2, len(backlog))
+        self.assertEqual(["d", "c"], self.__values(backlog))
+
+    def testAppendLeftKeepsOrder(self):
+        backlog = Backlog(2, 0, "conflate")
+        for value in ["a", "b", "c"]:
+            backlog.append(self.__message("update", "1", value))
+        backlog.append(self.__message("insert", "2", "d"))
+        backlog.appendleft(self.__message("insert", "3", "e"))
+        self.assertEqual(["e", "c", "d"], self.__values(backlog))
+
+    def testBlock(self):
+        backlog = Backlog(1, 0, "block")
+        backlog.append(self.__message("insert", "0", "0"))
+        producer = threading.Thread(target=backlog.append, args=(self.__message("insert", "1", "1"),))
+        producer.start()
+        while not backlog.getStats()["blocked"]:
+            time.sleep(0.001)
+        self.assertEqual("0", json.loads(backlog.get(1.0).decode("utf-8"))["data"][0][1])
+        producer.join()
+        self.assertEqual(1, backlog.getStats()["blocked"])
+        self.assertEqual(["1"], self.__values(backlog))
+
+    def testClose(self):
+        backlog = Backlog(1, 0, "block")
+        self.assertEqual(None, backlog.get(0.01))
+        backlog.append(self.__message("insert", "0", "0"))
+        backlog.close()
+        self.assertFalse(backlog.append(self.__message("insert", "1", "1")))
+        self.assertNotEqual(None, backlog.get(0.01))
+        self.assertEqual(None, backlog.get())
+
+    def testSpill(self):
+        spillDir = tempfile.mkdtemp()
+        try:
+            messageSizeB = len(self.__message("insert", "0", "0"))
+            backlog = Backlog(2, 0, "spill", spillDir=spillDir, segmentB=3 * messageSizeB)
+            for i in range(10):
+                self.assertTrue(backlog.append(self.__message("insert", str(i), str(i))))
+            stats = backlog.getStats()
+            self.assertEqual(10, stats["messages"])
+            self.assertEqual(8, stats["spillMessages"])
+            self.assertEqual(2 * messageSizeB, stats["bytes"])
+            self.assertEqual(0, stats["dropped"])
+            self.assertTrue(stats["spillSegments"] > 1)
+            self.assertEqual(stats["spillSegments"], len(os.listdir(spillDir)))
+            # messages received after spilling wait behind the spilled ones
+            self.assertEqual("0", json.loads(backlog.popleft().decode("utf-8"))["data"][0][1])
+            backlog.append(self.__message("insert", "10", "10"))
+            self.assertEqual([str(i) for i in range(1, 11)], self.__values(backlog))
+            self.assertEqual([], os.listdir(spillDir))
+            self.assertEqual(9, backlog.getStats()["spilled"])
+        finally:
+            shutil.rmtree(spillDir)
+
+    def testSpillClear(self):
+        spillDir = tempfile.mkdtemp()
+        try:
+            backlog = Backlog(1, 0, "spill", spillDir=spillDir)
+            for i in range(3):
+                backlog.append(self.__message("insert", str(i), str(i)))
+            self.assertEqual(1, len(os.listdir(spillDir)))
+            backlog.clear()
+            self.assertEqual(0, len(backlog))
+            self.assertEqual([], os.listdir(spillDir))
+        finally:
+            shutil.rmtree(spillDir)
+
+    def testSpillBytearray(self):
+        spillDir = tempfile.mkdtemp()
+        try:
+            # frames larger than the read buffer are received as bytearray
+            messages = [bytearray(self.__message("insert", str(i), "x" * 100 * 1024)) for i in range(3)]
+            backlog = Backlog(1, 0, "spill", spillDir=spillDir)
+            for messageBytes in messages:
+                self.assertTrue(backlog.append(messageBytes))
+            self.assertEqual([bytes(messageBytes) for messageBytes in messages],
+                             [bytes(backlog.popleft()) for messageBytes in messages])
+        finally:
+            shutil.rmtree(spillDir)
+
+    def testSegmentFailedAppend(self):
+        spillDir = tempfile.mkdtemp()
+        try:
+            segment = Segment(spillDir, 1024)
+            with self.assertRaises((TypeError, IndexError)):
+                segment.append([1, 2, 3])
+            # the failed message leaves nothing behind
+            self.assertTrue(segment.isConsumed())
+            segment.append(b"ok")
+            self.assertEqual(b"ok", segment.popleft())
+            segment.close()
+        finally:
+            shutil.rmtree(spillDir)
+
+    def testInvalidLimits(self):
+        with self.assertRaises(ValueError):
+            Backlog(0, 0, "unknown")
+        with self.assertRaises(ValueError):
+            Backlog(-1)
+
+if __name__ == "__main__":
+    unittest.main()
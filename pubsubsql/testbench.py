@@ -0,0 +1,55 @@
+#! /usr/bin/env python
+"""
+Copyright (C) 2014 CompleteDB LLC.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the Apache License Version 2.0 http://www.apache.org/licenses.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+
+"""
+
+import unittest
+from pubsubsql.bench import run, summarize
+
+try:
+    from pubsubsql.emulator import Emulator
+except (ImportError, SyntaxError):
+    # the emulator is written with asyncio and async def, Python 3.5 or later
+    Emulator = None
+
+class TestBench(unittest.TestCase):
+
+    def testSummarize(self):
+        self.assertEqual({"count": 0}, summarize([]))
+        summary = summarize([0.001 * value for value in range(1000, 0, -1)])
+        self.assertEqual(1000, summary["count"])
+        self.assertAlmostEqual(1000.0, summary["min"])
+        self.assertAlmostEqual(501000.0, summary["p50"])
+        self.assertAlmostEqual(1000000.0, summary["p999"])
+        self.assertAlmostEqual(1000000.0, summary["max"])
+        self.assertAlmostEqual(500500.0, summary["mean"])
+
+    @unittest.skipIf(Emulator is None, "requires the emulator, Python 3.5 or later")
+    def testRun(self):
+        emulator = Emulator()
+        address = emulator.startThread()
+        try:
+            report = run(address, publishers=2, subscribers=2, ratePerSec=100, durationSec=0.3,
+                         rows=3, filters=["Publisher = '1'", None], drainSec=0.3)
+        finally:
+            emulator.stopThread()
+        self.assertTrue(report["updates"] > 0)
+        self.assertEqual([None, None], [result["error"] for result in report["publishers"]])
+        self.assertEqual([None, None], [result["error"] for result in report["subscribers"]])
+        published = dict((result["publisher"], result["updates"]) for result in report["publishers"])
+        # the filtered subscriber only receives the updates of its publisher
+        self.assertEqual(published[1], report["subscribers"][0]["latencyUsec"]["count"])
+        self.assertEqual(report["updates"], report["subscribers"][1]["latencyUsec"]["count"])
+        self.assertEqual(report["updates"] + published[1], report["rowsReceived"])
+        self.assertTrue(report["latencyUsec"]["p50"] > 0)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,152 @@
+#! /usr/bin/env python
+"""
+Copyright (C) 2014 CompleteDB LLC.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the Apache License Version 2.0 http://www.apache.org/licenses.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+
+"""
+
+import unittest
+import os
+import tempfile
+import time
+from pubsubsql import Client, SelectCache
+from pubsubsql.profiler import Profiler, readTrace
+
+class TestSelectCache(unittest.TestCase):
+    """MAKE SURE TO RUN PUBSUBSQL SERVER!"""
+
+    tableCount = 0
+
+    def __ADDRESS(self):
+        return "localhost:7777"
+
+    def __generateTableName(self):
+        TestSelectCache.tableCount += 1
+        return "T" + str(int(round(time.time() * 1000))) + "c" + str(TestSelectCache.tableCount)
+
+    def __waitFor(self, condition):
+        deadline = time.time() + 1.0
+        while not condition() and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertTrue(condition())
+
+    def setUp(self):
+        self.cache = SelectCache(2)
+        self.cache.connect(self.__ADDRESS())
+        self.client = Client()
+        self.client.connect(self.__ADDRESS())
+        self.client.setSelectCache(self.cache)
+
+    def tearDown(self):
+        self.client.disconnect()
+        self.cache.disconnect()
+
+    def testProfilerSkipsHits(self):
+        tableName = self.__generateTableName()
+        self.client.execute("insert into {} (ticker, price) values (IBM, 1)".format(tableName))
+        traceFile, path = tempfile.mkstemp(suffix=".trace")
+        os.close(traceFile)
+        profiler = Profiler(path)
+        self.client.setProfiler(profiler)
+        command = "select * from {}".format(tableName)
+        self.client.execute(command)
+        self.client.fetchAll()
+        # answered by the cache without a request
+        self.client.execute(command)
+        self.client.execute("status")
+        self.client.setProfiler(None)
+        profiler.close()
+        requestIds = [record["requestId"] for record in readTrace(path)]
+        os.remove(path)
+        self.assertEqual(2, len(requestIds))
+        self.assertEqual(requestIds[0] + 1, requestIds[1])
+        self.assertEqual(1, self.cache.getStats()["hits"])
+
+    def testHitAndMiss(self):
+        tableName = self.__generateTableName()
+        self.client.execute("insert into {} (ticker, price) values (IBM, 1)".format(tableName))
+        command = "select * from {} where ticker = IBM".format(tableName)
+        self.client.execute(command)
+        self.client.execute(command)
+        self.assertEqual(1, self.client.getRowCount())
+        self.assertTrue(self.client.nextRow())
+        self.assertEqual("1", self.client.getValue("price"))
+        stats = self.cache.getStats()
+        self.assertEqual(1, stats["hits"])
+        self.assertEqual(1, stats["misses"])
+        self.assertEqual(1, stats["entries"])
+        # commands the pubsubsql server rejects are not cached
+        with self.assertRaises(ValueError):
+            self.client.execute("select * from")
+
+    def testInvalidateOnOwnWrite(self):
+        tableName = self.__generateTableName()
+        self.client.execute("insert into {} (ticker, price) values (IBM, 1)".format(tableName))
+        command = "select * from {}".format(tableName)
+        self.client.execute(command)
+        self.client.execute("update {} set price = 2".format(tableName))
+        self.client.execute(command)
+        self.assertTrue(self.client.nextRow())
+        self.assertEqual("2", self.client.getValue("price"))
+        self.assertEqual(0, self.cache.getStats()["hits"])
+
+    def testInvalidateOnStreamedInserts(self):
+        tableName = self.__generateTableName()
+        self.client.execute("insert into {} (ticker, price) values (IBM, 1)".format(tableName))
+        command = "select * from {}".format(tableName)
+        self.client.execute(command)
+        invalidated = []
+        invalidate = self.cache.invalidate
+        def record(command = None):
+            invalidated.append(command)
+            invalidate(command)
+        # the pubsub messages of the inserts invalidate the cache too, but only once they arrive
+        self.cache.invalidate = record
+        self.client.insertMany(tableName, ["ticker", "price"], [["MSFT", 2], ["ORCL", 3]], returnIds=False)
+        self.assertTrue(any(command.startswith("insert into {} ".format(tableName)) for command in invalidated))
+        self.client.execute(command)
+        self.assertEqual(3, self.client.getRowCount())
+        self.assertEqual(0, self.cache.getStats()["hits"])
+
+    def testInvalidateOnPubSub(self):
+        tableName = self.__generateTableName()
+        self.client.execute("insert into {} (ticker, price) values (IBM, 1)".format(tableName))
+        command = "select * from {}".format(tableName)
+        self.client.execute(command)
+        other = Client()
+        other.connect(self.__ADDRESS())
+        other.execute("update {} set price = 3".format(tableName))
+        other.disconnect()
+        self.__waitFor(lambda: self.cache.getStats()["entries"] == 0)
+        self.client.execute(command)
+        self.assertTrue(self.client.nextRow())
+        self.assertEqual("3", self.client.getValue("price"))
+        self.assertEqual(1, self.cache.getStats()["invalidations"])
+
+    def testEviction(self):
+        tableName = self.__generateTableName()
+        self.client.execute("insert into {} (ticker, price) values (IBM, 1)".format(tableName))
+        for ticker in ["IBM", "MSFT", "ORCL", "IBM"]:
+            self.client.execute("select * from {} where ticker = {}".format(tableName, ticker))
+        stats = self.cache.getStats()
+        self.assertEqual(2, stats["entries"])
+        self.assertEqual(2, stats["evictions"])
+        self.assertEqual(0, stats["hits"])
+
+    def testDisconnectEmptiesCache(self):
+        tableName = self.__generateTableName()
+        command = "select * from {}".format(tableName)
+        self.client.execute(command)
+        self.cache.disconnect()
+        self.assertEqual(0, self.cache.getStats()["entries"])
+        self.client.execute(command)
+        self.assertEqual(0, self.cache.getStats()["hits"])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -13,11 +13,25 @@ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
 
 import unittest
 import time
-from pubsubsql import Client
+import json
+import os
+import socket
+import struct
+import tempfile
+import threading
+from pubsubsql import Client, Metrics
+from pubsubsql.profiler import Profiler, readTrace, PHASES
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 class TestClient(unittest.TestCase):
     """MAKE SURE TO RUN PUBSUBSQL SERVER!"""
 
+    tableCount = 0
+
     def __ADDRESS(self):
         return "localhost:7777"
 
@@ -29,7 +43,9 @@ class TestClient(unittest.TestCase):
         return 4
 
     def __generateTableName(self):
-        return "T" + str(int(round(time.time() * 1000)))
+        # tests running within the same millisecond get different tables
+        TestClient.tableCount += 1
+        return "T" + str(int(round(time.time() * 1000))) + "x" + str(TestClient.tableCount)
 
     def __insertRow(self, tableName):
         client = Client()
@@ -86,6 +102,14 @@ class TestClient(unittest.TestCase):
         self.assertFalse(client.isConnected())
         client.disconnect()
 
+    def testIsAlive(self):
+        client = Client()
+        self.assertFalse(client.isAlive())
+        client.connect(self.__ADDRESS())
+        self.assertTrue(client.isAlive())
+        client.disconnect()
+        self.assertFalse(client.isAlive())
+
     def testExecuteStatus(self):
         client = Client()
         client.connect(self.__ADDRESS())
@@ -94,6 +118,15 @@ class TestClient(unittest.TestCase):
         self.assertEqual("status", client.getAction())
         client.disconnect()
 
+    def testGetJSON(self):
+        client = Client()
+        client.connect(self.__ADDRESS())
+        #
+        client.execute("status")
+        self.assertEqual("status", json.loads(client.getJSON())["action"])
+        client.disconnect()
+        self.assertEqual("", client.getJSON())
+
     def testExecuteInvalidCommand(self):
         client = Client()
         client.connect(self.__ADDRESS())
@@ -197,6 +230,154 @@ class TestClient(unittest.TestCase):
         self.assertFalse(client.nextRow())
         client.disconnect()
 
+    def testFetchOne(self):
+        tableName = self.__generateTableName()
+        self.__insertRows(tableName)
+        #
+        client = Client()
+        client.connect(self.__ADDRESS())
+        client.execute("select id, col1 from {}".format(tableName))
+        self.assertTrue(client.nextRow())
+        self.assertEqual("0:col1", client.getValue("col1"))
+        # fetchOne continues where nextRow left off
+        row = client.fetchOne()
+        self.assertEqual(2, len(row))
+        self.assertEqual("1:col1", row[1])
+        self.assertTrue(client.nextRow())
+        self.assertEqual("2:col1", client.getValue("col1"))
+        self.assertEqual(None, client.fetchOne())
+        self.assertFalse(client.nextRow())
+        client.disconnect()
+
+    def testFetchManyAll(self):
+        tableName = self.__generateTableName()
+        self.__insertRows(tableName)
+        #
+        client = Client()
+        client.connect(self.__ADDRESS())
+        client.execute("select col1, col2, col3 from {}".format(tableName))
+        rows = client.fetchMany(2)
+        self.assertEqual([("0:col1", "0:col2", "0:col3"), ("1:col1", "1:col2", "1:col3")], rows)
+        rows = client.fetchAll()
+        self.assertEqual([("2:col1", "2:col2", "2:col3")], rows)
+        self.assertEqual([], client.fetchMany(2))
+        self.assertEqual([], client.fetchAll())
+        client.disconnect()
+
+    def testIterRows(self):
+        tableName = self.__generateTableName()
+        self.__insertRows(tableName)
+        #
+        client = Client()
+        client.connect(self.__ADDRESS())
+        client.execute("select * from {}".format(tableName))
+        rows = list(client.iterRows())
+        self.assertEqual(self.__ROWS(), len(rows))
+        for row in rows:
+            self.assertEqual(self.__COLUMNS(), len(row))
+        client.execute("select col1, col2 from {}".format(tableName))
+        for index, row in enumerate(client.iterRows(True)):
+            self.assertEqual("{}:col1".format(index), row.col1)
+            self.assertEqual("{}:col2".format(index), row[1])
+        client.disconnect()
+
+    @unittest.skipIf(numpy is None, "requires numpy")
+    def testFetchArrays(self):
+        tableName = self.__generateTableName()
+        client = Client()
+        client.connect(self.__ADDRESS())
+        commands = []
+        for row in range(self.__ROWS()):
+            commands.append("insert into {} (col1, col2, col3) values ({}, {}.5, {}:col3)".format(tableName, row, row, row))
+        client.executeMany(commands)
+        client.execute("select col1, col2, col3 from {}".format(tableName))
+        arrays = client.fetchArrays({"col1": int, "col2": float})
+        self.assertEqual(["col1", "col2", "col3"], list(arrays.keys()))
+        self.assertEqual([0, 1, 2], arrays["col1"].tolist())
+        self.assertEqual([0.5, 1.5, 2.5], arrays["col2"].tolist())
+        self.assertEqual(["0:col3", "1:col3", "2:col3"], arrays["col3"].tolist())
+        self.assertFalse(client.nextRow())
+        #
+        client.execute("select col1, col2 from {}".format(tableName))
+        records = client.fetchArrays({"col1": "i4", "col2": lambda values: values.astype(float) * 2}, True)
+        self.assertEqual(self.__ROWS(), len(records))
+        self.assertEqual([1.0, 3.0, 5.0], records["col2"].tolist())
+        client.disconnect()
+
+    def testPrefetch(self):
+        tableName = self.__generateTableName()
+        self.__insertRows(tableName)
+        #
+        client = Client()
+        client.connect(self.__ADDRESS())
+        client.setPrefetch(1, 1)
+        command = "select * from {}".format(tableName)
+        client.execute(command)
+        for row in range(self.__ROWS()):
+            self.assertTrue(client.nextRow())
+            self.assertEqual("{}:col1".format(row), client.getValue("col1"))
+        self.assertFalse(client.nextRow())
+        # abandon the result set
+        client.execute(command)
+        self.assertTrue(client.nextRow())
+        client.execute("status")
+        self.assertEqual("status", client.getAction())
+        client.execute(command)
+        self.assertEqual(self.__ROWS(), len(client.fetchAll()))
+        client.disconnect()
+
+    def __serveScript(self, frames):
+        # plays a pubsubsql server that answers the first command with frames, (requestId or None, message, delaySec);
+        # None stands for the request id of the command
+        listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        listener.bind(("127.0.0.1", 0))
+        listener.listen(1)
+        def serve():
+            sock, _ = listener.accept()
+            listener.close()
+            header = b""
+            while len(header) < 8:
+                header += sock.recv(8 - len(header))
+            sizeB, commandRequestId = struct.unpack(">II", header)
+            while sizeB:
+                sizeB -= len(sock.recv(sizeB))
+            for requestId, message, delaySec in frames:
+                time.sleep(delaySec)
+                messageBytes = json.dumps(message).encode("utf-8")
+                if requestId is None:
+                    requestId = commandRequestId
+                sock.sendall(struct.pack(">II", len(messageBytes), requestId) + messageBytes)
+            sock.recv(1024)
+            sock.close()
+        thread = threading.Thread(target=serve)
+        thread.daemon = True
+        thread.start()
+        return "127.0.0.1:{}".format(listener.getsockname()[1])
+
+    def testBacklogLimitWhilePrefetching(self):
+        def batch(row):
+            return {"status": "ok", "action": "select", "rows": 3, "fromrow": row, "torow": row,
+                    "columns": ["id"], "data": [[str(row)]]}
+        def pubsub(row):
+            return {"status": "ok", "action": "insert", "pubsubid": "1", "rows": 1, "fromrow": 1, "torow": 1,
+                    "columns": ["id"], "data": [[str(row)]]}
+        # the pubsub messages arrive while the prefetch thread reads the result set
+        address = self.__serveScript([(None, batch(1), 0), (0, pubsub(1), 0.1), (None, batch(2), 0),
+                                      (0, pubsub(2), 0), (None, batch(3), 0)])
+        client = Client()
+        client.connect(address)
+        client.setPrefetch(1)
+        client.execute("select * from T")
+        client.setBacklogLimit(10)
+        self.assertEqual([("1",), ("2",), ("3",)], client.fetchAll())
+        for row in range(1, 3):
+            self.assertTrue(client.waitForPubSub(100))
+            self.assertEqual("insert", client.getAction())
+            self.assertTrue(client.nextRow())
+            self.assertEqual(str(row), client.getValue("id"))
+        self.assertFalse(client.waitForPubSub(1))
+        client.disconnect()
+
     def testUpdateOneRow(self):
         tableName = self.__generateTableName()
         self.__insertRow(tableName)
@@ -396,6 +577,313 @@ class TestClient(unittest.TestCase):
         client.execute(command)
         self.__checkPubsubResultSet(client, client.getPubSubId, "remove", 1, self.__COLUMNS())
         client.disconnect()
+
+    def testBacklogLimit(self):
+        tableName = self.__generateTableName()
+        client = Client()
+        client.connect(self.__ADDRESS())
+        client.setBacklogLimit(2, 0, "dropOldest")
+        client.execute("subscribe * from {}".format(tableName))
+        # pubsub messages arrive while the Client waits for the responses
+        self.__insertRows(tableName)
+        client.execute("status")
+        time.sleep(0.1)
+        client.execute("status")
+        stats = client.getBacklogStats()
+        self.assertEqual(2, stats["messages"])
+        self.assertEqual(self.__ROWS() - 2, stats["dropped"])
+        self.assertTrue(stats["bytes"] > 0)
+        self.assertTrue(client.waitForPubSub(100))
+        self.assertTrue(client.waitForPubSub(100))
+        self.assertEqual(0, client.getBacklogStats()["bytes"])
+        with self.assertRaises(ValueError):
+            client.setBacklogLimit(2, 0, "block")
+        client.disconnect()
+
+    def testBacklogSpill(self):
+        tableName = self.__generateTableName()
+        client = Client()
+        client.connect(self.__ADDRESS())
+        client.setBacklogLimit(1, 0, "spill")
+        client.execute("subscribe * from {}".format(tableName))
+        self.__insertRows(tableName)
+        client.execute("status")
+        time.sleep(0.1)
+        client.execute("status")
+        stats = client.getBacklogStats()
+        self.assertEqual(self.__ROWS(), stats["messages"])
+        self.assertEqual(self.__ROWS() - 1, stats["spillMessages"])
+        self.assertEqual(0, stats["dropped"])
+        for row in range(self.__ROWS()):
+            self.assertTrue(client.waitForPubSub(100))
+            self.assertTrue(client.nextRow())
+            self.assertEqual("{}:col1".format(row), client.getValue("col1"))
+        self.assertEqual(0, client.getBacklogStats()["spillSegments"])
+        client.disconnect()
+
+    def testPubSubConflation(self):
+        tableName = self.__generateTableName()
+        self.__insertRows(tableName)
+        client = Client()
+        client.connect(self.__ADDRESS())
+        client.setConflation("id")
+        command = "subscribe skip * from {}".format(tableName)
+        client.execute(command)
+        # three updates of every row before the Client reads any of them
+        client.execute("update {} set col1 = first".format(tableName))
+        client.execute("update {} set col2 = second".format(tableName))
+        client.execute("update {} set col1 = third".format(tableName))
+        time.sleep(0.2)
+        ids = set()
+        while client.waitForPubSub(100):
+            self.assertEqual("update", client.getAction())
+            self.assertEqual(1, client.getRowCount())
+            self.assertTrue(client.nextRow())
+            self.assertEqual("third", client.getValue("col1"))
+            self.assertEqual("second", client.getValue("col2"))
+            self.assertEqual(client.getValue("col1"), json.loads(client.getJSON())["data"][0][1])
+            ids.add(client.getValue("id"))
+        self.assertEqual(self.__ROWS(), len(ids))
+        stats = client.getConflationStats()
+        self.assertEqual(3 * self.__ROWS(), stats["receivedUpdates"])
+        self.assertEqual(self.__ROWS(), stats["deliveredUpdates"])
+        self.assertEqual(3.0, stats["conflationRatio"])
+        client.disconnect()
+        
+    def testConflationUnderSustainedPublishing(self):
+        def update(row):
+            return {"status": "ok", "action": "update", "pubsubid": "1", "rows": 1, "fromrow": 1, "torow": 1,
+                    "columns": ["id", "col1"], "data": [[str(row % 10), str(row)]]}
+        frames = []
+        for row in range(20000):
+            messageBytes = json.dumps(update(row)).encode("utf-8")
+            frames.append(struct.pack(">II", len(messageBytes), 0) + messageBytes)
+        listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        listener.bind(("127.0.0.1", 0))
+        listener.listen(1)
+        def serve():
+            # publishes faster than the Client reads, so the connection never runs dry
+            sock, _ = listener.accept()
+            listener.close()
+            try:
+                sock.sendall(b"".join(frames))
+                sock.recv(1024)
+            except socket.error:
+                pass
+            sock.close()
+        thread = threading.Thread(target=serve)
+        thread.daemon = True
+        thread.start()
+        client = Client()
+        client.connect("127.0.0.1:{}".format(listener.getsockname()[1]))
+        client.setConflation("id")
+        self.assertTrue(client.waitForPubSub(1000))
+        # only what had already arrived is taken, not the whole stream
+        self.assertTrue(client.getConflationStats()["receivedUpdates"] < len(frames) // 2)
+        client.disconnect()
+        thread.join()
+
+    def testExecuteMany(self):
+        tableName = self.__generateTableName()
+        client = Client()
+        client.connect(self.__ADDRESS())
+        commands = []
+        for row in range(self.__ROWS()):
+            commands.append("insert into {} (col1, col2, col3) values ({}:col1, {}:col2, {}:col3) returning *".format(tableName, row, row, row))
+        commands.append("select * from {}".format(tableName))
+        results = client.executeMany(commands, 2)
+        self.assertEqual(self.__ROWS() + 1, len(results))
+        for row in range(self.__ROWS()):
+            self.assertTrue(results[row].isOk())
+            self.assertEqual("insert", results[row].getAction())
+            self.assertEqual("{}:col1".format(row), results[row].getValue(0, "col1"))
+        select = results[-1]
+        self.assertEqual("select", select.getAction())
+        self.assertEqual(self.__ROWS(), select.getRowCount())
+        self.assertEqual(self.__ROWS(), len(select.getRows()))
+        self.assertEqual(self.__COLUMNS(), select.getColumnCount())
+        for row in range(self.__ROWS()):
+            self.assertEqual("{}:col3".format(row), select.getValue(row, "col3"))
+        client.disconnect()
+
+    def testExecuteManyError(self):
+        client = Client()
+        client.connect(self.__ADDRESS())
+        results = client.executeMany(["status", "blablabla", "status"])
+        self.assertTrue(results[0].isOk())
+        self.assertFalse(results[1].isOk())
+        self.assertNotEqual("", results[1].getMsg())
+        self.assertTrue(results[2].isOk())
+        self.assertEqual("status", results[2].getAction())
+        client.disconnect()
+
+    def testSubmitCollect(self):
+        client = Client()
+        client.connect(self.__ADDRESS())
+        first = client.submit("status")
+        second = client.submit("status")
+        # collect out of order
+        self.assertEqual(second, client.collect(second).getRequestId())
+        self.assertEqual(first, client.collect(first).getRequestId())
+        with self.assertRaises(ValueError):
+            client.collect(first)
+        # execute still works after pipelined commands
+        client.submit("status")
+        client.execute("status")
+        self.assertEqual("status", client.getAction())
+        client.disconnect()
+
+    def testInsertMany(self):
+        tableName = self.__generateTableName()
+        client = Client()
+        client.connect(self.__ADDRESS())
+        rows = [("a b", "it's", "x,y"), ("(1)", "", "2")]
+        ids = client.insertMany(tableName, ["col1", "col2", "col3"], iter(rows), 1)
+        self.assertEqual(len(rows), len(ids))
+        client.execute("select * from {}".format(tableName))
+        self.assertEqual(rows, [tuple(row[1:]) for row in client.fetchAll()])
+        client.execute("select id from {}".format(tableName))
+        self.assertEqual(ids, [row[0] for row in client.fetchAll()])
+        count = client.insertMany(tableName, ["col1"], [(row,) for row in range(100)], 16, False)
+        self.assertEqual(100, count)
+        client.execute("select * from {}".format(tableName))
+        self.assertEqual(102, client.getRowCount())
+        client.disconnect()
+
+    def testInsertManyNumPy(self):
+        if numpy is None:
+            self.skipTest("numpy is not installed")
+        tableName = self.__generateTableName()
+        client = Client()
+        client.connect(self.__ADDRESS())
+        values = numpy.arange(6).reshape(3, 2)
+        ids = client.insertMany(tableName, ["col1", "col2"], values)
+        self.assertEqual(3, len(ids))
+        client.execute("select col1, col2 from {}".format(tableName))
+        self.assertEqual([("0", "1"), ("2", "3"), ("4", "5")], client.fetchAll())
+        client.disconnect()
+
+    def testPrepare(self):
+        tableName = self.__generateTableName()
+        client = Client()
+        client.connect(self.__ADDRESS())
+        insert = client.prepare("insert into {} (col1, col2) values (?, ?)".format(tableName))
+        client.execute(insert.bind("a b", 1))
+        client.stream(insert.bind("it's", 2))
+        requestId = client.submit(insert.bind("x,y", 3))
+        self.assertTrue(client.collect(requestId).isOk())
+        update = client.prepare("update {} set col2 = ? where col1 = ?".format(tableName))
+        client.execute(update.bind(4, "a b"))
+        client.execute("select col1, col2 from {}".format(tableName))
+        self.assertEqual([("a b", "4"), ("it's", "2"), ("x,y", "3")], client.fetchAll())
+        client.disconnect()
+
+    def testExecuteManyPubSub(self):
+        tableName = self.__generateTableName()
+        client = Client()
+        client.connect(self.__ADDRESS())
+        client.execute("subscribe * from {}".format(tableName))
+        commands = []
+        for row in range(self.__ROWS()):
+            commands.append("insert into {} (col1, col2, col3) values ({}:col1, {}:col2, {}:col3)".format(tableName, row, row, row))
+        commands.append("status")
+        for result in client.executeMany(commands):
+            self.assertTrue(result.isOk())
+        # pubsub messages received while collecting are kept in the backlog
+        self.__checkPubsubResultSet(client, client.getPubSubId(), "insert", self.__ROWS(), self.__COLUMNS())
+        client.disconnect()
+    def testMetrics(self):
+        tableName = self.__generateTableName()
+        client = Client()
+        client.connect(self.__ADDRESS())
+        metrics = Metrics()
+        client.setMetrics(metrics)
+        self.assertTrue(client.getMetrics() is metrics)
+        for row in range(250):
+            client.stream("insert into {} (col1) values ({})".format(tableName, row))
+        client.execute("select * from {}".format(tableName))
+        self.assertEqual(250, len(client.fetchAll()))
+        snapshot = metrics.getSnapshot()
+        self.assertEqual(["select"], list(snapshot["execute"]))
+        self.assertEqual(1, snapshot["execute"]["select"]["count"])
+        self.assertEqual(251, snapshot["framesWritten"])
+        # the result set comes in three batches
+        self.assertEqual(3, snapshot["framesRead"])
+        self.assertEqual(2, snapshot["batches"])
+        self.assertEqual(3, snapshot["decode"]["count"])
+        self.assertTrue(snapshot["bytesRead"] > 250 * 8)
+        client.execute("subscribe * from {}".format(tableName))
+        client.execute("status")
+        # a second Client sharing the Metrics object does not replace the gauges of the first one
+        other = Client()
+        other.setMetrics(metrics)
+        snapshot = metrics.getSnapshot()
+        self.assertTrue(snapshot["gauges"]["backlog_messages"] > 0)
+        self.assertEqual(snapshot["gauges"]["backlog_messages"],
+                         snapshot["clientGauges"][client.getMetricsLabel()]["backlog_messages"])
+        self.assertEqual(0, snapshot["clientGauges"][other.getMetricsLabel()]["backlog_messages"])
+        self.assertTrue('pubsubsql_client_execute_seconds_count{verb="select"} 1\n' in metrics.toPrometheus())
+        other.setMetrics(None)
+        client.setMetrics(None)
+        client.execute("status")
+        self.assertEqual(1, metrics.getSnapshot()["execute"]["select"]["count"])
+        self.assertEqual({}, metrics.getSnapshot()["gauges"])
+        client.disconnect()
+    def testProfiler(self):
+        tableName = self.__generateTableName()
+        traceFile, path = tempfile.mkstemp(suffix=".trace")
+        os.close(traceFile)
+        client = Client()
+        client.connect(self.__ADDRESS())
+        profiler = Profiler(path)
+        client.setProfiler(profiler)
+        self.assertTrue(client.getProfiler() is profiler)
+        client.execute("insert into {} (col1) values (1)".format(tableName))
+        for row in range(249):
+            client.stream("insert into {} (col1) values ({})".format(tableName, row))
+        client.execute("select * from {}".format(tableName))
+        rows = 0
+        while client.nextRow():
+            rows += 1
+        self.assertEqual(250, rows)
+        client.setProfiler(None)
+        client.execute("status")
+        client.disconnect()
+        profiler.close()
+        records = list(readTrace(path))
+        os.remove(path)
+        self.assertEqual(2, len(records))
+        self.assertEqual(0, records[0]["rows"])
+        self.assertEqual(0.0, records[0]["iterate"])
+        self.assertEqual(250, records[1]["rows"])
+        for phase in ("recv", "decode", "json", "iterate"):
+            self.assertTrue(records[1][phase] > 0, phase)
+
+    def testProfilerPhasesDoNotOverlap(self):
+        tableName = self.__generateTableName()
+        traceFile, path = tempfile.mkstemp(suffix=".trace")
+        os.close(traceFile)
+        client = Client()
+        client.connect(self.__ADDRESS())
+        client.insertMany(tableName, ["col1", "col2"], [[row, "x" * 20] for row in range(3000)], returnIds=False)
+        profiler = Profiler(path)
+        client.setProfiler(profiler)
+        start = time.time()
+        client.execute("select * from {}".format(tableName))
+        self.assertEqual(3000, len(client.fetchAll()))
+        wallSec = time.time() - start
+        client.setProfiler(None)
+        client.disconnect()
+        profiler.close()
+        records = list(readTrace(path))
+        os.remove(path)
+        self.assertEqual(1, len(records))
+        # every phase is timed once, so together they take no longer than execute and fetchAll
+        totalSec = sum(records[0][phase] for phase in PHASES)
+        self.assertTrue(totalSec <= wallSec * 1.01, (totalSec, wallSec, records[0]))
+        self.assertTrue(records[0]["iterate"] > 0)
+        # slicing frames out of the read buffer is much cheaper than decoding them
+        self.assertTrue(records[0]["copy"] < records[0]["decode"] + records[0]["json"], records[0])
         
 if __name__ == "__main__":
     unittest.main()
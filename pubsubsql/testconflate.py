@@ -0,0 +1,66 @@
+#! /usr/bin/env python
+"""
+Copyright (C) 2014 CompleteDB LLC.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the Apache License Version 2.0 http://www.apache.org/licenses.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+
+"""
+
+import unittest
+from pubsubsql.conflate import ConflatingQueue
+
+class TestConflatingQueue(unittest.TestCase):
+
+    def __message(self, action, columns, data):
+        return {"status": "ok", "action": action, "pubsubid": "1", "rows": len(data),
+                "fromrow": 1, "torow": len(data), "columns": columns, "data": data}
+
+    def testMergeUpdates(self):
+        queue = ConflatingQueue("id")
+        queue.append(self.__message("update", ["id", "col1"], [["1", "a"], ["2", "b"]]))
+        queue.append(self.__message("update", ["id", "col2"], [["1", "c"]]))
+        queue.append(self.__message("update", ["id", "col1"], [["1", "d"]]))
+        self.assertEqual(2, len(queue))
+        message = queue.popleft()
+        self.assertEqual(["id", "col1", "col2"], message["columns"])
+        self.assertEqual([["1", "d", "c"]], message["data"])
+        self.assertEqual(1, message["rows"])
+        message = queue.popleft()
+        self.assertEqual([["2", "b"]], message["data"])
+        self.assertEqual(0, len(queue))
+        stats = queue.getStats()
+        self.assertEqual(4, stats["receivedUpdates"])
+        self.assertEqual(2, stats["deliveredUpdates"])
+        self.assertEqual(2.0, stats["conflationRatio"])
+
+    def testDeliveredUpdateIsNotMerged(self):
+        queue = ConflatingQueue("id")
+        queue.append(self.__message("update", ["id", "col1"], [["1", "a"]]))
+        self.assertEqual([["1", "a"]], queue.popleft()["data"])
+        queue.append(self.__message("update", ["id", "col1"], [["1", "b"]]))
+        self.assertEqual([["1", "b"]], queue.popleft()["data"])
+
+    def testOtherActionsKeepOrder(self):
+        queue = ConflatingQueue("id")
+        queue.append(self.__message("update", ["id", "col1"], [["1", "a"]]))
+        queue.append(self.__message("delete", ["id", "col1"], [["1", "a"]]))
+        queue.append(self.__message("update", ["id", "col1"], [["1", "b"]]))
+        self.assertEqual(3, len(queue))
+        self.assertEqual("update", queue.popleft()["action"])
+        self.assertEqual("delete", queue.popleft()["action"])
+        self.assertEqual([["1", "b"]], queue.popleft()["data"])
+
+    def testUpdateWithoutKeyColumn(self):
+        queue = ConflatingQueue("key")
+        queue.append(self.__message("update", ["id", "col1"], [["1", "a"]]))
+        queue.append(self.__message("update", ["id", "col1"], [["1", "b"]]))
+        self.assertEqual(2, len(queue))
+        self.assertEqual(0, queue.getStats()["receivedUpdates"])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,152 @@
+#! /usr/bin/env python
+"""
+Copyright (C) 2014 CompleteDB LLC.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the Apache License Version 2.0 http://www.apache.org/licenses.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+
+"""
+
+import unittest
+import threading
+import time
+from pubsubsql import Client, Dispatcher, Result
+from pubsubsql.dispatcher import HandlerQueue
+
+try:
+    from pubsubsql.emulator import Emulator
+except (ImportError, SyntaxError):
+    Emulator = None
+
+class TestDispatcher(unittest.TestCase):
+    """testSubscribe needs a running pubsubsql server."""
+
+    tableCount = 0
+
+    def __ADDRESS(self):
+        return "localhost:7777"
+
+    def __generateTableName(self):
+        TestDispatcher.tableCount += 1
+        return "T" + str(int(round(time.time() * 1000))) + "d" + str(TestDispatcher.tableCount)
+
+    def __message(self, pubsubId, value):
+        result = Result(0)
+        result.addBatch({"status": "ok", "action": "insert", "pubsubid": pubsubId, "rows": 1,
+                         "fromrow": 1, "torow": 1, "columns": ["id", "col1"], "data": [["1", value]]})
+        return result
+
+    def __waitFor(self, condition):
+        deadline = time.time() + 1.0
+        while not condition() and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertTrue(condition())
+
+    def testRouting(self):
+        dispatcher = Dispatcher()
+        received = {"1": [], "2": [], None: []}
+        dispatcher.addHandler("1", lambda result: received["1"].append(result.getValue(0, "col1")))
+        dispatcher.addHandler("2", lambda result: received["2"].append(result.getValue(0, "col1")), 0)
+        dispatcher.setDefaultHandler(lambda result: received[None].append(result.getValue(0, "col1")))
+        for value in ["a", "b", "c"]:
+            self.assertTrue(dispatcher.dispatch(self.__message("1", value)))
+        self.assertTrue(dispatcher.dispatch(self.__message("2", "d")))
+        self.assertTrue(dispatcher.dispatch(self.__message("3", "e")))
+        dispatcher.disconnect()
+        self.assertEqual(["a", "b", "c"], received["1"])
+        self.assertEqual(["d"], received["2"])
+        self.assertEqual(["e"], received[None])
+        stats = dispatcher.getStats()
+        self.assertEqual(5, stats["dispatched"])
+        self.assertEqual(1, stats["unrouted"])
+        self.assertEqual({}, stats["handlers"])
+
+    def testSlowHandlerDoesNotBlockOthers(self):
+        dispatcher = Dispatcher()
+        release = threading.Event()
+        fast = []
+        # the default policy; the slow handler's queue holds a single message
+        dispatcher.addHandler("slow", lambda result: release.wait(), 1, 1)
+        dispatcher.addHandler("fast", fast.append)
+        def dispatchAll():
+            for i in range(5):
+                dispatcher.dispatch(self.__message("slow", str(i)))
+                dispatcher.dispatch(self.__message("fast", str(i)))
+        thread = threading.Thread(target=dispatchAll)
+        thread.daemon = True
+        thread.start()
+        try:
+            self.__waitFor(lambda: len(fast) == 5)
+            slowStats = dispatcher.getStats()["handlers"]["slow"]
+            self.assertTrue(slowStats["dropped"] >= 3)
+            self.assertEqual(0, slowStats["blocked"])
+        finally:
+            release.set()
+            thread.join()
+            dispatcher.disconnect()
+
+    @unittest.skipIf(Emulator is None, "requires the emulator, Python 3.5 or later")
+    def testReplacedHandlerCallsBack(self):
+        emulator = Emulator()
+        dispatcher = Dispatcher()
+        dispatcher.connect(emulator.startThread())
+        release = threading.Event()
+        def callBack(result):
+            release.wait()
+            dispatcher.removeHandler("other")
+        # the emulator numbers subscriptions from 1, so subscribe replaces this handler
+        dispatcher.addHandler("1", callBack)
+        dispatcher.dispatch(self.__message("1", "a"))
+        thread = threading.Thread(target=dispatcher.subscribe, args=("subscribe * from T", len))
+        thread.daemon = True
+        thread.start()
+        time.sleep(0.1)
+        release.set()
+        # the replaced handler is closed without holding the lock its handler waits for
+        thread.join(2.0)
+        deadlocked = thread.is_alive()
+        if not deadlocked:
+            dispatcher.disconnect()
+        emulator.stopThread()
+        self.assertFalse(deadlocked)
+
+    def testHandlerErrors(self):
+        def fail(result):
+            raise ValueError("handler failed")
+        handlerQueue = HandlerQueue(fail)
+        handlerQueue.put(self.__message("1", "a"))
+        handlerQueue.put(self.__message("1", "b"))
+        handlerQueue.close()
+        stats = handlerQueue.getStats()
+        self.assertEqual(2, stats["handled"])
+        self.assertEqual(2, stats["errors"])
+        self.assertFalse(handlerQueue.put(self.__message("1", "c")))
+
+    def testInvalidArguments(self):
+        with self.assertRaises(ValueError):
+            HandlerQueue(len, 1, 1, "unknown")
+        with self.assertRaises(ValueError):
+            HandlerQueue(len, -1)
+
+    def testSubscribe(self):
+        tableName = self.__generateTableName()
+        client = Client()
+        client.connect(self.__ADDRESS())
+        client.execute("insert into {} (col1) values (a)".format(tableName))
+        dispatcher = Dispatcher()
+        dispatcher.connect(self.__ADDRESS())
+        actions = []
+        pubsubId = dispatcher.subscribe("subscribe * from {}".format(tableName), lambda result: actions.append(result.getAction()))
+        self.assertNotEqual("", pubsubId)
+        client.execute("insert into {} (col1) values (b)".format(tableName))
+        self.__waitFor(lambda: actions == ["add", "insert"])
+        self.assertEqual(0, dispatcher.getStats()["unrouted"])
+        dispatcher.disconnect()
+        client.disconnect()
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,125 @@
+#! /usr/bin/env python
+"""
+Copyright (C) 2014 CompleteDB LLC.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the Apache License Version 2.0 http://www.apache.org/licenses.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+
+"""
+
+import os
+import tempfile
+import unittest
+from pubsubsql import Client, Metrics, MultiplexedClient
+
+try:
+    from pubsubsql.emulator import Emulator
+except (ImportError, SyntaxError):
+    Emulator = None
+
+@unittest.skipIf(Emulator is None, "requires Python 3.5 or later")
+class TestEmulator(unittest.TestCase):
+
+    def __BATCH_ROWS(self):
+        return 2
+
+    def setUp(self):
+        self.emulator = Emulator(self.__BATCH_ROWS())
+        self.client = Client()
+        self.client.connect(self.emulator.startThread())
+
+    def tearDown(self):
+        self.client.disconnect()
+        self.emulator.stopThread()
+
+    def __insertRows(self, rows):
+        for row in range(rows):
+            self.client.execute("insert into T (ticker, price) values ('T {}', {})".format(row, row))
+
+    def testSelectBatches(self):
+        self.__insertRows(5)
+        self.client.execute("select ticker from T")
+        self.assertEqual(5, self.client.getRowCount())
+        self.assertEqual(["ticker"], self.client.getColumns())
+        self.assertEqual([("T {}".format(row),) for row in range(5)], self.client.fetchAll())
+
+    def testAbandonedBatchesNotDecoded(self):
+        self.__insertRows(10)
+        metrics = Metrics()
+        self.client.setMetrics(metrics)
+        self.client.execute("select ticker from T")
+        self.assertEqual([("T 0",)], self.client.fetchMany(1))
+        # the four batches left of the result set are dropped without decoding them
+        self.client.execute("status")
+        self.assertEqual(2, metrics.getSnapshot()["decode"]["count"])
+
+    def testUpdateDelete(self):
+        self.__insertRows(3)
+        self.client.execute("update T set price = 10 where ticker = 'T 1'")
+        self.assertEqual(1, self.client.getRowCount())
+        self.client.execute("delete from T where price = 10")
+        self.assertEqual(1, self.client.getRowCount())
+        self.client.execute("select price from T")
+        self.assertEqual([("0",), ("2",)], self.client.fetchAll())
+
+    def testErrors(self):
+        self.client.execute("key T ticker")
+        self.__insertRows(1)
+        with self.assertRaises(ValueError):
+            self.__insertRows(1)
+        with self.assertRaises(ValueError):
+            self.client.execute("blablabla")
+
+    def testStream(self):
+        self.client.stream("insert into T (ticker) values (IBM)")
+        self.client.stream("blablabla")
+        self.client.execute("select ticker from T")
+        self.assertEqual([("IBM",)], self.client.fetchAll())
+
+    def testPubSub(self):
+        self.__insertRows(3)
+        self.client.execute("subscribe * from T where ticker = 'T 1'")
+        pubsubId = self.client.getPubSubId()
+        self.assertTrue(self.client.waitForPubSub(1000))
+        self.assertEqual("add", self.client.getAction())
+        self.assertEqual(pubsubId, self.client.getPubSubId())
+        self.client.execute("update T set price = 5 where ticker = 'T 1'")
+        self.assertTrue(self.client.waitForPubSub(1000))
+        self.assertEqual("update", self.client.getAction())
+        self.client.execute("unsubscribe from T where pubsubid = {}".format(pubsubId))
+        self.client.execute("update T set price = 6 where ticker = 'T 1'")
+        self.assertFalse(self.client.waitForPubSub(10))
+
+    def __checkTransport(self, address):
+        emulator = Emulator()
+        address = emulator.startThread(address)
+        try:
+            client = Client()
+            client.connect(address)
+            client.execute("insert into T (ticker) values (IBM)")
+            client.disconnect()
+            client = MultiplexedClient()
+            client.connect(address)
+            self.assertEqual([["IBM"]], client.execute("select ticker from T").getRows())
+            client.disconnect()
+        finally:
+            emulator.stopThread()
+
+    def testUnixSocket(self):
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, "pubsubsql.sock")
+        self.__checkTransport("unix:" + path)
+        self.assertFalse(os.path.exists(path))
+        os.rmdir(directory)
+
+    def testInProcess(self):
+        self.__checkTransport("inproc:testInProcess")
+        with self.assertRaises(IOError):
+            Client().connect("inproc:testInProcess")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,95 @@
+#! /usr/bin/env python
+"""
+Copyright (C) 2014 CompleteDB LLC.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the Apache License Version 2.0 http://www.apache.org/licenses.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+
+"""
+
+import unittest
+from pubsubsql import Metrics
+from pubsubsql.metrics import Histogram
+
+class TestMetrics(unittest.TestCase):
+
+    def testHistogram(self):
+        histogram = Histogram()
+        for sec in (0.00001, 0.00005, 0.0002, 20.0):
+            histogram.observe(sec)
+        snapshot = histogram.getSnapshot()
+        self.assertEqual(4, snapshot["count"])
+        self.assertAlmostEqual(20.00026, snapshot["sumSec"])
+        buckets = dict(snapshot["buckets"])
+        self.assertEqual(2, buckets[0.00005])
+        self.assertEqual(2, buckets[0.0001])
+        self.assertEqual(3, buckets[0.00025])
+        self.assertEqual(3, buckets[10.0])
+        self.assertEqual(4, buckets[float("inf")])
+
+    def testVerb(self):
+        metrics = Metrics()
+        self.assertEqual("select", metrics.getVerb("  SELECT * from T"))
+        self.assertEqual("stream", metrics.getVerb("stream insert into T (a) values (1)"))
+        self.assertEqual("other", metrics.getVerb("blablabla"))
+        self.assertEqual("other", metrics.getVerb(""))
+
+    def testSnapshot(self):
+        metrics = Metrics()
+        metrics.observeExecute("select", 0.001)
+        metrics.observeExecute("select", 0.003)
+        metrics.observeDecode(0.0001)
+        metrics.countRead(2, 100)
+        metrics.countWritten(1, 20)
+        metrics.countBatch()
+        metrics.countHardDisconnect()
+        metrics.setGauge("backlog_messages", lambda: 7)
+        snapshot = metrics.getSnapshot()
+        self.assertEqual(2, snapshot["execute"]["select"]["count"])
+        self.assertEqual(1, snapshot["decode"]["count"])
+        self.assertEqual((2, 100, 1, 20), (snapshot["framesRead"], snapshot["bytesRead"],
+                                           snapshot["framesWritten"], snapshot["bytesWritten"]))
+        self.assertEqual((1, 1), (snapshot["batches"], snapshot["hardDisconnects"]))
+        self.assertEqual({"backlog_messages": 7}, snapshot["gauges"])
+        self.assertEqual({}, snapshot["clientGauges"])
+        metrics.setGauge("backlog_messages", None)
+        self.assertEqual({}, metrics.getSnapshot()["gauges"])
+
+    def testClientGauges(self):
+        metrics = Metrics()
+        # Clients sharing the Metrics object keep gauges of their own
+        metrics.setGauge("backlog_messages", lambda: 2, "a")
+        metrics.setGauge("backlog_messages", lambda: 3, "b")
+        snapshot = metrics.getSnapshot()
+        self.assertEqual({"backlog_messages": 5}, snapshot["gauges"])
+        self.assertEqual({"a": {"backlog_messages": 2}, "b": {"backlog_messages": 3}}, snapshot["clientGauges"])
+        lines = metrics.toPrometheus("pss").splitlines()
+        self.assertTrue('pss_backlog_messages{client="a"} 2' in lines)
+        self.assertTrue('pss_backlog_messages{client="b"} 3' in lines)
+        metrics.setGauge("backlog_messages", None, "a")
+        self.assertEqual({"backlog_messages": 3}, metrics.getSnapshot()["gauges"])
+
+    def testPrometheus(self):
+        metrics = Metrics()
+        metrics.observeExecute("select", 0.003)
+        metrics.countRead(2, 100)
+        metrics.setGauge("backlog_messages", lambda: 7)
+        lines = metrics.toPrometheus("pss").splitlines()
+        self.assertTrue("# TYPE pss_execute_seconds histogram" in lines)
+        self.assertTrue('pss_execute_seconds_bucket{verb="select",le="0.0025"} 0' in lines)
+        self.assertTrue('pss_execute_seconds_bucket{verb="select",le="0.005"} 1' in lines)
+        self.assertTrue('pss_execute_seconds_bucket{verb="select",le="+Inf"} 1' in lines)
+        self.assertTrue('pss_execute_seconds_sum{verb="select"} 0.003' in lines)
+        self.assertTrue('pss_execute_seconds_count{verb="select"} 1' in lines)
+        self.assertTrue("pss_decode_seconds_count 0" in lines)
+        self.assertTrue("pss_frames_read_total 2" in lines)
+        self.assertTrue("pss_bytes_read_total 100" in lines)
+        self.assertTrue("pss_hard_disconnects_total 0" in lines)
+        self.assertTrue("pss_backlog_messages 7" in lines)
+
+if __name__ == "__main__":
+    unittest.main()
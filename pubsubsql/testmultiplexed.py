@@ -0,0 +1,139 @@
+#! /usr/bin/env python
+"""
+Copyright (C) 2014 CompleteDB LLC.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the Apache License Version 2.0 http://www.apache.org/licenses.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+
+"""
+
+import unittest
+import threading
+import time
+from pubsubsql import MultiplexedClient
+
+class TestMultiplexedClient(unittest.TestCase):
+    """MAKE SURE TO RUN PUBSUBSQL SERVER!"""
+
+    def __ADDRESS(self):
+        return "localhost:7777"
+
+    def __ROWS(self):
+        return 3
+
+    def __THREADS(self):
+        return 8
+
+    def __generateTableName(self):
+        return "T" + str(int(round(time.time() * 1000)))
+
+    def setUp(self):
+        pass
+
+    def tearDown(self):
+        pass
+
+    def testConnectDisconnect(self):
+        client = MultiplexedClient()
+        client.connect(self.__ADDRESS())
+        self.assertTrue(client.isConnected())
+        client.disconnect()
+        self.assertFalse(client.isConnected())
+        with self.assertRaises(Exception):
+            client.connect("addresswithnoport")
+        self.assertFalse(client.isConnected())
+        with self.assertRaises(IOError):
+            client.execute("status")
+
+    def testExecute(self):
+        client = MultiplexedClient()
+        client.connect(self.__ADDRESS())
+        self.assertEqual("status", client.execute("status").getAction())
+        with self.assertRaises(ValueError):
+            client.execute("blablabla")
+        client.disconnect()
+
+    def testExecuteFromManyThreads(self):
+        client = MultiplexedClient()
+        client.connect(self.__ADDRESS())
+        tableName = self.__generateTableName()
+        errors = []
+        def insertRows(thread):
+            try:
+                for row in range(self.__ROWS()):
+                    value = "{}:{}".format(thread, row)
+                    result = client.execute("insert into {} (col1) values ({}) returning *".format(tableName, value))
+                    if result.getValue(0, "col1") != value:
+                        errors.append(value)
+            except Exception as e:
+                errors.append(e)
+        threads = [threading.Thread(target=insertRows, args=(thread,)) for thread in range(self.__THREADS())]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual([], errors)
+        result = client.execute("select * from {}".format(tableName))
+        self.assertEqual(self.__ROWS() * self.__THREADS(), result.getRowCount())
+        self.assertEqual(self.__ROWS() * self.__THREADS(), len(result.getRows()))
+        client.disconnect()
+
+    def testSubmitCollect(self):
+        client = MultiplexedClient()
+        client.connect(self.__ADDRESS())
+        tableName = self.__generateTableName()
+        requestIds = [client.submit("insert into {} (col1) values ({})".format(tableName, row)) for row in range(self.__ROWS())]
+        rejected = client.submit("blablabla")
+        for requestId in requestIds:
+            self.assertEqual("insert", client.collect(requestId).getAction())
+        self.assertFalse(client.collect(rejected).isOk())
+        with self.assertRaises(ValueError):
+            client.collect(rejected)
+        client.disconnect()
+
+    def testPubSub(self):
+        client = MultiplexedClient()
+        client.connect(self.__ADDRESS())
+        tableName = self.__generateTableName()
+        pubsubId = client.execute("subscribe * from {}".format(tableName)).getPubSubId()
+        self.assertEqual(None, client.waitForPubSub(10))
+        for row in range(self.__ROWS()):
+            client.execute("insert into {} (col1) values ({}:col1)".format(tableName, row))
+        readRows = 0
+        while readRows < self.__ROWS():
+            message = client.waitForPubSub(1000)
+            self.assertNotEqual(None, message)
+            self.assertEqual("insert", message.getAction())
+            self.assertEqual(pubsubId, message.getPubSubId())
+            readRows += len(message.getRows())
+        client.disconnect()
+        self.assertEqual(None, client.waitForPubSub(10))
+
+    def testBacklogBlock(self):
+        client = MultiplexedClient()
+        client.setBacklogLimit(1, 0, "block")
+        client.connect(self.__ADDRESS())
+        tableName = self.__generateTableName()
+        client.execute("subscribe * from {}".format(tableName))
+        other = MultiplexedClient()
+        other.connect(self.__ADDRESS())
+        for row in range(self.__ROWS()):
+            other.execute("insert into {} (col1) values (v{})".format(tableName, row))
+        other.disconnect()
+        time.sleep(0.1)
+        # the reader thread waits until the message is consumed
+        stats = client.getBacklogStats()
+        self.assertEqual(1, stats["messages"])
+        self.assertEqual(1, stats["blocked"])
+        for row in range(self.__ROWS()):
+            message = client.waitForPubSub(1000)
+            self.assertNotEqual(None, message)
+            self.assertEqual("v" + str(row), message.getValue(0, "col1"))
+        client.disconnect()
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,132 @@
+#! /usr/bin/env python
+"""
+Copyright (C) 2014 CompleteDB LLC.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the Apache License Version 2.0 http://www.apache.org/licenses.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+
+"""
+
+import threading
+import time
+import unittest
+from pubsubsql import ClientPool
+
+class TestClientPool(unittest.TestCase):
+    """MAKE SURE TO RUN PUBSUBSQL SERVER!"""
+
+    def __ADDRESS(self):
+        return "localhost:7777"
+
+    def setUp(self):
+        pass
+
+    def tearDown(self):
+        pass
+
+    def testReuseClient(self):
+        pool = ClientPool(self.__ADDRESS(), 2)
+        with pool.connection() as client:
+            client.execute("status")
+            self.assertTrue(client.isAlive())
+            first = client
+        with pool.connection() as client:
+            self.assertTrue(client is first)
+            client.execute("status")
+            self.assertEqual("status", client.getAction())
+        stats = pool.getStats()
+        self.assertEqual(1, stats["size"])
+        self.assertEqual(1, stats["idle"])
+        self.assertEqual(0, stats["inUse"])
+        self.assertEqual(2, stats["checkouts"])
+        self.assertEqual(1, stats["created"])
+        pool.close()
+        self.assertFalse(first.isConnected())
+
+    def testMaxSize(self):
+        pool = ClientPool(self.__ADDRESS(), 2)
+        first = pool.checkout()
+        second = pool.checkout()
+        self.assertEqual(1.0, pool.getStats()["utilization"])
+        with self.assertRaises(IOError):
+            pool.checkout(0.01)
+        self.assertEqual(1, pool.getStats()["timeouts"])
+        pool.checkin(first)
+        self.assertTrue(pool.checkout(0.01) is first)
+        pool.checkin(first)
+        pool.checkin(second)
+        pool.close()
+
+    def testDiscardDisconnected(self):
+        pool = ClientPool(self.__ADDRESS(), 2)
+        with pool.connection() as client:
+            client.disconnect()
+        stats = pool.getStats()
+        self.assertEqual(0, stats["size"])
+        self.assertEqual(1, stats["discarded"])
+        with pool.connection() as client:
+            self.assertTrue(client.isConnected())
+        pool.close()
+
+    def testReapIdle(self):
+        pool = ClientPool(self.__ADDRESS(), 2, 0)
+        client = pool.checkout()
+        pool.checkin(client)
+        self.assertFalse(client.isConnected())
+        stats = pool.getStats()
+        self.assertEqual(0, stats["size"])
+        self.assertEqual(1, stats["reaped"])
+        pool.close()
+
+    def testCheckoutSkipsExpired(self):
+        pool = ClientPool(self.__ADDRESS(), 2, 0.05)
+        first = pool.checkout()
+        second = pool.checkout()
+        pool.checkin(first)
+        time.sleep(0.1)
+        # expired while idle; checkout connects a new Client instead of handing it out
+        client = pool.checkout()
+        self.assertFalse(client is first)
+        self.assertFalse(first.isConnected())
+        stats = pool.getStats()
+        self.assertEqual(1, stats["reaped"])
+        self.assertEqual(3, stats["created"])
+        pool.checkin(client)
+        pool.checkin(second)
+        pool.close()
+
+    def testConcurrentCheckout(self):
+        pool = ClientPool(self.__ADDRESS(), 3)
+        clients = []
+        errors = []
+        def checkout():
+            try:
+                clients.append(pool.checkout(0.5))
+            except IOError as e:
+                errors.append(e)
+        threads = [threading.Thread(target=checkout) for thread in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(3, len(clients))
+        self.assertEqual(5, len(errors))
+        stats = pool.getStats()
+        self.assertEqual(3, stats["created"])
+        self.assertEqual(3, stats["size"])
+        for client in clients:
+            pool.checkin(client)
+        pool.close()
+
+    def testClosed(self):
+        pool = ClientPool(self.__ADDRESS())
+        pool.close()
+        with self.assertRaises(IOError):
+            pool.checkout()
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,42 @@
+#! /usr/bin/env python
+"""
+Copyright (C) 2014 CompleteDB LLC.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the Apache License Version 2.0 http://www.apache.org/licenses.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+
+"""
+
+import unittest
+from pubsubsql import PreparedCommand
+
+class TestPreparedCommand(unittest.TestCase):
+
+    def testBind(self):
+        prepared = PreparedCommand("update Stocks set Price = ? where Ticker = ?")
+        self.assertEqual(2, prepared.getParamCount())
+        bound = prepared.bind(12.5, "IBM")
+        self.assertEqual("update Stocks set Price = 12.5 where Ticker = IBM", str(bound))
+        self.assertEqual(len(str(bound)), bound.getSizeB())
+        self.assertEqual("update Stocks set Price = 'a b' where Ticker = 'it''s'", str(prepared.bind("a b", "it's")))
+
+    def testQuotedPlaceholder(self):
+        prepared = PreparedCommand("insert into T (col1, col2) values ('what?', ?)")
+        self.assertEqual(1, prepared.getParamCount())
+        self.assertEqual("insert into T (col1, col2) values ('what?', 1)", str(prepared.bind(1)))
+        prepared = PreparedCommand("insert into T (col1, col2) values ('it''s?', ?)")
+        self.assertEqual(1, prepared.getParamCount())
+
+    def testWrongParamCount(self):
+        prepared = PreparedCommand("select * from T where id = ?")
+        with self.assertRaises(ValueError):
+            prepared.bind()
+        with self.assertRaises(ValueError):
+            prepared.bind(1, 2)
+
+if __name__ == "__main__":
+    unittest.main()
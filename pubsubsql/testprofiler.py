@@ -0,0 +1,75 @@
+#! /usr/bin/env python
+"""
+Copyright (C) 2014 CompleteDB LLC.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the Apache License Version 2.0 http://www.apache.org/licenses.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+
+"""
+
+import os
+import tempfile
+import unittest
+from pubsubsql.profiler import Profiler, readTrace, report, PHASES
+
+class TestProfiler(unittest.TestCase):
+
+    def setUp(self):
+        traceFile, self.path = tempfile.mkstemp(suffix=".trace")
+        os.close(traceFile)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def testTrace(self):
+        profiler = Profiler(self.path)
+        profiler.begin(7)
+        profiler.add("recv", 0.001)
+        profiler.add("json", 0.0005)
+        profiler.startIterate(0.002, 3)
+        profiler.add("recv", 0.25)
+        profiler.begin(8)
+        profiler.add("decode", 0.0001)
+        profiler.end()
+        # nothing is profiled between requests
+        profiler.add("recv", 1.0)
+        profiler.close()
+        self.assertEqual(2, profiler.getRecordCount())
+        records = list(readTrace(self.path))
+        self.assertEqual([7, 8], [record["requestId"] for record in records])
+        self.assertEqual(3, records[0]["rows"])
+        self.assertAlmostEqual(0.251, records[0]["recv"], 6)
+        self.assertAlmostEqual(0.0005, records[0]["json"], 6)
+        self.assertAlmostEqual(0.0005, records[0]["other"], 6)
+        # the batch read while iterating does not count as iterating
+        self.assertTrue(records[0]["iterate"] < 0.25)
+        self.assertAlmostEqual(0.0001, records[1]["decode"], 6)
+        self.assertEqual(0.0, records[1]["iterate"])
+
+    def testReport(self):
+        profiler = Profiler(self.path)
+        for requestId in range(1, 101):
+            profiler.begin(requestId)
+            profiler.add("recv", requestId / 1e6)
+        profiler.close()
+        # a text file takes the str report writes on python 2 and 3 alike, unlike io.StringIO
+        with tempfile.TemporaryFile("w+") as out:
+            report(self.path, out)
+            out.seek(0)
+            lines = out.read().splitlines()
+        self.assertEqual("100 requests", lines[0])
+        self.assertEqual(len(PHASES) + 2, len(lines))
+        self.assertEqual(["recv", "51.0", "100.0", "50.5", "100.0%"], lines[2].split())
+
+    def testNotATrace(self):
+        with open(self.path, "wb") as traceFile:
+            traceFile.write(b"something else")
+        with self.assertRaises(ValueError):
+            list(readTrace(self.path))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,38 @@
+#! /usr/bin/env python
+"""
+Copyright (C) 2014 CompleteDB LLC.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the Apache License Version 2.0 http://www.apache.org/licenses.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+
+"""
+
+import unittest
+from pubsubsql import Quoter
+
+class TestQuoter(unittest.TestCase):
+
+    def testQuote(self):
+        quoter = Quoter()
+        self.assertEqual("IBM", quoter.quote("IBM"))
+        self.assertEqual("12.5", quoter.quote(12.5))
+        self.assertEqual("''", quoter.quote(""))
+        self.assertEqual("''", quoter.quote(None))
+        self.assertEqual("'a b'", quoter.quote("a b"))
+        self.assertEqual("'a\tb'", quoter.quote("a\tb"))
+        self.assertEqual("'x,y'", quoter.quote(b"x,y"))
+        self.assertEqual("'(1)'", quoter.quote("(1)"))
+        self.assertEqual("'it''s'", quoter.quote("it's"))
+        self.assertEqual("(IBM, 'a b', '')", quoter.quoteList(["IBM", "a b", ""]))
+
+    def testUnquote(self):
+        quoter = Quoter()
+        for value in ["IBM", "a b", "it's", "", "x,y", "'"]:
+            self.assertEqual(value, quoter.unquote(quoter.quote(value)))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,96 @@
+#! /usr/bin/env python
+"""
+Copyright (C) 2014 CompleteDB LLC.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the Apache License Version 2.0 http://www.apache.org/licenses.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+
+"""
+
+import unittest
+import time
+from pubsubsql import Client, TableReplica
+
+class TestTableReplica(unittest.TestCase):
+    """MAKE SURE TO RUN PUBSUBSQL SERVER!"""
+
+    tableCount = 0
+
+    def __ADDRESS(self):
+        return "localhost:7777"
+
+    def __ROWS(self):
+        return 5
+
+    def __generateTableName(self):
+        TestTableReplica.tableCount += 1
+        return "T" + str(int(round(time.time() * 1000))) + "r" + str(TestTableReplica.tableCount)
+
+    def __insertRows(self, client, tableName):
+        for row in range(self.__ROWS()):
+            command = "insert into {} (ticker, price) values (T{}, {})".format(tableName, row % 2, row)
+            client.execute(command)
+
+    def __waitFor(self, condition):
+        deadline = time.time() + 1.0
+        while not condition() and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertTrue(condition())
+
+    def setUp(self):
+        self.client = Client()
+        self.client.connect(self.__ADDRESS())
+
+    def tearDown(self):
+        self.client.disconnect()
+
+    def testLoad(self):
+        tableName = self.__generateTableName()
+        self.__insertRows(self.client, tableName)
+        replica = TableReplica(tableName, ["ticker"])
+        replica.connect(self.__ADDRESS())
+        self.assertTrue(replica.isConnected())
+        self.assertEqual(self.__ROWS(), len(replica))
+        self.assertEqual(3, len(replica.findBy("ticker", "T0")))
+        self.assertEqual(2, len(replica.findBy("ticker", "T1")))
+        self.assertEqual(1, len(replica.findBy("price", "4")))
+        rowId = replica.findBy("price", "4")[0]["id"]
+        self.assertTrue(rowId in replica)
+        self.assertEqual("T0", replica.get(rowId)["ticker"])
+        replica.disconnect()
+        self.assertFalse(replica.isConnected())
+
+    def testEmptyTable(self):
+        replica = TableReplica(self.__generateTableName())
+        replica.connect(self.__ADDRESS())
+        self.assertEqual(0, len(replica))
+        self.assertEqual(None, replica.get("1"))
+        replica.disconnect()
+
+    def testActions(self):
+        tableName = self.__generateTableName()
+        replica = TableReplica(tableName, ["ticker"])
+        replica.connect(self.__ADDRESS())
+        # insert
+        self.__insertRows(self.client, tableName)
+        self.__waitFor(lambda: len(replica) == self.__ROWS())
+        # update
+        self.client.execute("update {} set ticker = T2 where price = 1".format(tableName))
+        self.__waitFor(lambda: len(replica.findBy("ticker", "T2")) == 1)
+        self.assertEqual(1, len(replica.findBy("ticker", "T1")))
+        self.assertEqual("1", replica.findBy("ticker", "T2")[0]["price"])
+        # delete
+        self.client.execute("delete from {} where ticker = T0".format(tableName))
+        self.__waitFor(lambda: len(replica) == 2)
+        self.assertEqual([], replica.findBy("ticker", "T0"))
+        stats = replica.getStats()
+        self.assertEqual(2, stats["rows"])
+        self.assertTrue(stats["actions"]["insert"] >= 1)
+        replica.disconnect()
+
+if __name__ == "__main__":
+    unittest.main()
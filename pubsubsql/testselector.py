@@ -0,0 +1,159 @@
+#! /usr/bin/env python
+"""
+Copyright (C) 2014 CompleteDB LLC.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the Apache License Version 2.0 http://www.apache.org/licenses.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+
+"""
+
+import json
+import socket
+import struct
+import threading
+import time
+import unittest
+from pubsubsql import Client
+
+try:
+    from pubsubsql.emulator import Emulator
+except (ImportError, SyntaxError):
+    Emulator = None
+
+try:
+    from pubsubsql.selector import ClientSelector
+except ImportError:
+    # selectors is part of Python 3.4 and later
+    ClientSelector = None
+
+@unittest.skipIf(ClientSelector is None or Emulator is None, "requires the emulator, Python 3.5 or later")
+class TestClientSelector(unittest.TestCase):
+
+    def __CLIENTS(self):
+        return 20
+
+    def setUp(self):
+        self.emulator = Emulator()
+        self.address = self.emulator.startThread()
+        self.selector = ClientSelector()
+        self.publisher = Client()
+        self.publisher.connect(self.address)
+        self.clients = []
+        for index in range(self.__CLIENTS()):
+            client = Client()
+            client.connect(self.address)
+            client.execute("subscribe * from T{}".format(index))
+            self.selector.register(client)
+            self.clients.append(client)
+
+    def tearDown(self):
+        self.selector.close()
+        for client in self.clients:
+            client.disconnect()
+        self.publisher.disconnect()
+        self.emulator.stopThread()
+
+    def __publish(self, index, value):
+        self.publisher.execute("insert into T{} (col1) values ({})".format(index, value))
+
+    def testTimeout(self):
+        self.assertEqual(self.__CLIENTS(), len(self.selector))
+        self.assertEqual([], self.selector.select(10))
+
+    def testSelect(self):
+        self.__publish(3, "a")
+        self.__publish(7, "b")
+        self.__publish(7, "c")
+        received = []
+        while len(received) < 3:
+            ready = self.selector.select(1000)
+            self.assertTrue(ready)
+            for client in ready:
+                self.assertEqual("insert", client.getAction())
+                self.assertTrue(client.nextRow())
+                received.append((self.clients.index(client), client.getValue("col1")))
+        self.assertEqual([(3, "a"), (7, "b"), (7, "c")], sorted(received))
+        self.assertEqual([], self.selector.select(10))
+
+    def testBacklog(self):
+        client = self.clients[5]
+        self.__publish(5, "a")
+        # the message arrives while waiting for the response and goes to the backlog
+        self.publisher.execute("status")
+        client.execute("status")
+        ready = self.selector.select(0)
+        self.assertEqual([client], ready)
+        self.assertTrue(client.nextRow())
+        self.assertEqual("a", client.getValue("col1"))
+
+    def testDisconnected(self):
+        client = self.clients[2]
+        self.selector.unregister(client)
+        self.assertEqual(self.__CLIENTS() - 1, len(self.selector))
+        self.emulator.stopThread()
+        ready = self.selector.select(1000)
+        self.assertTrue(ready)
+        for client in ready:
+            self.assertFalse(client.isConnected())
+        self.emulator = Emulator()
+        self.emulator.startThread()
+
+@unittest.skipIf(ClientSelector is None, "requires selectors, Python 3.4 or later")
+class TestClientSelectorLargeFrame(unittest.TestCase):
+
+    def __serve(self, listener, publish, pubsubFrame):
+        # answers the subscribe command, then sends pubsubFrame in two pieces once publish is set
+        sock, _ = listener.accept()
+        listener.close()
+        header = b""
+        while len(header) < 8:
+            header += sock.recv(8 - len(header))
+        sizeB, requestId = struct.unpack(">II", header)
+        while sizeB:
+            sizeB -= len(sock.recv(sizeB))
+        response = json.dumps({"status": "ok", "action": "subscribe", "pubsubid": "1"}).encode("utf-8")
+        sock.sendall(struct.pack(">II", len(response), requestId) + response)
+        publish.wait()
+        half = len(pubsubFrame) // 2
+        sock.sendall(pubsubFrame[:half])
+        time.sleep(0.5)
+        sock.sendall(pubsubFrame[half:])
+        sock.recv(1024)
+        sock.close()
+
+    def testSplitLargeFrame(self):
+        value = "x" * 200 * 1024
+        message = json.dumps({"status": "ok", "action": "insert", "pubsubid": "1", "rows": 1, "fromrow": 1,
+                              "torow": 1, "columns": ["col1"], "data": [[value]]}).encode("utf-8")
+        listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        listener.bind(("127.0.0.1", 0))
+        listener.listen(1)
+        publish = threading.Event()
+        thread = threading.Thread(target=self.__serve,
+                                  args=(listener, publish, struct.pack(">II", len(message), 0) + message))
+        thread.daemon = True
+        thread.start()
+        client = Client()
+        client.connect("127.0.0.1:{}".format(listener.getsockname()[1]))
+        client.execute("subscribe * from T")
+        # leaves a socket timeout set on the connection
+        self.assertFalse(client.waitForPubSub(50))
+        selector = ClientSelector()
+        selector.register(client)
+        publish.set()
+        # the first piece of the frame is not enough to make the client ready
+        self.assertEqual([client], selector.select(3000))
+        self.assertTrue(client.isConnected())
+        self.assertEqual([client], selector.getClients())
+        self.assertTrue(client.nextRow())
+        self.assertEqual(value, client.getValue("col1"))
+        selector.close()
+        client.disconnect()
+        thread.join()
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,124 @@
+#! /usr/bin/env python
+"""
+Copyright (C) 2014 CompleteDB LLC.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the Apache License Version 2.0 http://www.apache.org/licenses.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+
+"""
+
+import unittest
+import threading
+import time
+from pubsubsql import Client, ShardedClient
+from pubsubsql.sharded import HashRing
+
+class TestHashRing(unittest.TestCase):
+
+    def __KEYS(self):
+        return ["key{}".format(i) for i in range(2000)]
+
+    def testDistribution(self):
+        ring = HashRing(["a:1", "b:1", "c:1", "d:1"])
+        counts = {}
+        for key in self.__KEYS():
+            node = ring.get(key)
+            counts[node] = counts.get(node, 0) + 1
+        self.assertEqual(4, len(counts))
+        for count in counts.values():
+            self.assertTrue(count > len(self.__KEYS()) / 8, counts)
+
+    def testAddMovesFewKeys(self):
+        ring = HashRing(["a:1", "b:1", "c:1", "d:1"])
+        before = dict((key, ring.get(key)) for key in self.__KEYS())
+        ring.add("e:1")
+        moved = [key for key in self.__KEYS() if ring.get(key) != before[key]]
+        # only keys that now belong to the new node move
+        self.assertTrue(all(ring.get(key) == "e:1" for key in moved))
+        self.assertTrue(len(moved) < len(self.__KEYS()) / 3, len(moved))
+        ring.remove("e:1")
+        self.assertEqual(before, dict((key, ring.get(key)) for key in self.__KEYS()))
+
+    def testEmpty(self):
+        with self.assertRaises(ValueError):
+            HashRing().get("key")
+
+class TestShardedClient(unittest.TestCase):
+    """MAKE SURE TO RUN PUBSUBSQL SERVER!
+
+    Both shards are the same pubsubsql server reached by two addresses.
+    """
+
+    tableCount = 0
+
+    def __ADDRESSES(self):
+        return ["localhost:7777", "127.0.0.1:7777"]
+
+    def __generateTableName(self):
+        TestShardedClient.tableCount += 1
+        return "T" + str(int(round(time.time() * 1000))) + "s" + str(TestShardedClient.tableCount)
+
+    def testGetShard(self):
+        client = ShardedClient(self.__ADDRESSES(), {"Stocks": "ticker"})
+        self.assertTrue(client.getShard("Orders") in self.__ADDRESSES())
+        shards = set(client.getShard("Stocks", "T{}".format(i)) for i in range(100))
+        self.assertEqual(set(self.__ADDRESSES()), shards)
+
+    def testExecute(self):
+        tableName = self.__generateTableName()
+        client = ShardedClient(self.__ADDRESSES(), {tableName: "ticker"})
+        client.connect()
+        self.assertTrue(client.isConnected())
+        pubsubId = client.execute("subscribe * from {}".format(tableName)).getPubSubId()
+        for i in range(4):
+            client.execute("insert into {} (ticker, price) values ('T {}', {})".format(tableName, i, i))
+        with self.assertRaises(ValueError):
+            client.execute("insert into {} (price) values (1)".format(tableName))
+        # every row is on both shards since they are the same server
+        result = client.execute("select * from {}".format(tableName))
+        self.assertEqual(8, result.getRowCount())
+        self.assertEqual(8, len(list(client.iterRows("select * from {}".format(tableName)))))
+        received = 0
+        while received < 8:
+            message = client.waitForPubSub(1000)
+            self.assertNotEqual(None, message)
+            self.assertEqual(pubsubId, message.getPubSubId())
+            received += len(message.getRows())
+        client.execute("unsubscribe from {} where pubsubid = {}".format(tableName, pubsubId))
+        client.disconnect()
+        self.assertFalse(client.isConnected())
+
+    def testRejectIdAddressedWrites(self):
+        client = ShardedClient(self.__ADDRESSES(), {"Stocks": "ticker"})
+        with self.assertRaises(ValueError):
+            client.execute("update Stocks set price = 1 where id = 3")
+        with self.assertRaises(ValueError):
+            client.stream("delete from Stocks where id = '3'")
+
+    def testWaitForPubSubWakesUp(self):
+        tableName = self.__generateTableName()
+        client = ShardedClient(self.__ADDRESSES(), {tableName: "ticker"})
+        client.connect()
+        client.execute("subscribe * from {}".format(tableName))
+        start = time.time()
+        self.assertEqual(None, client.waitForPubSub(100))
+        self.assertTrue(time.time() - start >= 0.09)
+        publisher = Client()
+        publisher.connect(self.__ADDRESSES()[0])
+        timer = threading.Timer(0.1, publisher.execute, ["insert into {} (ticker) values (a)".format(tableName)])
+        timer.start()
+        start = time.time()
+        message = client.waitForPubSub(5000)
+        timer.join()
+        self.assertNotEqual(None, message)
+        self.assertEqual("insert", message.getAction())
+        self.assertTrue(time.time() - start < 1.0)
+        publisher.disconnect()
+        client.disconnect()
+
+if __name__ == "__main__":
+    unittest.main()
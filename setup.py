@@ -44,6 +44,7 @@ setup(
     packages=['pubsubsql', 'pubsubsql.net'],
     tests_require=['pytest>=2.5.0'],
     cmdclass={'test': PyTest},
+    entry_points={'console_scripts': ['pubsubsql-bench = pubsubsql.bench:main']},
     classifiers=[
         'Development Status :: 5 - Production/Stable',
         'Environment :: Console',